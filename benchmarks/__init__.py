@@ -0,0 +1 @@
+# benchmarks — замеры горячих путей игры (pytest-benchmark), см. conftest.py
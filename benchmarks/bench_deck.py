@@ -0,0 +1,107 @@
+# benchmarks/bench_deck.py
+"""Загрузка колод и перемешивание: DeckRegistry на настоящих и синтетических колодах"""
+import json
+import shutil
+from itertools import islice
+
+import pytest
+
+from content_index import ContentIndex
+from deck_compiler import Source, compile_deck, iter_cards
+from deck_index import CardIndex
+from deck_registry import DeckRegistry
+from game_utils import decks
+from pairing_index import build_pairs
+
+
+def _count_cards(path, label) -> int:
+    return sum(1 for _ in iter_cards(path, label))
+
+
+@pytest.mark.benchmark(group="deck_load")
+@pytest.mark.parametrize("label", ["situations", "answers"])
+def test_iter_cards_real(benchmark, label):
+    path = decks.sit_path if label == "situations" else decks.ans_path
+    assert benchmark(_count_cards, path, label)
+
+
+@pytest.mark.benchmark(group="deck_load")
+@pytest.mark.parametrize("size", ["10k", "100k"])
+def test_compile_deck_synthetic(benchmark, deck_dirs, tmp_path, size):
+    """Холодная сборка пакета: потоковое чтение, дедупликация, перестановки, запись"""
+    src = deck_dirs[size] / "answers.json"
+    count = benchmark(compile_deck, src, "answers", tmp_path / "answers.pack")
+    assert count == int(size[:-1]) * 1000
+
+
+@pytest.mark.benchmark(group="deck_load")
+def test_deck_registry_cold_100k(benchmark, deck_dirs, tmp_path):
+    """Первый запуск: пакеты обоих файлов собираются заново"""
+    index_dir = tmp_path / "index"
+
+    def setup():
+        shutil.rmtree(index_dir, ignore_errors=True)
+        return (), {"base": deck_dirs["100k"], "index_dir": index_dir}
+
+    deck = benchmark.pedantic(DeckRegistry, setup=setup, rounds=5)
+    assert len(deck.answer_ids) == 100_000
+
+
+@pytest.mark.benchmark(group="deck_load")
+def test_deck_registry_warm_100k(benchmark, deck_dirs, tmp_path):
+    """Повторный запуск: готовые пакеты открываются через mmap"""
+    DeckRegistry(base=deck_dirs["100k"], index_dir=tmp_path)
+    deck = benchmark(DeckRegistry, base=deck_dirs["100k"], index_dir=tmp_path)
+    assert len(deck.answer_ids) == 100_000
+
+
+@pytest.mark.benchmark(group="deck_shuffle")
+def test_deal_order_hand(benchmark, deck):
+    """Первые 10 карт раздачи: обход перестановки пакета, без перемешивания колоды"""
+    hand = benchmark(lambda: list(islice(deck.deal_order(), 10)))
+    assert len(set(hand)) == min(10, len(deck.live_answer_ids))
+
+
+@pytest.fixture(scope="module")
+def packed_110k(deck_dirs, tmp_path_factory):
+    """Пакет из двух паков: base (100k) и spicy с флагом adult (10k)"""
+    path = tmp_path_factory.mktemp("packs")
+    spicy = path / "spicy.json"
+    spicy.write_text(json.dumps({"answers": [f"Острый ответ №{i}" for i in range(10_000)]}, ensure_ascii=False),
+                     encoding="utf-8")
+    compile_deck([Source(deck_dirs["100k"] / "answers.json", "base"), Source.parse(f"spicy:adult={spicy}")],
+                 "answers", path / "answers.pack")
+    return CardIndex(path / "answers.pack")
+
+
+@pytest.mark.benchmark(group="deck_content")
+def test_content_index_build_110k(benchmark, packed_110k):
+    """Маски флагов и паков: один раз на версию колоды"""
+    content = benchmark(ContentIndex, packed_110k)
+    assert set(content.packs) == {"base", "spicy"}
+
+
+@pytest.mark.benchmark(group="deck_content")
+def test_eligible_uncached_110k(benchmark, packed_110k):
+    """Набор карт чата по новым настройкам: операции над масками целиком"""
+    content = ContentIndex(packed_110k)
+
+    def run():
+        content._cache.clear()
+        return content.eligible("family", {"spicy"})
+
+    mask = benchmark(run)
+    assert content.count(mask) == 100_000
+
+
+@pytest.mark.benchmark(group="deck_pairs")
+def test_build_pairs_real(benchmark, tmp_path):
+    """Индекс пар настоящей колоды: TF-IDF по основам и top-k ответов на ситуацию (вне игры)"""
+    rows = benchmark(build_pairs, decks.situations.store, decks.answers.store, tmp_path / "pairs.bin")
+    assert rows
+
+
+@pytest.mark.benchmark(group="deck_shuffle")
+def test_new_shuffled_answer_ids(benchmark, deck):
+    ids = benchmark(deck.get_new_shuffled_answer_ids)
+    assert len(ids) == len(deck.answers)
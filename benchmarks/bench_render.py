@@ -0,0 +1,16 @@
+# benchmarks/bench_render.py
+"""Отрисовка карточки ситуации (Pillow): короткий и самый длинный текст колоды"""
+import pytest
+
+from card_generator import create_situation_card
+from game_utils import decks
+
+
+@pytest.mark.benchmark(group="render")
+@pytest.mark.parametrize("kind", ["short", "long"])
+def test_create_situation_card(benchmark, kind):
+    pick = min if kind == "short" else max
+    text = pick(decks.situations, key=len)
+    # Сотни миллисекунд на вызов: фиксированное число повторов вместо калибровки
+    card = benchmark.pedantic(create_situation_card, args=(text,), rounds=5, warmup_rounds=1)
+    assert card.getbuffer().nbytes
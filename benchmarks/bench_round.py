@@ -0,0 +1,124 @@
+# benchmarks/bench_round.py
+"""
+Горячие пути раунда: раздача карт, закрытие приёма ответов (перемешивание
+и клавиатура ведущего) и итог раунда (очки, сброс карт, тексты итога).
+Каждый замер начинается со свежего состояния — его готовит setup.
+"""
+import asyncio
+import random
+
+import pytest
+
+import handlers.game_handlers as gh
+from benchmarks.conftest import make_session
+from deck_registry import DeckRegistry
+from game_state import new_hand
+from scheduler import scheduler
+
+CHAT_ID = -1_000_000_777
+HAND_SIZE = 10
+
+
+@pytest.fixture
+def game_deck(monkeypatch, deck):
+    """Колода из фикстуры deck подменяет колоду обработчиков"""
+    monkeypatch.setattr(gh, "decks", deck)
+    return deck
+
+
+def _dealt_session(deck, phase: str):
+    st = make_session(CHAT_ID)
+    players = st.non_host_players()
+    gh._deal_hands(st, deck.for_chat(), players, HAND_SIZE)
+    st.round_id = 1
+    st.phase = phase
+    st.human_acted = True
+    st.round_message_id = 1
+    st.round_message_photo = True
+    st.answers = {p.user_id: st.hands[p.user_id][random.randrange(HAND_SIZE)] for p in players}
+    # Сброс прошлых раундов: каждая десятая карта колоды уже сыграна
+    st.used_answers = set(range(0, len(deck.answers), 10)) - set(st.answers.values())
+
+    scheduler.cancel_chat(CHAT_ID, running=False)
+    gh.round_messages.close(CHAT_ID)
+    gh.SESSIONS[CHAT_ID] = st
+    return st
+
+
+@pytest.mark.benchmark(group="deal")
+def test_deal_hands(benchmark, game_deck):
+    def setup():
+        st = make_session(CHAT_ID)
+        # Половина рук уже на руках с прошлого раунда: добор, а не раздача с нуля
+        for p in st.non_host_players()[::2]:
+            st.hands[p.user_id] = new_hand(range(p.user_id % 100, p.user_id % 100 + HAND_SIZE - 1))
+        return (st, game_deck.for_chat(st.mode, st.disabled_packs), st.non_host_players(), HAND_SIZE), {}
+
+    benchmark.pedantic(gh._deal_hands, setup=setup, rounds=50)
+
+
+@pytest.fixture(scope="module")
+def paired_deck(tmp_path_factory):
+    """Настоящая колода с индексом пар — для умной раздачи"""
+    registry = DeckRegistry(index_dir=tmp_path_factory.mktemp("pairs"), pairs_top_k=32)
+
+    async def warm_up():
+        # Холодный кэш: индекс пар собирается при запуске реестра
+        registry.start()
+        await registry.stop()
+
+    asyncio.run(warm_up())
+    return registry
+
+
+@pytest.mark.benchmark(group="deal")
+def test_deal_hands_smart(benchmark, paired_deck):
+    """Раздача с подходящими к ситуации картами: лучшие ответы из индекса пар + добор"""
+    chat_deck = paired_deck.for_chat()
+    situation_id = max(paired_deck.live_situation_ids, key=lambda i: len(chat_deck.best_answers(i)))
+    # В настоящей колоде у ситуации лишь несколько подходящих ответов — дополняем до полного
+    # top-k, как в большой колоде: тогда подходящие карты заметно пересекаются с добором
+    fitting = chat_deck.best_answers(situation_id)
+    fitting += [c for c in chat_deck.deal_order() if c not in fitting][:paired_deck.pairs.top_k - len(fitting)]
+    sessions = []
+
+    def setup():
+        st = make_session(CHAT_ID)
+        # Руки с прошлого раунда не пересекаются: иначе проверка ниже ловила бы их, а не раздачу
+        for i, p in enumerate(st.non_host_players()[::2]):
+            st.hands[p.user_id] = new_hand(range(i * HAND_SIZE, (i + 1) * HAND_SIZE - 1))
+        sessions.append(st)
+        return (st, chat_deck, st.non_host_players(), HAND_SIZE, fitting, 2), {}
+
+    benchmark.pedantic(gh._deal_hands, setup=setup, rounds=200)
+    for st in sessions:
+        dealt = [card for hand in st.hands.values() for card in hand]
+        assert len(dealt) == len(set(dealt)), "одна карта в двух руках"
+
+
+@pytest.mark.benchmark(group="round")
+def test_check_all_answered(benchmark, loop, stub_bot, game_deck):
+    def setup():
+        _dealt_session(game_deck, "answering")
+        return (), {}
+
+    def run():
+        loop.run_until_complete(gh._check_all_answered(stub_bot, CHAT_ID))
+
+    benchmark.pedantic(run, setup=setup, rounds=200)
+    assert gh.SESSIONS[CHAT_ID].phase == "judging"
+
+
+@pytest.mark.benchmark(group="round")
+def test_process_winner(benchmark, loop, stub_bot, game_deck):
+    def setup():
+        st = _dealt_session(game_deck, "judging")
+        st.shuffled_answers = list(st.answers.items())
+        random.shuffle(st.shuffled_answers)
+        return (), {}
+
+    def run():
+        loop.run_until_complete(gh._process_winner(stub_bot, CHAT_ID, 0))
+
+    benchmark.pedantic(run, setup=setup, rounds=200)
+    assert gh.SESSIONS[CHAT_ID].phase == "finished"
@@ -0,0 +1,56 @@
+# benchmarks/bench_stats.py
+"""Статистика игр: постановка раунда в очередь (цикл событий) и запись пачки в SQLite (поток)"""
+import time
+
+import pytest
+
+from stats_db import RoundResult, StatsDB
+
+BATCH = 500
+
+
+def _result(i: int) -> RoundResult:
+    chat_id = -1_000_000_000 - i % 50
+    players = {uid: (f"Игрок{uid}", uid < 3) for uid in range(1 + i % 7, 6 + i % 7)}
+    uids = list(players)
+    now = time.time()
+    return RoundResult(
+        chat_id=chat_id, round_id=i, host_id=uids[0], winner_id=uids[1 + i % 4],
+        situation=f"Ситуация №{i}: ____", winning_card=f"Ответ №{i}",
+        answers=tuple((uid, f"Ответ №{i + uid}") for uid in uids[1:]),
+        players=players, started_at=now - 60, finished_at=now,
+    )
+
+
+@pytest.fixture
+def stats(tmp_path):
+    db = StatsDB(str(tmp_path / "stats.db"), batch_size=BATCH)
+    yield db
+    db._writer.close()
+    db._reader.close()
+
+
+@pytest.mark.benchmark(group="stats")
+def test_record_round(benchmark, stats):
+    """Что платит обработчик раунда: итог в очередь, без диска"""
+    result = _result(0)
+    # Очередь не сбрасывается во время замера: без лимита, чтобы мерить постановку, а не отброс
+    stats.max_pending = 10 ** 9
+    benchmark(stats.record, result)
+    assert stats.pending() and not stats.dropped
+
+
+@pytest.mark.benchmark(group="stats")
+def test_write_batch_500(benchmark, stats):
+    """Пачка раундов одной транзакцией: журнал, ответы и три сводки"""
+    batch = [_result(i) for i in range(BATCH)]
+    calls = 0
+
+    def write():
+        nonlocal calls
+        calls += 1
+        stats._write(batch)
+
+    # Число запусков считаем сами: с --benchmark-disable pedantic выполняет функцию один раз
+    benchmark.pedantic(write, rounds=10)
+    assert calls and stats._writer.execute("SELECT count(*) FROM rounds").fetchone()[0] == BATCH * calls
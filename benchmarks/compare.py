@@ -0,0 +1,107 @@
+# benchmarks/compare.py
+"""
+Сравнение прогона бенчмарков с опорной точкой.
+
+    python -m pytest benchmarks --benchmark-json=bench.json
+    python benchmarks/compare.py bench.json                  # отчёт, код 1 при регрессиях
+    python benchmarks/compare.py bench.json --threshold 0.2  # порог 20 %
+    python benchmarks/compare.py bench.json --save           # записать как baseline.json
+
+Сравнивается медиана (устойчивее к выбросам, чем среднее). Опорная точка
+хранит только сводку по каждому замеру и описание машины: числа с другой
+машины сравнимы лишь приблизительно — при смене железа запишите новую.
+"""
+import argparse
+import json
+import platform
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+STATS = ("min", "median", "mean", "stddev", "rounds")
+
+
+def load_run(path: str) -> Dict[str, Any]:
+    """Сводка прогона pytest-benchmark (--benchmark-json) в формате опорной точки"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    machine = data.get("machine_info", {})
+    return {
+        "machine": {
+            "cpu": machine.get("cpu", {}).get("brand_raw") or machine.get("processor") or platform.processor(),
+            "python": machine.get("python_version") or platform.python_version(),
+            "system": f"{machine.get('system', '')} {machine.get('release', '')}".strip(),
+        },
+        "benchmarks": {
+            b["fullname"]: {stat: b["stats"][stat] for stat in STATS}
+            for b in data.get("benchmarks", [])
+        },
+    }
+
+
+def _fmt_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} с"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} мс"
+    return f"{seconds * 1e6:.1f} мкс"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, stat: str = "median") -> int:
+    """Печатает таблицу изменений; возвращает число регрессий"""
+    base, cur = baseline["benchmarks"], current["benchmarks"]
+    if baseline.get("machine") != current.get("machine"):
+        print(f"⚠️ Другая машина: опорная точка {baseline.get('machine')}, сейчас {current.get('machine')}")
+
+    regressions = 0
+    width = max((len(name) for name in cur), default=10)
+    print(f"{'Замер':<{width}}  {'было':>10}  {'стало':>10}  {'изменение':>9}")
+    for name in sorted(cur):
+        now = cur[name][stat]
+        if name not in base:
+            print(f"{name:<{width}}  {'—':>10}  {_fmt_time(now):>10}  {'новый':>9}")
+            continue
+        was = base[name][stat]
+        change = (now - was) / was if was else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  🔴 регрессия"
+            regressions += 1
+        elif change < -threshold:
+            mark = "  🟢 быстрее"
+        print(f"{name:<{width}}  {_fmt_time(was):>10}  {_fmt_time(now):>10}  {change:>+8.1%}{mark}")
+    for name in sorted(set(base) - set(cur)):
+        print(f"{name:<{width}}  {_fmt_time(base[name][stat]):>10}  {'—':>10}  {'пропал':>9}")
+
+    print(f"\n{'🔴' if regressions else '✅'} регрессий: {regressions} (порог {threshold:.0%}, {stat})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение прогона бенчмарков с опорной точкой")
+    parser.add_argument("run", help="JSON прогона: pytest benchmarks --benchmark-json=…")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--threshold", type=float, default=0.10, help="допустимое замедление, доля")
+    parser.add_argument("--stat", default="median", choices=("min", "median", "mean"))
+    parser.add_argument("--save", action="store_true", help="записать прогон как опорную точку")
+    args = parser.parse_args()
+
+    current = load_run(args.run)
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Опорная точка: {args.baseline} ({len(current['benchmarks'])} замеров)")
+        return
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        sys.exit(f"❌ Нет опорной точки {args.baseline}: запустите с --save")
+    sys.exit(1 if compare(baseline, current, args.threshold, args.stat) else 0)
+
+
+if __name__ == "__main__":
+    main()
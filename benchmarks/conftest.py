@@ -0,0 +1,96 @@
+# benchmarks/conftest.py
+"""
+Общие фикстуры бенчмарков.
+
+    python -m pytest benchmarks --benchmark-json=bench.json
+    python benchmarks/compare.py bench.json            # сравнение с baseline.json
+    python benchmarks/compare.py bench.json --save     # новая опорная точка
+
+Колоды — настоящие (situations.json / answers.json) и синтетические на 10k
+и 100k карт. Игра работает без сети: ИИ-провайдеры заменены заглушками
+(OFFLINE_AI), Bot API — StubBot, сессии только в памяти.
+"""
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+# До импорта модулей игры: config и game_utils читают окружение при загрузке
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ.update(OFFLINE_AI="1", GEMINI_API_KEY="", SESSION_BACKEND="memory", STATS_DB_PATH="",
+                  INSTANT_BOTS="1", LOG_LEVEL="WARNING", METRICS_PORT="0", TRACE_EXPORT="")
+
+import pytest
+
+from game_state import GameSession
+from deck_registry import DeckRegistry
+from game_utils import decks
+
+SYNTHETIC_SIZES = {"10k": 10_000, "100k": 100_000}
+
+
+def _write_deck(path, count: int) -> None:
+    situations = [f"Синтетическая ситуация №{i}: ____" for i in range(max(1, count // 10))]
+    answers = [f"Синтетический ответ №{i}" for i in range(count)]
+    (path / "situations.json").write_text(json.dumps(situations, ensure_ascii=False), encoding="utf-8")
+    (path / "answers.json").write_text(json.dumps({"answers": answers}, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture(scope="session")
+def deck_dirs(tmp_path_factory):
+    """Каталоги с синтетическими колодами: {"10k": путь, "100k": путь}"""
+    dirs = {}
+    for name, count in SYNTHETIC_SIZES.items():
+        path = tmp_path_factory.mktemp(f"deck_{name}")
+        _write_deck(path, count)
+        dirs[name] = path
+    return dirs
+
+
+@pytest.fixture(scope="session", params=["real", *SYNTHETIC_SIZES])
+def deck(request, deck_dirs) -> DeckRegistry:
+    """Колода игры: настоящая или синтетическая"""
+    if request.param == "real":
+        return decks
+    return DeckRegistry(base=deck_dirs[request.param])
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    from scheduler import scheduler
+    loop.run_until_complete(scheduler.shutdown())
+    loop.close()
+
+
+class StubBot:
+    """Bot API без сети: каждый вызов возвращает правдоподобное сообщение"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def _message(self, chat_id=None, *args, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(message_id=self.calls, chat=SimpleNamespace(id=chat_id))
+
+    send_message = send_photo = _message
+    edit_message_caption = edit_message_text = edit_message_reply_markup = _message
+
+
+@pytest.fixture
+def stub_bot() -> StubBot:
+    return StubBot()
+
+
+def make_session(chat_id: int, humans: int = 6, bots: int = 2) -> GameSession:
+    """Игра с ведущим-человеком и руками, готовыми к раздаче"""
+    st = GameSession(chat_id=chat_id)
+    for i in range(humans):
+        st.add_player(10_000 + i, f"Игрок{i}")
+    for i in range(bots):
+        st.add_player(1 + i, f"Бот{i}", is_bot=True)
+    st.next_host()
+    st.current_situation = decks.situations[0]
+    return st
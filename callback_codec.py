@@ -0,0 +1,122 @@
+# callback_codec.py
+"""
+Компактный формат callback_data игровых кнопок.
+
+Поля упакованы struct фиксированной ширины, к ним добавлена подпись
+blake2s с ключом (4 байта), всё закодировано base64url без выравнивания:
+
+    версия  B   1 байт
+    действие B  1 байт   (Action)
+    chat_id q   8 байт
+    раунд   I   4 байта  (GameSession.round_id)
+    user_id q   8 байт   (0, если не нужен)
+    индекс  B   1 байт   (карта в руке / вариант ответа)
+    подпись     4 байта
+
+Итого 36 символов при любых chat_id и user_id — с запасом до лимита
+Telegram в 64 байта. Подпись отсекает подделанные и испорченные кнопки,
+версия позволяет менять формат, не ломая уже отправленные кнопки.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from aiogram import BaseMiddleware
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+VERSION = 1
+_FIELDS = struct.Struct(">BBqIqB")
+_SIG_SIZE = 4
+ENCODED_LEN = len(base64.urlsafe_b64encode(b"\0" * (_FIELDS.size + _SIG_SIZE)).rstrip(b"="))
+
+
+class Action(IntEnum):
+    ANSWER = 1  # игрок выбирает карту из руки
+    PICK = 2    # ведущий выбирает лучший ответ
+
+
+@dataclass(frozen=True, slots=True)
+class GameCallbackData:
+    action: Action
+    chat_id: int
+    round_id: int
+    user_id: int = 0
+    index: int = 0
+
+
+def derive_key(secret: str) -> bytes:
+    return hashlib.blake2s(secret.encode(), person=b"cbdata").digest()
+
+
+# Ключ подписи: CALLBACK_SECRET или производный от токена бота.
+# .env читаем сами: маршрутизатор sharding.py не импортирует config
+load_dotenv()
+_KEY = derive_key(os.getenv("CALLBACK_SECRET") or os.getenv("BOT_TOKEN") or "")
+
+
+def _sign(body: bytes, key: bytes) -> bytes:
+    return hashlib.blake2s(body, key=key, digest_size=_SIG_SIZE).digest()
+
+
+def encode(action: Action, chat_id: int, round_id: int, user_id: int = 0, index: int = 0,
+           key: bytes = _KEY) -> str:
+    body = _FIELDS.pack(VERSION, action, chat_id, round_id & 0xFFFFFFFF, user_id, index)
+    return base64.urlsafe_b64encode(body + _sign(body, key)).rstrip(b"=").decode("ascii")
+
+
+def decode(data: Optional[str], key: bytes = _KEY) -> Optional[GameCallbackData]:
+    """Разбирает callback_data; None для чужого формата, неизвестной версии или неверной подписи"""
+    if not data or len(data) != ENCODED_LEN:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    body, sig = raw[:_FIELDS.size], raw[_FIELDS.size:]
+    if not hmac.compare_digest(sig, _sign(body, key)):
+        return None
+    version, action, chat_id, round_id, user_id, index = _FIELDS.unpack(body)
+    if version != VERSION:
+        return None
+    try:
+        action = Action(action)
+    except ValueError:
+        return None
+    return GameCallbackData(action, chat_id, round_id, user_id, index)
+
+
+class CallbackDecodeMiddleware(BaseMiddleware):
+    """Разбирает callback_data один раз на обновление и передаёт дальше как payload"""
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["payload"] = decode(event.data)
+        return await handler(event, data)
+
+
+class GameCallback(Filter):
+    """Фильтр кнопок игры по действию: @router.callback_query(GameCallback(Action.PICK))"""
+
+    def __init__(self, *actions: Action):
+        self.actions = frozenset(actions)
+
+    async def __call__(self, cb: CallbackQuery, payload: Any = ...) -> Any:
+        if payload is ...:
+            # Middleware не подключён — разбираем сами
+            payload = decode(cb.data)
+            if payload is not None and payload.action in self.actions:
+                return {"payload": payload}
+            return False
+        return payload is not None and payload.action in self.actions
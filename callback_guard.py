@@ -0,0 +1,54 @@
+# callback_guard.py
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class CallbackGuard:
+    """
+    Отсев повторных и устаревших нажатий inline-кнопок до обращения к сессии.
+
+    Для каждого чата помнится номер текущего раунда и обработанные в нём
+    нажатия: ключ (chat_id, round_id, действие) → текст cb.answer.
+    - Повтор уже обработанного нажатия получает тот же ответ за O(1).
+    - Кнопка с другим round_id в callback_data отклоняется сразу.
+    - С началом раунда записи прошлого раунда отбрасываются, так что на чат
+      хранится не больше одного раунда; число чатов ограничено maxsize (LRU).
+    После перезапуска раунд чата неизвестен — такие нажатия проверяются
+    обычным путём через сессию.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        # chat_id → (round_id, {действие: текст ответа})
+        self._chats: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def start_round(self, chat_id: int, round_id: int) -> None:
+        self._put(chat_id, (round_id, {}))
+
+    def is_stale(self, chat_id: int, round_id: int) -> bool:
+        entry = self._chats.get(chat_id)
+        return entry is not None and entry[0] != round_id
+
+    def handled(self, chat_id: int, round_id: int, action: Hashable) -> Optional[str]:
+        """Текст ответа, если такое нажатие в этом раунде уже обработано"""
+        entry = self._chats.get(chat_id)
+        if entry is None or entry[0] != round_id:
+            return None
+        return entry[1].get(action)
+
+    def remember(self, chat_id: int, round_id: int, action: Hashable, answer: str) -> None:
+        entry = self._chats.get(chat_id)
+        if entry is None or entry[0] != round_id:
+            entry = (round_id, {})
+            self._put(chat_id, entry)
+        entry[1][action] = answer
+
+    def forget_chat(self, chat_id: int) -> None:
+        """Игра в чате удалена или начата заново"""
+        self._chats.pop(chat_id, None)
+
+    def _put(self, chat_id: int, entry: tuple) -> None:
+        self._chats[chat_id] = entry
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.maxsize:
+            self._chats.popitem(last=False)
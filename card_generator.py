@@ -4,6 +4,9 @@ import google.generativeai as genai
 from PIL import Image, ImageDraw, ImageFont
 from io import BytesIO
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Используем ключи из окружения
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -27,7 +30,7 @@ def generate_pollinations_image(situation, answer):
         response = requests.get(url, params=params, timeout=10)
         return response.url if response.status_code == 200 else None
     except Exception as e:
-        print(f"⚠️ Pollinations error: {e}")
+        logger.warning(f"⚠️ Pollinations error: {e}")
         return None
 
 def generate_gemini_image(situation: str, answer: str) -> str:
@@ -43,10 +46,10 @@ def generate_gemini_image(situation: str, answer: str) -> str:
     """
     try:
         if not GEMINI_API_KEY:
-            print("⚠️ GEMINI_API_KEY не найден! Добавьте в переменные окружения.")
+            logger.warning("⚠️ GEMINI_API_KEY не найден! Добавьте в переменные окружения.")
             return None
         
-        print(f"🎨 Генерируем изображение через Gemini Imagen 3...")
+        logger.debug(f"🎨 Генерируем изображение через Gemini Imagen 3...")
         
         # Промпт для мема на русском
         prompt = (
@@ -84,14 +87,14 @@ def generate_gemini_image(situation: str, answer: str) -> str:
                             with open(temp_path, 'wb') as f:
                                 f.write(image_bytes)
                             
-                            print(f"✅ Изображение создано через Gemini: {temp_path}")
+                            logger.info(f"✅ Изображение создано через Gemini: {temp_path}")
                             return temp_path
         
-        print("⚠️ Gemini не вернул изображение в ответе")
+        logger.warning("⚠️ Gemini не вернул изображение в ответе")
         return None
         
     except Exception as e:
-        print(f"❌ Ошибка генерации через Gemini: {e}")
+        logger.error(f"❌ Ошибка генерации через Gemini: {e}")
         return None
 
 def generate_card_joke(situation, answer):
@@ -107,7 +110,7 @@ def generate_card_joke(situation, answer):
         response = gemini_model.generate_content(prompt)
         return response.text if response else "😅 У меня закончились шутки!"
     except Exception as e:
-        print(f"⚠️ Ошибка генерации шутки: {e}")
+        logger.warning(f"⚠️ Ошибка генерации шутки: {e}")
         return "😅 Шутка не загрузилась!"
 
 def create_situation_card(situation_text: str, template_path: str = 'assets/card_template.png') -> BytesIO:
@@ -127,7 +130,7 @@ def create_situation_card(situation_text: str, template_path: str = 'assets/card
     except FileNotFoundError:
         # Если шаблон не найден, создаем белую карточку
         card = Image.new('RGB', (864, 1184), 'white')
-        print(f"⚠️ Шаблон не найден: {template_path}, создана пустая карточка")
+        logger.warning(f"⚠️ Шаблон не найден: {template_path}, создана пустая карточка")
     
     draw = ImageDraw.Draw(card)
     
@@ -147,14 +150,14 @@ def create_situation_card(situation_text: str, template_path: str = 'assets/card
     for font_path in font_paths:
         try:
             font = ImageFont.truetype(font_path, 38, encoding="unic")  # Добавлен encoding для кириллицы
-            print(f"✅ Шрифт загружен: {font_path}")
+            logger.debug(f"✅ Шрифт загружен: {font_path}")
             break
         except Exception as e:
             continue
     
     if font is None:
         font = ImageFont.load_default()
-        print("⚠️ Шрифт не найден, используется шрифт по умолчанию")
+        logger.warning("⚠️ Шрифт не найден, используется шрифт по умолчанию")
     
     # Параметры карточки
     card_width, card_height = card.size
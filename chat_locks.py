@@ -0,0 +1,46 @@
+# chat_locks.py
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+
+
+class ChatLocks:
+    """
+    Блокировка на каждый чат: изменения состояния одного чата (ответы,
+    выбор ведущего, таймауты, ходы ботов) выполняются строго по очереди,
+    разные чаты работают параллельно.
+
+    Блокировка создаётся при первом обращении и удаляется, когда её
+    больше никто не держит и не ждёт, так что словарь растёт только
+    с числом одновременно активных чатов. Блокировка не реентерабельна:
+    берётся в точках входа (обработчики, задачи планировщика), внутренние
+    функции считают её уже взятой.
+    """
+
+    def __init__(self):
+        # chat_id → [lock, число держателей и ожидающих]
+        self._locks: Dict[int, List] = {}
+
+    @asynccontextmanager
+    async def __call__(self, chat_id: int) -> AsyncIterator[None]:
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[chat_id]
+
+    def locked(self, chat_id: int) -> bool:
+        entry = self._locks.get(chat_id)
+        return entry is not None and entry[0].locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+
+chat_locks = ChatLocks()
@@ -16,4 +16,35 @@ GAME_SETTINGS = {
     "MIN_PLAYERS": 2,
     "HAND_SIZE": 10,
     "ROUND_TIMEOUT": 60,  # в секундах
+    # После стольких раундов подряд, закрытых по таймауту без людей, игра удаляется
+    "MAX_IDLE_ROUNDS": 2,
+    # Задержки «размышлений» ботов (мин, макс) в секундах
+    "BOT_ANSWER_DELAY": (2, 5),
+    "BOT_PICK_DELAY": (3, 6),
+    # Боты отвечают без задержек — для нагрузочных тестов
+    "INSTANT_BOTS": os.getenv("INSTANT_BOTS", "0") == "1",
+    # Сколько отложенных действий может выполняться одновременно
+    "MAX_RUNNING_TIMERS": 256,
+    # Вытеснение сессий из памяти: простой, число, оценка памяти
+    "SESSION_IDLE_TTL": 1800,
+    "MAX_SESSIONS": 5000,
+    "SESSION_MEMORY_BUDGET_MB": 64,
+    # Хранилище сессий: sqlite, file (каталог JSON-файлов) или memory (без сохранения)
+    "SESSION_BACKEND": os.getenv("SESSION_BACKEND", "sqlite"),
+    "SESSION_STORE_PATH": os.getenv("SESSION_STORE_PATH", "database/sessions.db"),
+    "SESSION_FLUSH_INTERVAL": 1.0,
+    # Сохранённые сессии без обращений дольше этого срока удаляются
+    "SESSION_PERSIST_TTL": 7 * 24 * 3600,
+    # Сколько обработанных нажатий кнопок помнить для отсева повторов
+    "CALLBACK_CACHE_SIZE": 10000,
+    # Не чаще раза в столько секунд правим сообщение раунда, пока идут ответы
+    "ROUND_MESSAGE_DEBOUNCE": 1.0,
+    # Умная раздача: столько карт в руке подходят к ситуации раунда (0 — случайная раздача);
+    # лучшие ответы ситуации берутся из индекса пар (python -m pairing_index)
+    "SMART_DEAL_CARDS": int(os.getenv("SMART_DEAL_CARDS", "0")),
+    "PAIRS_TOP_K": int(os.getenv("PAIRS_TOP_K", "32")),
+    # Статистика игр (stats_db): файл SQLite, пустая строка — не вести
+    "STATS_DB_PATH": os.getenv("STATS_DB_PATH", "database/stats.db"),
+    "STATS_FLUSH_INTERVAL": 1.0,
+    "STATS_BATCH_SIZE": 500,
 }
@@ -0,0 +1,94 @@
+# content_index.py
+"""
+Индекс содержимого колоды: какие карты можно раздавать в чате.
+
+Карты пакета помечены флагами (ADULT / FAMILY) и тегами; пак — тег
+«pack:ИМЯ», его ставит deck_compiler всем картам исходника. Для флага
+ADULT и каждого пака индекс держит маску — по байту на позицию карты
+(1 — карта входит). Маски комбинируются целиком, как большие целые
+числа, так что набор карт чата — несколько операций на всю колоду, а не
+перебор карт. Он считается один раз на версию колоды и настройки чата и
+кэшируется; проверка карты при раздаче — mask[pos], O(1).
+
+Режимы: family — без карт ADULT; adult — все карты (FAMILY-карты есть
+в обоих). Выключенный пак убирает карты, которых нет во включённых паках.
+"""
+import logging
+from itertools import compress
+from typing import Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
+
+from deck_compiler import PACK_TAG
+from deck_index import ADULT, CardIndex
+
+logger = logging.getLogger(__name__)
+
+MODES = ("family", "adult")
+DEFAULT_MODE = "adult"
+# Сколько разных настроек чатов помнить на версию колоды
+MAX_CACHED_FILTERS = 256
+
+
+class ContentIndex:
+    """Маски флагов и паков одного пакета колоды (позиции — как в CardIndex)"""
+
+    __slots__ = ("size", "adult", "packs", "_all", "_cache")
+
+    def __init__(self, store: CardIndex):
+        self.size = len(store)
+        self.adult = self._as_int(store.flag_mask(ADULT))
+        self.packs: Dict[str, int] = {
+            tag[len(PACK_TAG):]: self._as_int(mask)
+            for tag, mask in store.tag_masks().items() if tag.startswith(PACK_TAG)
+        }
+        self._all = self._as_int(b"\x01" * self.size)
+        self._cache: Dict[Tuple[str, FrozenSet[str]], Optional[bytes]] = {}
+
+    @staticmethod
+    def _as_int(mask: bytes) -> int:
+        return int.from_bytes(mask, "big")
+
+    def pack_sizes(self) -> Dict[str, int]:
+        """Пак → число карт в нём"""
+        return {name: self._to_bytes(mask).count(1) for name, mask in self.packs.items()}
+
+    def _to_bytes(self, mask: int) -> bytes:
+        return mask.to_bytes(self.size, "big")
+
+    def eligible(self, mode: str = DEFAULT_MODE, disabled: Iterable[str] = ()) -> Optional[bytes]:
+        """
+        Маска карт, доступных при таких настройках; None — доступны все.
+        Если настройки отсекают всю колоду, маска пустая: семейный режим
+        не откатывается ко взрослым картам.
+        """
+        key = (mode, frozenset(disabled).intersection(self.packs))
+        if key in self._cache:
+            return self._cache[key]
+        if mode != "family" and not key[1]:
+            return None
+
+        allowed = self._all
+        if mode == "family":
+            allowed &= ~self.adult
+        if key[1]:
+            enabled = off = 0
+            for name, mask in self.packs.items():
+                if name in key[1]:
+                    off |= mask
+                else:
+                    enabled |= mask
+            allowed &= ~(off & ~enabled)
+        mask = self._to_bytes(allowed)
+        if not mask.count(1):
+            logger.warning(f"⚠️ Настройки {mode}, без {sorted(key[1])} отсекают всю колоду")
+
+        if len(self._cache) >= MAX_CACHED_FILTERS:
+            self._cache.clear()
+        self._cache[key] = mask
+        return mask
+
+    def count(self, mask: Optional[bytes]) -> int:
+        return self.size if mask is None else mask.count(1)
+
+    def positions(self, mask: Optional[bytes]) -> Iterator[int]:
+        """Позиции карт маски по порядку"""
+        return iter(range(self.size)) if mask is None else compress(range(self.size), mask)
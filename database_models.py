@@ -1,24 +0,0 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean
-from sqlalchemy.orm import declarative_base, sessionmaker
-
-DATABASE_URL = "sqlite:///database/game.db"
-
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
-
-Base = declarative_base()
-
-class Player(Base):
-    __tablename__ = "players"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    score = Column(Integer, default=0)
-    is_leader = Column(Boolean, default=False)
-
-class Game(Base):
-    __tablename__ = "games"
-    id = Column(Integer, primary_key=True, index=True)
-    current_round = Column(Integer, default=0)
-
-def init_db():
-    Base.metadata.create_all(bind=engine)
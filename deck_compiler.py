@@ -0,0 +1,432 @@
+# deck_compiler.py
+"""
+Компилятор колод: JSON / JSON Lines → бинарный пакет (формат — deck_index).
+
+    python -m deck_compiler answers.json                    # → answers.pack
+    python -m deck_compiler answers.json it=it_answers.json spicy:adult=spicy.json -o answers.pack
+    python -m deck_compiler answers.json --shuffles 8 --seed 42
+
+Исходник — JSON-массив, объект {"answers": [...]} или JSON Lines (.jsonl).
+Карта — строка или объект {"text": ..., "adult": true, "family": true,
+"tags": [...]}. Пакет собирается из одного или нескольких исходников —
+паков: ИМЯ[:adult|:family]=ПУТЬ (без имени — пак base). Карты пака
+получают тег «pack:ИМЯ» (см. content_index) и флаг пака;
+--adult / --family / --tag помечают все карты пакета.
+Файл читается потоково: регулярное выражение идёт по окну, которое
+дочитывается кусками по CHUNK байт; в памяти — окно, текущая карта и
+дайджесты. Повторы отсеиваются по 8-байтовым дайджестам
+(blake2b), флаги и теги повторов объединяются.
+
+DeckRegistry открывает готовый пакет (DECK_ANSWERS=answers.pack) без
+разбора JSON, а для JSON-файлов сам собирает пакет в каталог кэша и
+пересобирает, только если исходник изменился (размер или mtime).
+"""
+import argparse
+import codecs
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+from array import array
+from json.decoder import scanstring
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from deck_index import ADULT, FAMILY, HEADER, MAGIC, CardIndex, digest_bytes
+
+logger = logging.getLogger(__name__)
+
+# Перестановок в пакете по умолчанию: раздача начинает обход со случайного места случайной из них
+DEFAULT_SHUFFLES = 4
+
+_BOM = b"\xef\xbb\xbf"
+# Строковый элемент массива: содержимое без кавычек и разделитель после него
+_ITEM = re.compile(rb'\s*"([^"\\]*(?:\\.[^"\\]*)*)"\s*([,\]])', re.S)
+_ARRAY_START = re.compile(rb"\s*\[\s*")
+_ARRAY_END = re.compile(rb"\]")
+_SPACE = re.compile(rb"\s*")
+_SEPARATOR = re.compile(rb"\s*([,\]])")
+_STRING_START = re.compile(rb'\s*"')
+_DECODER = json.JSONDecoder()
+
+# Пак исходника без явного имени
+DEFAULT_PACK = "base"
+PACK_TAG = "pack:"
+_PACK_FLAGS = {"adult": ADULT, "family": FAMILY}
+
+# (текст, флаги, теги)
+Entry = Tuple[str, int, Tuple[str, ...]]
+
+
+class Source(NamedTuple):
+    """Исходник пакета: файл колоды, имя пака и флаги всех его карт"""
+    path: Path
+    pack: str = DEFAULT_PACK
+    flags: int = 0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Source":
+        """ИМЯ[:adult|:family]=ПУТЬ или просто ПУТЬ"""
+        name, sep, path = spec.partition("=")
+        if not sep:
+            return cls(Path(spec))
+        pack, _, flag = name.partition(":")
+        if flag not in ("", *_PACK_FLAGS) or not pack:
+            raise ValueError(f"исходник {spec!r}: ожидалось ИМЯ[:adult|:family]=ПУТЬ")
+        return cls(Path(path), pack, _PACK_FLAGS.get(flag, 0))
+
+
+# ---------- потоковое чтение ----------
+
+# Исходник читается кусками такого размера
+CHUNK = 1 << 20
+# Окно дочитывается, когда до его конца остаётся меньше
+_MARGIN = 1 << 16
+
+
+class _Window:
+    """
+    Окно буферизованного чтения файла: регулярные выражения идут по bytes
+    в памяти. Исходник не отображается через mmap — правка файла на месте
+    во время чтения дала бы SIGBUS, а так — всего лишь ошибку разбора.
+    """
+
+    __slots__ = ("f", "buf", "eof")
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = b""
+        self.eof = False
+
+    def fill(self, pos: int, need: int = CHUNK) -> int:
+        """Отбрасывает прочитанное до pos и дочитывает, пока в окне меньше need байт; новая позиция pos — 0"""
+        if pos:
+            self.buf = self.buf[pos:]
+        while len(self.buf) < need and not self.eof:
+            chunk = self.f.read(max(CHUNK, need - len(self.buf)))
+            if chunk:
+                self.buf += chunk
+            else:
+                self.eof = True
+        return 0
+
+
+def _array_start(head: bytes, label: Optional[str]) -> Optional[int]:
+    """
+    Позиция первого элемента массива карт (label=None — массив под любым
+    первым ключом). None — массив не в начале файла: тогда файл целиком
+    разбирает json.
+    """
+    pos = len(_BOM) if head[:len(_BOM)] == _BOM else 0
+    start = _ARRAY_START.match(head, pos)
+    if start is None:
+        key = re.escape(label.encode()) if label is not None else rb'[^"\\]*'
+        start = re.compile(rb'\s*\{\s*"' + key + rb'"\s*:\s*\[\s*').match(head, pos)
+    return start.end() if start is not None else None
+
+
+def _scan_value(win: _Window, pos: int) -> Tuple[object, int]:
+    """
+    Элемент массива не-строка (объект карты, число, вложенный массив): json
+    по окну растущего размера. Возвращает значение и позицию за разделителем.
+    """
+    pos = _SPACE.match(win.buf, pos).end()
+    size = 1 << 16
+    while True:
+        if len(win.buf) - pos < size:
+            pos = win.fill(pos, size)
+        chunk = win.buf[pos:pos + size]
+        at_eof = win.eof and pos + size >= len(win.buf)
+        # Неполный многобайтовый символ в конце окна отложит инкрементальный декодер
+        text = codecs.getincrementaldecoder("utf-8")().decode(chunk, final=at_eof)
+        try:
+            value, end = _DECODER.raw_decode(text)
+        except json.JSONDecodeError:
+            if at_eof:
+                raise
+            size *= 4
+            continue
+        if end == len(text) and not at_eof:
+            # Значение могло продолжаться за окном (число)
+            size *= 4
+            continue
+        break
+    consumed = len(text[:end].encode("utf-8"))
+    pos = win.fill(pos, consumed + _MARGIN)
+    sep = _SEPARATOR.match(win.buf, pos + consumed)
+    if sep is None:
+        raise json.JSONDecodeError("ожидалась ',' или ']'", win.buf[pos:pos + 64].decode("utf-8", "replace"), 0)
+    return value, sep.end() if sep.group(1) == b"," else -1
+
+
+def _scan_array(win: _Window, pos: int) -> Iterator[object]:
+    """
+    Элементы JSON-массива из окна файла, начиная с pos. Строки разбирает
+    регулярное выражение (без экранирования — просто decode), остальное — json.
+    Ошибка формата всплывает как JSONDecodeError посреди чтения.
+    """
+    if _ARRAY_END.match(win.buf, pos):
+        return
+    match = _ITEM.match
+    while pos >= 0:
+        if len(win.buf) - pos < _MARGIN:
+            pos = win.fill(pos)
+        m = match(win.buf, pos)
+        while m is None and not win.eof and _STRING_START.match(win.buf, pos):
+            # Строка длиннее окна
+            pos = win.fill(pos, 2 * len(win.buf) + CHUNK)
+            m = match(win.buf, pos)
+        if m is None:
+            value, pos = _scan_value(win, pos)
+            yield value
+            continue
+        text = m.group(1).decode("utf-8")
+        # Экранирование (\n, \", \uXXXX) раскрывает сканер строк json на C
+        yield scanstring(text + '"', 0)[0] if "\\" in text else text
+        pos = m.end() if m.group(2) == b"," else -1
+
+
+def _scan_lines(f) -> Iterator[object]:
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ Строка {lineno}: ошибка JSON - {e}")
+
+
+def _scan_file(path: Path, label: Optional[str]) -> Iterator[object]:
+    """Элементы массива карт файла колоды, как они записаны в JSON"""
+    if path.suffix == ".jsonl":
+        with open(path, "rb") as f:
+            yield from _scan_lines(f)
+        return
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            logger.error(f"❌ {label}: пустой файл - {path}")
+            return
+        win = _Window(f)
+        win.fill(0)
+        pos = _array_start(win.buf, label)
+        if pos is not None:
+            yield from _scan_array(win, pos)
+            return
+        # Массив карт не в начале файла: разбираем целиком, как раньше
+        data = json.loads((win.buf + f.read()).decode("utf-8-sig"))
+        if isinstance(data, dict):
+            items = data.get(label, []) if label is not None else \
+                next((v for v in data.values() if isinstance(v, list)), [])
+        else:
+            items = data
+        if not isinstance(items, list):
+            logger.warning(f"⚠️ {label}: неизвестный формат данных")
+            return
+        yield from items
+
+
+def _entry(value: object) -> Optional[Entry]:
+    """Карта из элемента JSON: строка или {"text", "adult", "family", "tags"}"""
+    if isinstance(value, str):
+        text, flags, tags = value, 0, ()
+    elif isinstance(value, dict) and isinstance(value.get("text"), str):
+        text = value["text"]
+        flags = (ADULT if value.get("adult") else 0) | (FAMILY if value.get("family") else 0)
+        raw_tags = value.get("tags") or ()
+        tags = tuple(str(t) for t in ([raw_tags] if isinstance(raw_tags, str) else raw_tags))
+    else:
+        return None
+    text = text.strip()
+    return (text, flags, tags) if text else None
+
+
+def iter_entries(path: Path, label: Optional[str]) -> Iterator[Entry]:
+    """Карты файла колоды по одной: (текст, флаги, теги), без пустых (повторы не отсеиваются)"""
+    for value in _scan_file(path, label):
+        entry = _entry(value)
+        if entry is not None:
+            yield entry
+
+
+def iter_cards(path: Path, label: Optional[str]) -> Iterator[str]:
+    """Тексты карт файла колоды по одной"""
+    for text, _, _ in iter_entries(path, label):
+        yield text
+
+
+# ---------- сборка пакета ----------
+
+def _write_section(out, data: bytes) -> None:
+    out.write(data)
+    out.write(b"\0" * (-len(data) % 8))
+
+
+def compile_deck(src: Union[Path, Sequence[Source]], label: Optional[str], dst: Path, flags: int = 0,
+                 tags: Iterable[str] = (), shuffles: int = DEFAULT_SHUFFLES, seed: Optional[int] = None) -> int:
+    """
+    Собирает пакет dst из файла колоды src (пак base) или нескольких
+    исходников; возвращает число карт. label — ключ массива в объекте JSON
+    (None — первый массив). flags и tags добавляются ко всем картам;
+    shuffles перестановок позиций перемешиваются random.Random(seed).
+    """
+    sources = [Source(src)] if isinstance(src, Path) else list(src)
+    stats = [source.path.stat() for source in sources]
+    common_tags = tuple(tags)
+    offsets = array("Q", [0])
+    digests = array("Q")
+    card_flags = array("B")
+    card_tags: List[Tuple[int, ...]] = []
+    tag_names: Dict[str, int] = {}
+    # дайджест → позиция: повтор карты добавляет к ней свои флаги и теги
+    seen: Dict[int, int] = {}
+
+    def tag_ids(names: Iterable[str]) -> Tuple[int, ...]:
+        return tuple(sorted({tag_names.setdefault(name, len(tag_names)) for name in names}))
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=dst.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, tempfile.TemporaryFile(dir=dst.parent) as blob:
+            size = 0
+            for source in sources:
+                source_tags = (PACK_TAG + source.pack, *common_tags)
+                # Карты без своих тегов делят один кортеж id
+                source_ids = tag_ids(source_tags)
+                for text, card_flag, names in iter_entries(source.path, label):
+                    raw = text.encode("utf-8")
+                    d = digest_bytes(raw)
+                    ids = tag_ids(names + source_tags) if names else source_ids
+                    card_flag |= source.flags | flags
+                    pos = seen.get(d)
+                    if pos is not None:
+                        card_flags[pos] |= card_flag
+                        if not set(ids) <= set(card_tags[pos]):
+                            card_tags[pos] = tuple(sorted(set(card_tags[pos]) | set(ids)))
+                        continue
+                    seen[d] = len(digests)
+                    blob.write(raw)
+                    size += len(raw)
+                    offsets.append(size)
+                    digests.append(d)
+                    card_flags.append(card_flag)
+                    card_tags.append(ids)
+            del seen
+
+            if len(tag_names) > 0xFFFF:
+                raise ValueError(f"слишком много тегов: {len(tag_names)}")
+            count = len(digests)
+            tag_offsets = array("I", [0])
+            tag_refs = array("H")
+            for ids in card_tags:
+                tag_refs.extend(ids)
+                tag_offsets.append(len(tag_refs))
+            del card_tags
+
+            if seed is None:
+                seed = random.SystemRandom().getrandbits(63)
+            rng = random.Random(seed)
+            meta = json.dumps({
+                "sources": [source.path.name for source in sources],
+                "packs": list(dict.fromkeys(source.pack for source in sources)),
+                "label": label,
+                "seed": seed,
+                "tags": sorted(tag_names, key=tag_names.__getitem__),
+            }, ensure_ascii=False).encode("utf-8")
+
+            # Отметка исходников для кэша: по ней open_deck решает, пересобирать ли пакет
+            src_size = sum(stat.st_size for stat in stats)
+            src_mtime = max(stat.st_mtime_ns for stat in stats)
+            out.write(HEADER.pack(MAGIC, src_size, src_mtime, count, shuffles, len(tag_refs), len(meta)))
+            _write_section(out, offsets.tobytes())
+            _write_section(out, digests.tobytes())
+            _write_section(out, array("Q", sorted(digests)).tobytes())
+            _write_section(out, array("I", sorted(range(count), key=digests.__getitem__)).tobytes())
+            _write_section(out, card_flags.tobytes())
+            _write_section(out, tag_offsets.tobytes())
+            _write_section(out, tag_refs.tobytes())
+            for _ in range(shuffles):
+                order = list(range(count))
+                rng.shuffle(order)
+                _write_section(out, array("I", order).tobytes())
+            _write_section(out, meta)
+            blob.seek(0)
+            while chunk := blob.read(1 << 20):
+                out.write(chunk)
+        # mkstemp создаёт файл 0600, а пакет читают и другие процессы
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dst)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    names = ", ".join(source.path.name for source in sources)
+    logger.info(f"🗂 Пакет колоды {names}: {count} карт, тегов {len(tag_names)}, перестановок {shuffles}")
+    return count
+
+
+def open_deck(src: Path, label: str, cache_dir: Path) -> CardIndex:
+    """
+    Пакет колоды src: .pack открывается как есть, для JSON — пакет из
+    кэша или собранный заново. Если в cache_dir нельзя писать, кэш
+    переезжает во временный каталог. Нечитаемый файл — пустая колода.
+    """
+    try:
+        stat = src.stat()
+    except FileNotFoundError:
+        logger.error(f"❌ {label}: файл не найден - {src}")
+        return CardIndex()
+    try:
+        if src.suffix == ".pack":
+            return CardIndex(src)
+        dst = cache_dir / f"{src.name}.pack"
+        if CardIndex.stamp(dst) == (stat.st_size, stat.st_mtime_ns):
+            store = CardIndex(dst)
+            # Пакеты без паков собраны старым компилятором — пересобираем
+            if "packs" in store.meta:
+                return store
+        compile_deck(src, label, dst)
+        return CardIndex(dst)
+    except ValueError as e:
+        # JSONDecodeError, UnicodeDecodeError, чужой формат пакета
+        logger.error(f"❌ {label}: файл не читается - {src}: {e}")
+        return CardIndex()
+    except OSError as e:
+        # Каталог кэша только для чтения, диск полон, нет прав
+        fallback = Path(tempfile.gettempdir()) / "deck_index"
+        if src.suffix != ".pack" and cache_dir != fallback:
+            logger.warning(f"⚠️ {label}: пакет не записан в {cache_dir}: {e} — собираю в {fallback}")
+            return open_deck(src, label, fallback)
+        logger.error(f"❌ {label}: файл не читается - {src}: {e}")
+        return CardIndex()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Компиляция колоды в бинарный пакет")
+    parser.add_argument("sources", nargs="+", metavar="[ИМЯ[:adult|:family]=]ПУТЬ",
+                        help="JSON или JSON Lines с картами; ИМЯ — пак (по умолчанию base)")
+    parser.add_argument("-o", "--output", type=Path, help="файл пакета (по умолчанию <первый исходник>.pack)")
+    parser.add_argument("--label", help="ключ массива в объекте JSON (по умолчанию — первый массив)")
+    parser.add_argument("--adult", action="store_true", help="пометить все карты как взрослые")
+    parser.add_argument("--family", action="store_true", help="пометить все карты как семейные")
+    parser.add_argument("--tag", action="append", default=[], help="тег всех карт пакета (можно несколько)")
+    parser.add_argument("--shuffles", type=int, default=DEFAULT_SHUFFLES, help="число перестановок")
+    parser.add_argument("--seed", type=int, help="зерно перестановок (воспроизводимая сборка)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    flags = (ADULT if args.adult else 0) | (FAMILY if args.family else 0)
+    try:
+        sources = [Source.parse(spec) for spec in args.sources]
+        dst = args.output or sources[0].path.with_suffix(".pack")
+        compile_deck(sources, args.label, dst, flags, args.tag, max(0, args.shuffles), args.seed)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    print(f"💾 {dst}")
+
+
+if __name__ == "__main__":
+    main()
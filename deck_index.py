@@ -0,0 +1,187 @@
+# deck_index.py
+"""
+Бинарный пакет колоды и доступ к нему через mmap.
+
+Пакет собирает deck_compiler: заранее (python -m deck_compiler) или сам
+при первом запуске — в каталог кэша .deck_index/. Формат:
+
+    заголовок   MAGIC, размер и mtime исходника, число карт, число
+                перестановок, число ссылок на теги, размер метаданных
+    offsets     (n + 1) × uint64 — границы карт в blob
+    digests     n × uint64 — дайджест карты по позиции
+    sorted      n × uint64 + n × uint32 — дайджесты по возрастанию и позиции
+    flags       n × uint8 — ADULT / FAMILY
+    tag offsets (n + 1) × uint32 — границы тегов карты в tag ids
+    tag ids     m × uint16 — номера тегов в meta["tags"]
+    shuffles    k × n × uint32 — заранее перемешанные позиции карт
+    meta        JSON: имена тегов, зерно перестановок, исходник
+    blob        тексты карт в UTF-8 подряд
+
+Каждая секция выровнена на 8 байт. CardIndex декодирует карту при
+обращении: память процесса не растёт с размером колоды, страницы файла
+общие для всех процессов. Пакет подменяется атомарно (os.replace): уже
+открытые версии читают старый файл до закрытия.
+"""
+import hashlib
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+MAGIC = b"DECKPAK2"
+# MAGIC, размер исходника, mtime_ns исходника, число карт, число перестановок,
+# число ссылок на теги, размер метаданных
+HEADER = struct.Struct("<8sQqIIQQ")
+
+# Флаги карты
+ADULT = 1
+FAMILY = 2
+
+
+def digest_bytes(raw: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+def digest(text: str) -> int:
+    """64-битный дайджест текста карты"""
+    return digest_bytes(text.encode("utf-8"))
+
+
+class CardIndex:
+    """Тексты и метаданные карт пакета: последовательность строк поверх mmap"""
+
+    __slots__ = ("path", "meta", "tag_names", "_mm", "_offsets", "_digests", "_sorted", "_positions",
+                 "_flags", "_tag_offsets", "_tag_ids", "_shuffles", "_blob")
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._mm = None
+        if path is None:
+            # Пустая колода (файла нет)
+            empty = memoryview(b"")
+            self.meta: Dict[str, Any] = {}
+            self.tag_names: Tuple[str, ...] = ()
+            self._offsets = memoryview(array("Q", [0]))
+            self._digests = self._sorted = empty.cast("Q")
+            self._positions = empty.cast("I")
+            self._flags = empty.cast("B")
+            self._tag_offsets = memoryview(array("I", [0]))
+            self._tag_ids = empty.cast("H")
+            self._shuffles: Tuple[memoryview, ...] = ()
+            self._blob = empty
+            return
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        try:
+            magic, _, _, count, shuffles, tag_refs, meta_size = HEADER.unpack_from(view)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            raise ValueError("не пакет колоды или старый формат")
+        pos = HEADER.size
+
+        def take(typecode: str, n: int) -> memoryview:
+            nonlocal pos
+            size = n * array(typecode).itemsize
+            part = view[pos:pos + size].cast(typecode)
+            pos += size + (-size % 8)
+            return part
+
+        self._offsets = take("Q", count + 1)
+        self._digests = take("Q", count)
+        self._sorted = take("Q", count)
+        self._positions = take("I", count)
+        self._flags = take("B", count)
+        self._tag_offsets = take("I", count + 1)
+        self._tag_ids = take("H", tag_refs)
+        self._shuffles = tuple(take("I", count) for _ in range(shuffles))
+        self.meta = json.loads(bytes(take("B", meta_size)))
+        self.tag_names = tuple(self.meta.get("tags", ()))
+        self._blob = view[pos:]
+
+    @staticmethod
+    def stamp(path: Path) -> Optional[Tuple[int, int]]:
+        """(размер, mtime_ns) исходника, записанные в пакете"""
+        try:
+            with open(path, "rb") as f:
+                magic, size, mtime_ns, *_ = HEADER.unpack(f.read(HEADER.size))
+        except (OSError, struct.error):
+            return None
+        return (size, mtime_ns) if magic == MAGIC else None
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def __getitem__(self, pos: int) -> str:
+        if pos < 0:
+            pos += len(self)
+        return str(self._blob[self._offsets[pos]:self._offsets[pos + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for pos in range(len(self)):
+            yield self[pos]
+
+    def digest_at(self, pos: int) -> int:
+        return self._digests[pos]
+
+    def find_digest(self, d: int) -> int:
+        """Позиция карты с дайджестом d или -1"""
+        i = bisect_left(self._sorted, d)
+        if i < len(self._sorted) and self._sorted[i] == d:
+            return self._positions[i]
+        return -1
+
+    def fingerprint(self) -> int:
+        """Дайджест набора карт пакета (не зависит от порядка карт в файле)"""
+        return digest_bytes(self._sorted.tobytes())
+
+    def content_digest(self) -> int:
+        """Дайджест содержимого пакета: карты по порядку, их флаги и теги"""
+        h = hashlib.blake2b(digest_size=8)
+        for section in (self._digests, self._flags, self._tag_offsets, self._tag_ids):
+            h.update(section)
+        h.update(json.dumps(self.tag_names, ensure_ascii=False).encode("utf-8"))
+        return int.from_bytes(h.digest(), "little")
+
+    def find(self, text: str) -> int:
+        """Позиция карты с текстом text или -1"""
+        pos = self.find_digest(digest(text))
+        return pos if pos >= 0 and self[pos] == text else -1
+
+    # ---------- метаданные ----------
+
+    def flags_at(self, pos: int) -> int:
+        return self._flags[pos]
+
+    def tags_at(self, pos: int) -> Tuple[str, ...]:
+        start, end = self._tag_offsets[pos], self._tag_offsets[pos + 1]
+        return tuple(self.tag_names[i] for i in self._tag_ids[start:end])
+
+    def flag_mask(self, flag: int) -> bytes:
+        """Маска карт с флагом flag: по байту на позицию, 1 — флаг стоит"""
+        table = bytes(1 if value & flag else 0 for value in range(256))
+        return bytes(self._flags).translate(table)
+
+    def tag_masks(self) -> Dict[str, bytearray]:
+        """Маски карт по тегам: тег → по байту на позицию"""
+        masks = [bytearray(len(self)) for _ in self.tag_names]
+        if self.tag_names:
+            offsets, ids = self._tag_offsets, self._tag_ids
+            for pos in range(len(self)):
+                for i in ids[offsets[pos]:offsets[pos + 1]]:
+                    masks[i][pos] = 1
+        return dict(zip(self.tag_names, masks))
+
+    @property
+    def shuffles(self) -> int:
+        """Число заранее перемешанных перестановок позиций"""
+        return len(self._shuffles)
+
+    def shuffle(self, k: int) -> memoryview:
+        """k-я перестановка позиций карт (uint32, только чтение)"""
+        return self._shuffles[k]
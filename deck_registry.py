@@ -0,0 +1,506 @@
+# deck_registry.py
+"""
+Колоды ситуаций и ответов с горячей перезагрузкой.
+
+- Тексты карт лежат в бинарных пакетах (deck_index.CardIndex, mmap):
+  готовый .pack открывается как есть, JSON-файлы deck_compiler разбирает
+  потоково в пакет в кэше. В памяти процесса — только массивы id, а не
+  списки строк.
+- Раздача (deal_order) идёт по заранее перемешанной перестановке пакета
+  со случайного места: рука добирается за O(размер руки), а не за
+  перемешивание всей колоды.
+- Режим чата (семейный / взрослый) и выключенные паки — маски
+  content_index, общие для чатов с одинаковыми настройками: for_chat()
+  возвращает ChatDeck, раздача пропускает карты вне маски за O(1).
+- Умная раздача: индекс пар pairing_index (лучшие ответы ситуации,
+  посчитанные заранее: python -m pairing_index), если задан pairs_top_k;
+  ChatDeck.best_answers() отдаёт их за O(k). При запуске индекс только
+  открывается из кэша; если его нет — собирается в потоке start(), до
+  этого раздача обычная.
+- DeckSnapshot — неизменяемая версия колоды. Обработчики читают её, не
+  боясь, что списки поменяются между двумя обращениями.
+- DeckRegistry держит текущую версию. reload() разбирает файлы в потоке,
+  сравнивает с текущей версией и подменяет её одним присваиванием —
+  раунд никогда не видит наполовину обновлённую колоду.
+- id карты привязан к тексту и не меняется между версиями: новые карты
+  получают новые id, удалённые остаются «списанными» — их текст по-прежнему
+  доступен по id (для рук и ответов идущих раундов), но они больше не
+  раздаются. Поэтому перезагрузка не перенумеровывает карты в сессиях;
+  подписчики (on_reload) только убирают списанные карты.
+- Необязательное наблюдение за файлами: DECK_WATCH_INTERVAL секунд между
+  проверками mtime (0 — выключено).
+"""
+import asyncio
+import logging
+import random
+from array import array
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, replace
+from itertools import chain
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from content_index import DEFAULT_MODE, ContentIndex
+from deck_compiler import open_deck
+from deck_index import CardIndex, digest
+from pairing_index import PairingIndex, open_pairs
+
+logger = logging.getLogger(__name__)
+
+# Позиция списанной карты: её нет в текущем файле
+RETIRED = 0xFFFFFFFF
+
+
+class CardTable(Sequence):
+    """
+    Тексты карт по id. Без перезагрузок id совпадает с позицией карты в
+    индексе; после перезагрузки pos_of_id переводит id в позицию, а тексты
+    списанных карт хранятся в retired.
+    """
+
+    __slots__ = ("store", "pos_of_id", "id_of_pos", "retired", "retired_ids", "_retired_digests", "_content")
+
+    def __init__(self, store: CardIndex, pos_of_id: Optional[array] = None, id_of_pos: Optional[array] = None,
+                 retired: Optional[Dict[int, str]] = None):
+        self.store = store
+        self.pos_of_id = pos_of_id
+        self.id_of_pos = id_of_pos
+        self.retired = retired or {}
+        self.retired_ids: FrozenSet[int] = frozenset(self.retired)
+        self._retired_digests = {digest(text): card_id for card_id, text in self.retired.items()}
+        self._content: Optional[ContentIndex] = None
+
+    @classmethod
+    def after(cls, store: CardIndex, previous: Optional["CardTable"]) -> "CardTable":
+        """Таблица нового файла: карты из previous сохраняют id, новые получают следующие"""
+        if previous is None:
+            return cls(store)
+        total = len(previous)
+        pos_of_id = array("I", [RETIRED]) * total
+        id_of_pos = array("I")
+        for pos in range(len(store)):
+            card_id = previous.id_of_digest(store.digest_at(pos))
+            if card_id is None:
+                card_id = total
+                total += 1
+                pos_of_id.append(pos)
+            else:
+                pos_of_id[card_id] = pos
+            id_of_pos.append(card_id)
+
+        retired = {card_id: previous[card_id] for card_id, pos in enumerate(pos_of_id) if pos == RETIRED}
+        if not retired and all(card_id == pos for pos, card_id in enumerate(id_of_pos)):
+            return cls(store)
+        return cls(store, pos_of_id, id_of_pos, retired)
+
+    def __len__(self) -> int:
+        return len(self.pos_of_id) if self.pos_of_id is not None else len(self.store)
+
+    def __getitem__(self, card_id: int) -> str:
+        if self.pos_of_id is None:
+            return self.store[card_id]
+        pos = self.pos_of_id[card_id]
+        return self.retired[card_id] if pos == RETIRED else self.store[pos]
+
+    @property
+    def live_ids(self) -> Sequence:
+        """id карт текущего файла в порядке файла"""
+        return self.id_of_pos if self.id_of_pos is not None else range(len(self.store))
+
+    @property
+    def content(self) -> ContentIndex:
+        """Маски режимов и паков (строятся при первом обращении)"""
+        if self._content is None:
+            self._content = ContentIndex(self.store)
+        return self._content
+
+    def shuffled(self, mask: Optional[bytes] = None) -> Iterator[int]:
+        """
+        id карт текущего файла (из маски mask, если задана) в случайном
+        порядке, лениво: обход случайной перестановки пакета со случайного
+        места (без перестановок — shuffle)
+        """
+        store = self.store
+        count = len(store)
+        if not count:
+            return
+        id_of_pos = self.id_of_pos
+        if not store.shuffles:
+            order = list(self.content.positions(mask))
+            random.shuffle(order)
+        else:
+            perm = store.shuffle(random.randrange(store.shuffles))
+            start = random.randrange(count)
+            order = chain(perm[start:], perm[:start])
+        for pos in order:
+            if mask is None or mask[pos]:
+                yield pos if id_of_pos is None else id_of_pos[pos]
+
+    def digest_of(self, card_id: int) -> int:
+        pos = card_id if self.pos_of_id is None else self.pos_of_id[card_id]
+        return digest(self.retired[card_id]) if pos == RETIRED else self.store.digest_at(pos)
+
+    def live_ids_of_digests(self, digests: Iterable[int], mask: Optional[bytes] = None) -> List[int]:
+        """id карт текущего файла (из маски mask) с дайджестами digests, в том же порядке"""
+        ids = []
+        for d in digests:
+            pos = self.store.find_digest(d) if d else -1
+            if pos >= 0 and (mask is None or mask[pos]):
+                ids.append(pos if self.id_of_pos is None else self.id_of_pos[pos])
+        return ids
+
+    def id_of_digest(self, d: int) -> Optional[int]:
+        pos = self.store.find_digest(d)
+        if pos >= 0:
+            return self.id_of_pos[pos] if self.id_of_pos is not None else pos
+        return self._retired_digests.get(d)
+
+    def id_of(self, text: str) -> Optional[int]:
+        card_id = self.id_of_digest(digest(text))
+        return card_id if card_id is not None and self[card_id] == text else None
+
+
+class CardIds(Mapping):
+    """Текст → id поверх CardTable (для восстановления сессий из текстов)"""
+
+    __slots__ = ("table",)
+
+    def __init__(self, table: CardTable):
+        self.table = table
+
+    def __getitem__(self, text: str) -> int:
+        card_id = self.table.id_of(text) if isinstance(text, str) else None
+        if card_id is None:
+            raise KeyError(text)
+        return card_id
+
+    def __contains__(self, text: object) -> bool:
+        return isinstance(text, str) and self.table.id_of(text) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.table)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+@dataclass(frozen=True, slots=True)
+class DeckSnapshot:
+    """
+    Версия колоды. Таблицы карт не меняются после создания.
+
+    situations / answers — тексты по id, включая списанные карты;
+    live_* — id карт, которые есть в файлах сейчас, в порядке файлов.
+    """
+    version: int
+    stamp: Tuple[Tuple[int, int], ...]
+    situations: CardTable
+    answers: CardTable
+    # Лучшие ответы ситуаций (пустой — умная раздача выключена)
+    pairs: PairingIndex = PairingIndex()
+
+    @property
+    def situation_ids(self) -> CardIds:
+        return CardIds(self.situations)
+
+    @property
+    def answer_ids(self) -> CardIds:
+        return CardIds(self.answers)
+
+    @property
+    def live_situation_ids(self) -> Sequence:
+        return self.situations.live_ids
+
+    @property
+    def live_answer_ids(self) -> Sequence:
+        return self.answers.live_ids
+
+    @property
+    def retired_answer_ids(self) -> FrozenSet[int]:
+        return self.answers.retired_ids
+
+    def get_random_situation(self) -> str:
+        if not self.live_situation_ids:
+            return "Тестовая ситуация"
+        return self.situations[random.choice(self.live_situation_ids)]
+
+    def get_new_shuffled_answers_deck(self) -> List[str]:
+        deck = [self.answers[c] for c in self.live_answer_ids]
+        random.shuffle(deck)
+        return deck
+
+    def get_new_shuffled_answer_ids(self) -> List[int]:
+        """Перемешанные id карт ответов, которые можно раздавать"""
+        deck = list(self.live_answer_ids)
+        random.shuffle(deck)
+        return deck
+
+    def deal_order(self) -> Iterator[int]:
+        """Живые id ответов в случайном порядке, лениво — для раздачи"""
+        return self.answers.shuffled()
+
+    def for_chat(self, mode: str = DEFAULT_MODE, disabled: Iterable[str] = ()) -> "ChatDeck":
+        """Карты, доступные чату с режимом mode и выключенными паками disabled"""
+        disabled = frozenset(disabled)
+        return ChatDeck(self, self.situations.content.eligible(mode, disabled),
+                        self.answers.content.eligible(mode, disabled))
+
+    def warm(self) -> None:
+        """Строит маски паков заранее (вызывается в потоке)"""
+        self.situations.content
+        self.answers.content
+
+    def packs(self) -> Dict[str, Tuple[int, int]]:
+        """Пак → (ситуаций, ответов)"""
+        sits = self.situations.content.pack_sizes()
+        answers = self.answers.content.pack_sizes()
+        return {name: (sits.get(name, 0), answers.get(name, 0)) for name in sorted(sits.keys() | answers.keys())}
+
+    def get_all_situations(self) -> List[str]:
+        return [self.situations[s] for s in self.live_situation_ids]
+
+    def get_random_from_list(self, situations_list: List[str]) -> str:
+        return random.choice(situations_list) if situations_list else "Тестовая ситуация"
+
+
+@dataclass(frozen=True, slots=True)
+class ChatDeck:
+    """
+    Версия колоды глазами чата: маски доступных карт (None — все). Маски
+    общие для чатов с одинаковыми настройками и считаются раз на версию.
+    """
+    deck: DeckSnapshot
+    situations_mask: Optional[bytes]
+    answers_mask: Optional[bytes]
+
+    @property
+    def situation_count(self) -> int:
+        return self.deck.situations.content.count(self.situations_mask)
+
+    @property
+    def answer_count(self) -> int:
+        return self.deck.answers.content.count(self.answers_mask)
+
+    @property
+    def filtered_out(self) -> bool:
+        """Режим и паки чата не оставили ни одной ситуации или ни одного ответа"""
+        return ((self.situations_mask is not None and not self.situation_count)
+                or (self.answers_mask is not None and not self.answer_count))
+
+    def allows_answer(self, card_id: int) -> bool:
+        """Можно ли раздавать чату ответ card_id (списанные — нельзя)"""
+        table = self.deck.answers
+        pos = card_id if table.pos_of_id is None else table.pos_of_id[card_id]
+        if pos == RETIRED or pos >= len(table.store):
+            return False
+        return self.answers_mask is None or bool(self.answers_mask[pos])
+
+    def situation_order(self) -> Iterator[int]:
+        """id доступных ситуаций в случайном порядке, лениво"""
+        return self.deck.situations.shuffled(self.situations_mask)
+
+    def deal_order(self) -> Iterator[int]:
+        """id доступных ответов в случайном порядке, лениво — для раздачи"""
+        return self.deck.answers.shuffled(self.answers_mask)
+
+    def best_answers(self, situation_id: int) -> List[int]:
+        """id доступных ответов, лучше всего подходящих к ситуации (по индексу пар), лучшие первыми"""
+        pairs = self.deck.pairs
+        if not len(pairs):
+            return []
+        return self.deck.answers.live_ids_of_digests(pairs.answers(self.deck.situations.digest_of(situation_id)),
+                                                     self.answers_mask)
+
+
+@dataclass(frozen=True, slots=True)
+class DeckDiff:
+    """Разница двух версий колоды: id добавленных и списанных карт"""
+    old_version: int
+    new_version: int
+    added_situations: FrozenSet[int] = frozenset()
+    removed_situations: FrozenSet[int] = frozenset()
+    added_answers: FrozenSet[int] = frozenset()
+    removed_answers: FrozenSet[int] = frozenset()
+
+    @staticmethod
+    def _changes(old: CardTable, new: CardTable) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        # id не переиспользуются: новые карты — id за концом старой таблицы
+        # и вернувшиеся из списанных
+        added = frozenset(range(len(old), len(new))) | (old.retired_ids - new.retired_ids)
+        return added, new.retired_ids - old.retired_ids
+
+    @classmethod
+    def between(cls, old: DeckSnapshot, new: DeckSnapshot) -> "DeckDiff":
+        added_sits, removed_sits = cls._changes(old.situations, new.situations)
+        added_answers, removed_answers = cls._changes(old.answers, new.answers)
+        return cls(old.version, new.version, added_sits, removed_sits, added_answers, removed_answers)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added_situations or self.removed_situations or self.added_answers or self.removed_answers)
+
+    def summary(self) -> str:
+        if not self.changed:
+            return f"Колоды не изменились (версия {self.old_version})"
+        return (f"Версия {self.old_version} → {self.new_version}: "
+                f"ситуации +{len(self.added_situations)}/−{len(self.removed_situations)}, "
+                f"ответы +{len(self.added_answers)}/−{len(self.removed_answers)}")
+
+
+class DeckRegistry:
+    """
+    Текущая версия колоды и её перезагрузка. Атрибуты и методы снимка
+    доступны прямо на реестре (decks.answers, decks.get_random_situation()),
+    каждое обращение — к версии, текущей на этот момент.
+    """
+
+    def __init__(self, situations_file: str = "situations.json", answers_file: str = "answers.json",
+                 base: Optional[Path] = None, watch_interval: float = 0.0, index_dir: Optional[Path] = None,
+                 pairs_top_k: int = 0):
+        self.base_dir = base or Path(__file__).resolve().parent
+        self.sit_path = (self.base_dir / situations_file).resolve()
+        self.ans_path = (self.base_dir / answers_file).resolve()
+        # Пакеты JSON-колод (deck_compiler): пересобираются при изменении файлов
+        self.index_dir = index_dir or self.base_dir / ".deck_index"
+        self.watch_interval = watch_interval
+        # Ответов на ситуацию в индексе пар; 0 — индекс не нужен
+        self.pairs_top_k = pairs_top_k
+        self._subscribers: List[Callable[[DeckDiff], None]] = []
+        self._lock = asyncio.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        # Маски паков первой версии строятся в потоке после запуска
+        self._warmup: Optional[asyncio.Task] = None
+
+        logger.debug(f"📂 situations path: {self.sit_path}")
+        logger.debug(f"📂 answers path: {self.ans_path}")
+
+        self._current = self._build(None)
+        logger.info(f"✅ situations loaded: {len(self._current.live_situation_ids)}")
+        logger.info(f"✅ answers loaded: {len(self._current.live_answer_ids)}")
+
+    def __getattr__(self, name: str) -> Any:
+        # Вызывается только для имён, которых нет у самого реестра
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current, name)
+
+    @property
+    def current(self) -> DeckSnapshot:
+        return self._current
+
+    def on_reload(self, callback: Callable[[DeckDiff], None]) -> None:
+        """callback(diff) вызывается сразу после подмены версии, в том же шаге цикла"""
+        self._subscribers.append(callback)
+
+    # ---------- загрузка ----------
+
+    def _build(self, previous: Optional[DeckSnapshot]) -> DeckSnapshot:
+        """Открывает пакеты колод; при неизменных файлах или неизменном содержимом возвращает previous"""
+        stamp = self._stamp()
+        if previous is not None and stamp == previous.stamp:
+            return previous
+        situations = open_deck(self.sit_path, "situations", self.index_dir)
+        answers = open_deck(self.ans_path, "answers", self.index_dir)
+        if previous is not None and (
+                (situations.content_digest(), answers.content_digest())
+                == (previous.situations.store.content_digest(), previous.answers.store.content_digest())):
+            # Файлы переписаны, а карты, флаги и теги те же (touch, переформатирование)
+            return previous
+        if previous is None:
+            # Первая версия собирается при импорте: индекс пар — только готовый, сборка — в start()
+            return DeckSnapshot(1, stamp, CardTable(situations), CardTable(answers),
+                                self._pairs(situations, answers, build=False))
+        if not (len(situations) and len(answers)):
+            raise RuntimeError("новая колода пуста или не читается — оставлена прежняя версия")
+        snapshot = DeckSnapshot(previous.version + 1, stamp,
+                                CardTable.after(situations, previous.situations),
+                                CardTable.after(answers, previous.answers),
+                                self._pairs(situations, answers))
+        # Маски — здесь, в потоке перезагрузки, а не в первом раунде новой версии
+        snapshot.warm()
+        return snapshot
+
+    def _pairs(self, situations: CardIndex, answers: CardIndex, build: bool = True) -> PairingIndex:
+        if not (self.pairs_top_k and len(situations) and len(answers)):
+            return PairingIndex()
+        return open_pairs(situations, answers, self.index_dir, self.pairs_top_k, build)
+
+    async def _warm_up(self) -> None:
+        """Маски паков первой версии и, если его не было в кэше, индекс пар — в потоке"""
+        snapshot = self._current
+        await asyncio.to_thread(snapshot.warm)
+        if not self.pairs_top_k or len(snapshot.pairs):
+            return
+        async with self._lock:
+            if self._current is not snapshot:
+                # Перезагрузка уже собрала индекс для новой версии
+                return
+            logger.info("🧩 Индекса пар нет в кэше — собираю в фоне")
+            pairs = await asyncio.to_thread(self._pairs, snapshot.situations.store, snapshot.answers.store)
+            self._current = replace(snapshot, pairs=pairs)
+
+    async def reload(self) -> DeckDiff:
+        """Перечитывает файлы в потоке и атомарно подменяет версию колоды"""
+        async with self._lock:
+            old = self._current
+            new = await asyncio.to_thread(self._build, old)
+            if new is old:
+                return DeckDiff(old.version, old.version)
+            diff = await asyncio.to_thread(DeckDiff.between, old, new)
+            # Подмена и миграция сессий — без await между ними
+            self._current = new
+            for callback in self._subscribers:
+                try:
+                    callback(diff)
+                except Exception as e:
+                    logger.exception(f"❌ Ошибка обработчика перезагрузки колоды: {e}")
+        logger.info(f"🔄 Колода перезагружена. {diff.summary()}")
+        return diff
+
+    # ---------- наблюдение за файлами ----------
+
+    def _stamp(self) -> Tuple[Tuple[int, int], ...]:
+        stamps = []
+        for path in (self.sit_path, self.ans_path):
+            try:
+                st = path.stat()
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamps.append((0, 0))
+        return tuple(stamps)
+
+    def start(self) -> None:
+        if self._warmup is None:
+            self._warmup = asyncio.create_task(self._warm_up(), name="deck-warmup")
+        if self.watch_interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_loop(), name="deck-watcher")
+            logger.info(f"👀 Наблюдение за колодами: раз в {self.watch_interval:g} с")
+
+    async def stop(self) -> None:
+        if self._warmup is not None:
+            await self._warmup
+            self._warmup = None
+        if self._watcher:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch_loop(self) -> None:
+        seen = self._stamp()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            stamp = self._stamp()
+            if stamp == seen:
+                continue
+            # Файл может ещё дописываться: ждём, пока отметки перестанут меняться
+            await asyncio.sleep(self.watch_interval)
+            if self._stamp() != stamp:
+                continue
+            seen = stamp
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.warning(f"⚠️ Колода не перезагружена: {e}")
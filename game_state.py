@@ -1,124 +1,239 @@
-import random
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from content_index import DEFAULT_MODE
 
 # Константа размера руки
 HAND_SIZE = 10
 
-# Словарь хранения игровых сессий: chat_id → GameSession
-game_states: dict[int, 'GameSession'] = {}
+# Фазы раунда: waiting → answering → judging → finished
+PHASES = ("waiting", "answering", "judging", "finished")
+
+# Допустимые переходы. answering → finished — раунд отменён (никто не ответил
+# или прерван перезапуском); finished → answering — следующий раунд.
+TRANSITIONS = {
+    "waiting": ("answering",),
+    "answering": ("judging", "finished"),
+    "judging": ("finished",),
+    "finished": ("answering",),
+}
+
+
+def new_hand(card_ids: Iterable[int] = ()) -> array:
+    """Рука игрока — компактный массив id карт ответов (4 байта на карту)"""
+    return array("I", card_ids)
+
+
+@dataclass(slots=True)
+class Player:
+    user_id: int
+    username: str
+    is_bot: bool = False
+    # Объект бота-игрока (BotPlayer) — только в памяти, не сериализуется
+    bot_instance: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def label(self) -> str:
+        """Имя с пометкой бота для сообщений в чат"""
+        return f"{self.username} 🤖" if self.is_bot else self.username
+
 
+@dataclass(slots=True)
 class GameSession:
-    def __init__(self, chat_id):
-        self.chat_id = chat_id
-        self.players = []             # [{'user_id':…, 'username':…}]
-        self.scores: dict[int, int] = {}  # user_id → очки
-        self.host_index = -1
-        self.round = 0
-        self.state = "waiting"
-        self.answers = {}             # user_id → карта
-        self.current_situation = None
-        self.used_situations = []
-        self.hands: dict[int, list] = {}  # user_id → [карт]
-        self.used_cards = []          # Использованные карты для уникальности
-        self.main_deck = []           # Основная колода карт
-
-    def add_player(self, user_id, username):
-        if user_id not in [p['user_id'] for p in self.players]:
-            self.players.append({"user_id": user_id, "username": username})
-            self.scores[user_id] = 0
-
-    def next_host(self):
-        self.host_index = (self.host_index + 1) % len(self.players)
-        return self.players[self.host_index]
-
-    def get_host(self):
-        if self.host_index >= 0 and self.players:
-            return self.players[self.host_index]
+    """
+    Состояние игры в одном чате.
+
+    Карты хранятся как id колоды (decks.answers / decks.situations); id
+    не меняются между версиями колоды, тексты берутся из неё при показе. Игроки доступны
+    по user_id через player_index за O(1).
+    """
+    chat_id: int
+    players: List[Player] = field(default_factory=list)
+    player_index: Dict[int, Player] = field(default_factory=dict)
+    scores: Dict[int, int] = field(default_factory=dict)
+    hands: Dict[int, array] = field(default_factory=dict)
+    # user_id → id выбранной карты
+    answers: Dict[int, int] = field(default_factory=dict)
+    # (user_id, id карты) в порядке показа ведущему
+    shuffled_answers: List[Tuple[int, int]] = field(default_factory=list)
+    host_idx: int = -1
+    current_situation: Optional[str] = None
+    used_answers: Set[int] = field(default_factory=set)
+    used_situations: Set[int] = field(default_factory=set)
+    phase: str = "waiting"
+    # Номер раунда: зашит в callback_data кнопок, чтобы отсеивать кнопки прошлых раундов
+    round_id: int = 0
+    human_acted: bool = False
+    idle_rounds: int = 0
+    # Живое сообщение раунда в группе (см. round_message): id, фото ли это и текущий текст
+    round_message_id: int = 0
+    round_message_photo: bool = False
+    round_message_text: str = ""
+    # Настройки колоды чата (см. content_index): режим и выключенные паки
+    mode: str = DEFAULT_MODE
+    disabled_packs: Set[str] = field(default_factory=set)
+    # Начало текущего раунда (unix time) — для журнала статистики
+    round_started_at: float = 0.0
+
+    # ---------- игроки ----------
+
+    def add_player(self, user_id: int, username: str, is_bot: bool = False, bot_instance: Any = None) -> Player:
+        player = self.player_index.get(user_id)
+        if player is None:
+            player = Player(user_id, username, is_bot, bot_instance)
+            self.players.append(player)
+            self.player_index[user_id] = player
+            self.scores.setdefault(user_id, 0)
+        return player
+
+    def get_player(self, user_id: int) -> Optional[Player]:
+        return self.player_index.get(user_id)
+
+    @property
+    def host(self) -> Optional[Player]:
+        if self.host_idx >= 0 and self.players:
+            return self.players[self.host_idx]
         return None
 
-    def reset_round(self):
-        self.answers = {}
-        self.current_situation = None
-        self.round += 1
-        # Не очищаем руки, чтобы сохранить 9 карт у игроков
+    def next_host(self) -> Player:
+        self.host_idx = (self.host_idx + 1) % len(self.players)
+        return self.players[self.host_idx]
 
-    def all_answers_received(self):
-        # Ведущий не отвечает
-        return len(self.answers) >= len(self.players) - 1
+    def non_host_players(self) -> List[Player]:
+        host = self.host
+        return [p for p in self.players if p is not host]
+
+    def has_humans(self) -> bool:
+        return any(not p.is_bot for p in self.players)
+
+    def count_players(self) -> Tuple[int, int]:
+        """(людей, ботов)"""
+        bots = sum(1 for p in self.players if p.is_bot)
+        return len(self.players) - bots, bots
 
-    def prepare_deck(self, all_cards: list):
-        """Подготовить колоду без использованных карт"""
-        self.main_deck = [card for card in all_cards if card not in self.used_cards]
-        random.shuffle(self.main_deck)
-        # Автоматический сброс used_cards, если карт мало
-        needed = (len(self.players) - 1) * HAND_SIZE
-        if len(self.main_deck) < needed:
-            self.used_cards.clear()
-            self.main_deck = all_cards.copy()
-            random.shuffle(self.main_deck)
-
-    def deal_initial_hands(self):
-        """Общая раздача 10 карт игрокам, кроме ведущего"""
-        host = self.get_host()
-        host_id = host['user_id'] if host else None
-        for player in self.players:
-            user_id = player['user_id']
-            if user_id == host_id:
-                continue
-            hand = []
-            while len(hand) < HAND_SIZE and self.main_deck:
-                hand.append(self.main_deck.pop())
-            self.hands[user_id] = hand
-
-    def refill_hands(self):
-        """Добираем карты до 10 у игроков, кроме ведущего"""
-        host = self.get_host()
-        host_id = host['user_id'] if host else None
-        for player in self.players:
-            user_id = player['user_id']
-            if user_id == host_id:
-                continue
-            current_hand = self.hands.get(user_id, [])
-            while len(current_hand) < HAND_SIZE and self.main_deck:
-                current_hand.append(self.main_deck.pop())
-            self.hands[user_id] = current_hand
-
-    def deal_hands(self, all_cards):
-        """Вызывается для первой раздачи или добора карт"""
-        if not any(self.hands.values()):
-            self.prepare_deck(all_cards)
-            self.deal_initial_hands()
-        else:
-            self.refill_hands()
-
-    def replace_used_cards(self, used_answers):
-        """Заменяет использованные карты новыми у всех игроков"""
-        for user_id, card in used_answers.items():
-            hand = self.hands.get(user_id, [])
-            if card in hand:
-                hand.remove(card)
-            if card not in self.used_cards:
-                self.used_cards.append(card)
-            if self.main_deck:
-                hand.append(self.main_deck.pop())
-            self.hands[user_id] = hand
-
-    def add_score(self, user_id, points=1):
+    # ---------- счёт ----------
+
+    def add_score(self, user_id: int, points: int = 1) -> int:
         self.scores[user_id] = self.scores.get(user_id, 0) + points
+        return self.scores[user_id]
+
+    def get_scores(self) -> List[Player]:
+        return sorted(self.players, key=lambda p: self.scores.get(p.user_id, 0), reverse=True)
+
+    # ---------- раунд ----------
+
+    def transition(self, phase: str) -> bool:
+        """
+        Переводит раунд в фазу phase. Возвращает False, если из текущей фазы
+        такой переход невозможен — в том числе при повторе уже выполненного
+        перехода (двойное нажатие, гонка таймаута и ответа). Побочные эффекты
+        перехода (сообщения, начисление очков) выполняются только при True.
+        """
+        if phase not in TRANSITIONS[self.phase]:
+            return False
+        self.phase = phase
+        return True
+
+    def reset_round(self) -> None:
+        self.round_id += 1
+        self.round_started_at = time.time()
+        self.answers.clear()
+        self.shuffled_answers = []
+        self.human_acted = False
+
+    def all_answers_received(self) -> bool:
+        # Ведущий не отвечает
+        return len(self.answers) >= len(self.players) - 1
 
-    def get_scores(self):
-        return sorted(
-            self.players,
-            key=lambda p: self.scores.get(p['user_id'], 0),
-            reverse=True
-        )
-
-    def get_score(self, user_id):
-        return self.scores.get(user_id, 0)
-
-    def pick_winner(self, idx):
-        user_ids = list(self.answers.keys())
-        chosen_id = user_ids[idx]
-        chosen_card = self.answers[chosen_id]
-        username = next((p["username"] for p in self.players if p["user_id"] == chosen_id), str(chosen_id))
-        self.add_score(chosen_id)
-        return {"user_id": chosen_id, "username": username, "answer": chosen_card}
+    def drop_cards(self, answer_ids: Set[int], situation_ids: Set[int] = frozenset()) -> None:
+        """
+        Убирает карты, удалённые из колоды. Руки во время раунда не меняются:
+        кнопки руки ссылаются на позицию карты — такие карты уберёт следующая
+        раздача.
+        """
+        self.used_answers -= answer_ids
+        self.used_situations -= situation_ids
+        if self.phase not in ("answering", "judging"):
+            self.purge_hands(answer_ids)
+
+    def purge_hands(self, answer_ids: Set[int]) -> None:
+        """Убирает карты answer_ids из рук игроков"""
+        for uid, hand in self.hands.items():
+            if not answer_ids.isdisjoint(hand):
+                self.hands[uid] = new_hand(c for c in hand if c not in answer_ids)
+
+    # ---------- сериализация ----------
+
+    def to_dict(self, deck: Any) -> Dict[str, Any]:
+        """
+        Сериализует сессию в JSON-совместимый словарь. Карты записываются
+        текстом (deck — DeckSnapshot), чтобы сохранённая игра пережила
+        изменение колоды.
+        """
+        def text(card_id: int) -> str:
+            return deck.answers[card_id]
+
+        return {
+            "chat_id": self.chat_id,
+            "players": [{"user_id": p.user_id, "username": p.username, "is_bot": p.is_bot} for p in self.players],
+            "scores": self.scores,
+            "hands": {uid: [text(c) for c in hand] for uid, hand in self.hands.items()},
+            "answers": {uid: text(c) for uid, c in self.answers.items()},
+            "shuffled_answers": [(uid, text(c)) for uid, c in self.shuffled_answers],
+            "host_idx": self.host_idx,
+            "current_situation": self.current_situation,
+            "used_answers": [text(c) for c in self.used_answers],
+            "used_situations": [deck.situations[s] for s in self.used_situations],
+            "phase": self.phase,
+            "round_id": self.round_id,
+            "human_acted": self.human_acted,
+            "idle_rounds": self.idle_rounds,
+            "round_message_id": self.round_message_id,
+            "round_message_photo": self.round_message_photo,
+            "round_message_text": self.round_message_text,
+            "mode": self.mode,
+            "disabled_packs": sorted(self.disabled_packs),
+            "round_started_at": self.round_started_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], deck: Any,
+                  bots: Optional[Mapping[int, Any]] = None) -> "GameSession":
+        """
+        Восстанавливает сессию из to_dict(). Карты, которых больше нет в колоде,
+        отбрасываются; ботам возвращаются ссылки на объекты из bots.
+        """
+        bots = bots or {}
+        st = cls(chat_id=data["chat_id"])
+        for p in data.get("players", []):
+            st.add_player(p["user_id"], p["username"], p.get("is_bot", False),
+                          bots.get(p["user_id"]) if p.get("is_bot") else None)
+
+        answer_ids = deck.answer_ids
+
+        def ids(texts: Iterable[str]) -> List[int]:
+            return [answer_ids[t] for t in texts if t in answer_ids]
+
+        st.scores = {int(uid): score for uid, score in data.get("scores", {}).items()}
+        st.hands = {int(uid): new_hand(ids(hand)) for uid, hand in data.get("hands", {}).items()}
+        st.answers = {int(uid): answer_ids[t] for uid, t in data.get("answers", {}).items() if t in answer_ids}
+        st.shuffled_answers = [(int(uid), answer_ids[t]) for uid, t in data.get("shuffled_answers", [])
+                               if t in answer_ids]
+        st.host_idx = data.get("host_idx", -1)
+        st.current_situation = data.get("current_situation")
+        st.used_answers = set(ids(data.get("used_answers", [])))
+        st.used_situations = {deck.situation_ids[t] for t in data.get("used_situations", [])
+                              if t in deck.situation_ids}
+        st.phase = data.get("phase", "waiting")
+        st.round_id = data.get("round_id", 0)
+        st.human_acted = data.get("human_acted", False)
+        st.idle_rounds = data.get("idle_rounds", 0)
+        st.round_message_id = data.get("round_message_id", 0)
+        st.round_message_photo = data.get("round_message_photo", False)
+        st.round_message_text = data.get("round_message_text", "")
+        st.mode = data.get("mode", DEFAULT_MODE)
+        st.disabled_packs = set(data.get("disabled_packs", ()))
+        st.round_started_at = data.get("round_started_at", 0.0)
+        return st
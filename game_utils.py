@@ -1,24 +1,30 @@
 # game_utils.py
 import os
-import json
-import random
+import logging
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Optional, Tuple
 import asyncio
 import aiohttp
 from dotenv import load_dotenv
 import google.generativeai as genai
 from gigachat_utils import gigachat_generator
+import metrics
+from config import GAME_SETTINGS
+from deck_registry import DeckRegistry
+
+logger = logging.getLogger(__name__)
 
 # ====== Загрузка ключей ======
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Без обращений к внешним AI-сервисам (тестовые стенды): генерация заменяется заглушками
+OFFLINE_AI = os.getenv("OFFLINE_AI", "0") == "1"
 
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
-    print("✅ Gemini API настроен")
+    logger.info("✅ Gemini API настроен")
 else:
-    print("⚠️ GEMINI_API_KEY не найден")
+    logger.warning("⚠️ GEMINI_API_KEY не найден")
 
 # Модель Gemini - ИСПРАВЛЕНО для работы с текущей версией API
 try:
@@ -31,109 +37,30 @@ try:
     ]
     
     gemini_text_model = None
-    for model_name in model_names:
+    for model_name in ([] if OFFLINE_AI else model_names):
         try:
             gemini_text_model = genai.GenerativeModel(model_name)
             # Пробуем сгенерировать тестовый запрос
             test_response = gemini_text_model.generate_content("test")
-            print(f"✅ Модель {model_name} инициализирована успешно")
+            logger.info(f"✅ Модель {model_name} инициализирована успешно")
             break
         except Exception as e:
-            print(f"⚠️ Модель {model_name} недоступна: {e}")
+            logger.warning(f"⚠️ Модель {model_name} недоступна: {e}")
             continue
     
     if not gemini_text_model:
-        print("❌ Ни одна модель Gemini не доступна")
+        logger.error("❌ Ни одна модель Gemini не доступна")
         
 except Exception as e:
-    print(f"❌ Ошибка инициализации Gemini: {e}")
+    logger.error(f"❌ Ошибка инициализации Gemini: {e}")
     gemini_text_model = None
 
-# ====== Менеджер колод ======
-class DeckManager:
-    def __init__(self, situations_file: str = "situations.json", answers_file: str = "answers.json", base: Path | None = None):
-        self.base_dir = base or Path(__file__).resolve().parent
-        self.sit_path = (self.base_dir / situations_file).resolve()
-        self.ans_path = (self.base_dir / answers_file).resolve()
-        
-        print(f"📂 game_utils file: {Path(__file__).resolve()}")
-        print(f"📂 situations path: {self.sit_path}")
-        print(f"📂 answers path: {self.ans_path}")
-        
-        self.situations: List[str] = self._load_list(self.sit_path, "situations")
-        self.answers: List[str]    = self._load_list(self.ans_path, "answers")
-        
-        print(f"✅ situations loaded: {len(self.situations)}")
-        print(f"✅ answers loaded: {len(self.answers)}")
-
-    def _load_list(self, file_path: Path, label: str) -> List[str]:
-        """
-        ИСПРАВЛЕННАЯ функция загрузки - поддерживает оба формата:
-        1. Простой массив: ["item1", "item2", ...]
-        2. Объект с ключом: {"answers": ["item1", "item2", ...]}
-        """
-        for enc in ("utf-8-sig", "utf-8"):
-            try:
-                data = json.loads(file_path.read_text(encoding=enc))
-                
-                # ИСПРАВЛЕНИЕ: поддержка как массива, так и объекта с ключом
-                if isinstance(data, dict):
-                    # Если это объект, берём значение по ключу label
-                    items = data.get(label, [])
-                elif isinstance(data, list):
-                    # Если это массив, используем напрямую
-                    items = data
-                else:
-                    print(f"⚠️ {label}: неизвестный формат данных")
-                    return []
-                
-                # Убираем дубликаты и пустые строки
-                seen, out = set(), []
-                for x in items:
-                    if isinstance(x, str):
-                        x = x.strip()
-                        if x and x not in seen:
-                            seen.add(x)
-                            out.append(x)
-                
-                print(f"✅ {label} parsed: {len(out)} items")
-                return out
-                
-            except FileNotFoundError:
-                print(f"❌ {label}: файл не найден - {file_path}")
-                continue
-            except json.JSONDecodeError as e:
-                print(f"❌ {label}: ошибка JSON - {e}")
-                continue
-            except UnicodeDecodeError as e:
-                print(f"❌ {label}: ошибка кодировки - {e}")
-                continue
-            except Exception as e:
-                print(f"❌ {label}: неожиданная ошибка - {e}")
-                continue
-        
-        return []
-
-    def get_random_situation(self) -> str:
-        return random.choice(self.situations) if self.situations else "Тестовая ситуация"
-
-    def get_new_shuffled_answers_deck(self) -> List[str]:
-        deck = list(self.answers)
-        random.shuffle(deck)
-        return deck
-    
-    def get_all_situations(self) -> List[str]:
-        return list(self.situations)
-    
-    def get_random_from_list(self, situations_list: List[str]) -> str:
-        return random.choice(situations_list) if situations_list else "Тестовая ситуация"
-
 # ====== Генерация изображений ======
 
 async def generate_gigachat_image(situation: str, answer: str) -> Optional[str]:
     """Генерирует изображение через GigaChat + Kandinsky 3.1"""
     try:
-        print(f"🎨 Генерация через GigaChat + Kandinsky 3.1...")
+        logger.debug(f"🎨 Генерация через GigaChat + Kandinsky 3.1...")
         
         prompt = (
             f"Создай яркую комичную иллюстрацию. "
@@ -145,20 +72,23 @@ async def generate_gigachat_image(situation: str, answer: str) -> Optional[str]:
             f"КРИТИЧНО: БЕЗ текста и подписей на изображении!"
         )
         
-        image_path = await asyncio.to_thread(
-            gigachat_generator.generate_image,
-            prompt
-        )
+        with metrics.provider_call("gigachat") as call:
+            image_path = await asyncio.to_thread(
+                gigachat_generator.generate_image,
+                prompt
+            )
+            if not image_path:
+                call["outcome"] = "empty"
         
         if image_path:
-            print(f"✅ GigaChat успешно сгенерировал изображение: {image_path}")
+            logger.info(f"✅ GigaChat успешно сгенерировал изображение: {image_path}")
             return image_path
         else:
-            print("⚠️ GigaChat не вернул изображение")
+            logger.warning("⚠️ GigaChat не вернул изображение")
             return None
         
     except Exception as e:
-        print(f"❌ Ошибка GigaChat: {e}")
+        logger.error(f"❌ Ошибка GigaChat: {e}")
         return None
 
 async def generate_pollinations_image(situation: str, answer: str) -> Optional[str]:
@@ -169,24 +99,26 @@ async def generate_pollinations_image(situation: str, answer: str) -> Optional[s
     )
     url = f"https://image.pollinations.ai/prompt/{prompt}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=20) as resp:
-                if resp.status == 200:
-                    print(f"✅ Pollinations вернул изображение")
-                    return str(resp.url)
+        with metrics.provider_call("pollinations") as call:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url, timeout=20) as resp:
+                    if resp.status == 200:
+                        logger.debug(f"✅ Pollinations вернул изображение")
+                        return str(resp.url)
+                    call["outcome"] = "empty"
     except Exception as e:
-        print(f"⚠️ Pollinations error: {e}")
+        logger.warning(f"⚠️ Pollinations error: {e}")
     return None
 
 async def generate_card_joke(situation: str, answer: str) -> str:
     """Генерирует шутку через Gemini"""
     
     if not GEMINI_API_KEY:
-        print("⚠️ GEMINI_API_KEY не задан")
+        logger.warning("⚠️ GEMINI_API_KEY не задан")
         return f"Ситуация: {situation} | Ответ: {answer} 😄"
     
     if not gemini_text_model:
-        print("⚠️ Модель Gemini не инициализирована")
+        logger.warning("⚠️ Модель Gemini не инициализирована")
         return f"Отличный выбор! '{answer}' - именно то, что нужно! 😄"
     
     prompt = (
@@ -197,19 +129,23 @@ async def generate_card_joke(situation: str, answer: str) -> str:
     )
     
     try:
-        print(f"🤖 Генерирую шутку через Gemini...")
-        response = await asyncio.to_thread(gemini_text_model.generate_content, prompt)
+        logger.debug(f"🤖 Генерирую шутку через Gemini...")
+        with metrics.provider_call("gemini"):
+            response = await asyncio.to_thread(gemini_text_model.generate_content, prompt)
         joke = response.text.strip()
-        print(f"✅ Шутка сгенерирована: {joke[:60]}...")
+        logger.debug(f"✅ Шутка сгенерирована: {joke[:60]}...")
         return joke
     except Exception as e:
-        print(f"❌ Ошибка генерации шутки: {e}")
+        logger.error(f"❌ Ошибка генерации шутки: {e}")
         # Запасной вариант - простая шутка
         return f"'{answer}' - гениально! Именно это я и хотел услышать! 🎉"
 
 async def generate_card_content(situation: str, answer: str) -> Tuple[Optional[str], str]:
     """Генерирует изображение и шутку"""
-    print(f"📝 Генерация контента для: '{situation}' + '{answer}'")
+    if OFFLINE_AI:
+        return None, f"'{answer}' — без комментариев 😄"
+    
+    logger.debug(f"📝 Генерация контента для: '{situation}' + '{answer}'")
     
     # Генерируем шутку параллельно
     joke_task = asyncio.create_task(generate_card_joke(situation, answer))
@@ -219,14 +155,21 @@ async def generate_card_content(situation: str, answer: str) -> Tuple[Optional[s
     
     if not image_result:
         # 2. Запасной вариант
-        print("🔄 Переключаемся на Pollinations...")
+        logger.info("🔄 Переключаемся на Pollinations...")
         image_result = await generate_pollinations_image(situation, answer)
     
     joke_text = await joke_task
     
-    print(f"📦 Результат: image={bool(image_result)}, joke={joke_text[:50]}...")
+    logger.debug(f"📦 Результат: image={bool(image_result)}, joke={joke_text[:50]}...")
     
     return image_result, joke_text
 
 # Инициализация менеджера колод
-decks = DeckManager(base=Path(__file__).resolve().parent)
+decks = DeckRegistry(
+    situations_file=os.getenv("DECK_SITUATIONS", "situations.json"),
+    answers_file=os.getenv("DECK_ANSWERS", "answers.json"),
+    base=Path(__file__).resolve().parent,
+    watch_interval=float(os.getenv("DECK_WATCH_INTERVAL", "0")),
+    # Индекс пар нужен только умной раздаче
+    pairs_top_k=GAME_SETTINGS["PAIRS_TOP_K"] if GAME_SETTINGS["SMART_DEAL_CARDS"] > 0 else 0,
+)
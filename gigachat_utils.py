@@ -3,6 +3,7 @@ import os
 import uuid
 import requests
 import re
+import logging
 import hashlib
 import time
 from typing import Optional
@@ -11,6 +12,8 @@ import warnings
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+logger = logging.getLogger(__name__)
+
 # Отключаем предупреждения SSL
 warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
@@ -58,7 +61,7 @@ class GigaChatImageGenerator:
         """
         try:
             if not GIGACHAT_AUTH_KEY:
-                print("❌ GIGACHAT_AUTH_KEY не найден в .env")
+                logger.error("❌ GIGACHAT_AUTH_KEY не найден в .env")
                 return None
             
             headers = {
@@ -83,15 +86,15 @@ class GigaChatImageGenerator:
                 result = response.json()
                 self.access_token = result["access_token"]
                 self.token_expiry = time.time() + 1740  # 29 минут
-                print(f"✅ GigaChat токен получен")
+                logger.info(f"✅ GigaChat токен получен")
                 return self.access_token
             else:
-                print(f"❌ Ошибка получения токена: {response.status_code}")
-                print(f"   Ответ: {response.text}")
+                logger.error(f"❌ Ошибка получения токена: {response.status_code}")
+                logger.error(f"   Ответ: {response.text}")
                 return None
                 
         except Exception as e:
-            print(f"❌ Ошибка GigaChat auth: {e}")
+            logger.error(f"❌ Ошибка GigaChat auth: {e}")
             return None
     
     def _ensure_token(self) -> bool:
@@ -99,7 +102,7 @@ class GigaChatImageGenerator:
         Проверяет токен и обновляет при необходимости
         """
         if not self.access_token or time.time() >= self.token_expiry:
-            print("🔄 Обновление токена GigaChat...")
+            logger.info("🔄 Обновление токена GigaChat...")
             return self._get_access_token() is not None
         return True
     
@@ -145,8 +148,8 @@ class GigaChatImageGenerator:
                 # Очищаем промпт от проблемных слов
                 clean_prompt = self._clean_prompt(prompt)
                 
-                print(f"🎨 Генерация изображения через GigaChat + Kandinsky (попытка {attempt + 1}/{max_attempts})...")
-                print(f"   Промпт: {clean_prompt[:100]}...")
+                logger.debug(f"🎨 Генерация изображения через GigaChat + Kandinsky (попытка {attempt + 1}/{max_attempts})...")
+                logger.debug(f"   Промпт: {clean_prompt[:100]}...")
                 
                 # Формируем запрос для генерации изображения
                 headers = {
@@ -179,13 +182,13 @@ class GigaChatImageGenerator:
                 )
                 
                 if response.status_code != 200:
-                    print(f"⚠️ GigaChat вернул ошибку: {response.status_code}")
-                    print(f"   Ответ: {response.text}")
+                    logger.warning(f"⚠️ GigaChat вернул ошибку: {response.status_code}")
+                    logger.warning(f"   Ответ: {response.text}")
                     
                     if attempt == max_attempts - 1:
                         return None
                     
-                    print(f"   Ожидание {(attempt + 1) * 3} секунд перед повтором...")
+                    logger.warning(f"   Ожидание {(attempt + 1) * 3} секунд перед повтором...")
                     time.sleep((attempt + 1) * 3)
                     continue
                 
@@ -198,8 +201,8 @@ class GigaChatImageGenerator:
                 file_id_match = re.search(r'<img src="([^"]+)"', content)
                 
                 if not file_id_match:
-                    print("⚠️ GigaChat не вернул изображение")
-                    print(f"   Ответ: {content}")
+                    logger.warning("⚠️ GigaChat не вернул изображение")
+                    logger.warning(f"   Ответ: {content}")
                     
                     if attempt == max_attempts - 1:
                         return None
@@ -208,7 +211,7 @@ class GigaChatImageGenerator:
                     continue
                 
                 file_id = file_id_match.group(1)
-                print(f"📎 Получен file_id: {file_id}")
+                logger.debug(f"📎 Получен file_id: {file_id}")
                 
                 # Скачиваем изображение
                 image_url = f"{self.files_url}/{file_id}/content"
@@ -227,10 +230,10 @@ class GigaChatImageGenerator:
                     with open(temp_path, 'wb') as f:
                         f.write(image_response.content)
                     
-                    print(f"✅ GigaChat изображение сохранено: {temp_path}")
+                    logger.info(f"✅ GigaChat изображение сохранено: {temp_path}")
                     return temp_path
                 else:
-                    print(f"⚠️ Ошибка скачивания изображения: {image_response.status_code}")
+                    logger.warning(f"⚠️ Ошибка скачивания изображения: {image_response.status_code}")
                     
                     if attempt == max_attempts - 1:
                         return None
@@ -239,15 +242,15 @@ class GigaChatImageGenerator:
                     continue
                     
             except requests.exceptions.ReadTimeout:
-                print(f"⏱️ Timeout на попытке {attempt + 1}/{max_attempts}")
+                logger.warning(f"⏱️ Timeout на попытке {attempt + 1}/{max_attempts}")
                 if attempt == max_attempts - 1:
-                    print("❌ GigaChat: Превышено время ожидания после всех попыток")
+                    logger.error("❌ GigaChat: Превышено время ожидания после всех попыток")
                     return None
-                print(f"   Повторная попытка через {(attempt + 1) * 5} секунд...")
+                logger.warning(f"   Повторная попытка через {(attempt + 1) * 5} секунд...")
                 time.sleep((attempt + 1) * 5)
                 
             except Exception as e:
-                print(f"❌ Ошибка GigaChat генерации: {e}")
+                logger.error(f"❌ Ошибка GigaChat генерации: {e}")
                 if attempt == max_attempts - 1:
                     import traceback
                     traceback.print_exc()
@@ -0,0 +1,150 @@
+# handlers/admin_handlers.py
+import asyncio
+import logging
+import os
+from typing import Set
+
+from aiogram import Router, F, Bot
+from aiogram.types import Message, BufferedInputFile
+from aiogram.filters import Command, CommandObject
+
+from config import ADMIN_IDS
+from content_index import MODES
+# Обратите внимание, импортируем объект decks
+from game_utils import decks
+from handlers.game_handlers import SESSIONS, session_lock
+from profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+router.message.filter(F.from_user.id.in_(ADMIN_IDS))
+
+# Ссылки на фоновые задачи профилирования, чтобы их не собрал сборщик мусора
+_profile_tasks: Set[asyncio.Task] = set()
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+@router.message(Command("reload"))
+async def cmd_reload(message: Message):
+    """Перечитывает колоды ситуаций и ответов и подменяет версию колоды."""
+    try:
+        diff = await decks.reload()
+        await message.answer(
+            f"✅ Колоды перезагружены!\n"
+            f"{diff.summary()}\n"
+            f"Ситуаций: {len(decks.live_situation_ids)}\n"
+            f"Ответов: {len(decks.live_answer_ids)}"
+            + (f"\n🧩 Только в шарде {os.environ['SHARD_ID']}: остальные подхватят файлы сами, "
+               f"если включено наблюдение (DECK_WATCH_INTERVAL)" if os.getenv("SHARD_ID") else "")
+        )
+    except Exception as e:
+        await message.answer(f"❌ Произошла ошибка при перезагрузке: {e}")
+
+
+def _deck_summary(mode: str, disabled) -> str:
+    chat_deck = decks.for_chat(mode, disabled)
+    return f"Доступно: ситуаций {chat_deck.situation_count}, ответов {chat_deck.answer_count}"
+
+
+@router.message(Command("mode"))
+async def cmd_mode(message: Message, command: CommandObject):
+    """/mode [family|adult] — режим колоды в этом чате (со следующего раунда)."""
+    mode = (command.args or "").strip().lower()
+    async with session_lock(message.chat.id):
+        st = await SESSIONS.fetch(message.chat.id)
+        if not st:
+            await message.answer("⚠️ В этом чате нет игры — сначала начните её.")
+            return
+        if not mode:
+            await message.answer(f"🎚 Режим: {st.mode}. {_deck_summary(st.mode, st.disabled_packs)}\n"
+                                 f"Использование: /mode {'|'.join(MODES)}")
+            return
+        if mode not in MODES:
+            await message.answer(f"⚠️ Неизвестный режим {mode}: {', '.join(MODES)}")
+            return
+        if decks.for_chat(mode, st.disabled_packs).filtered_out:
+            await message.answer(f"⚠️ В режиме {mode} с включёнными паками не останется ни ситуаций, ни ответов — "
+                                 f"режим не изменён")
+            return
+        st.mode = mode
+        await message.answer(f"✅ Режим {mode} — со следующего раунда. {_deck_summary(st.mode, st.disabled_packs)}")
+
+
+@router.message(Command("packs"))
+async def cmd_packs(message: Message):
+    """Паки колоды и их состояние в этом чате."""
+    st = await SESSIONS.fetch(message.chat.id)
+    disabled = st.disabled_packs if st else set()
+    lines = [f"{'🚫' if name in disabled else '✅'} {name} — ситуаций {sits}, ответов {answers}"
+             for name, (sits, answers) in decks.packs().items()]
+    if not lines:
+        lines = ["В колоде нет паков"]
+    lines.append("\n/pack on|off ИМЯ — включить или выключить пак в этом чате")
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("pack"))
+async def cmd_pack(message: Message, command: CommandObject):
+    """/pack on|off ИМЯ — включает или выключает пак в этом чате (со следующего раунда)."""
+    action, _, name = (command.args or "").strip().partition(" ")
+    name = name.strip()
+    if action not in ("on", "off") or not name:
+        await message.answer("⚠️ Использование: /pack on|off ИМЯ (список — /packs)")
+        return
+    packs = decks.packs()
+    if name not in packs:
+        await message.answer(f"⚠️ Нет пака {name}. Паки: {', '.join(packs) or '—'}")
+        return
+
+    async with session_lock(message.chat.id):
+        st = await SESSIONS.fetch(message.chat.id)
+        if not st:
+            await message.answer("⚠️ В этом чате нет игры — сначала начните её.")
+            return
+        disabled = st.disabled_packs | {name} if action == "off" else st.disabled_packs - {name}
+        enabled = [packs[p] for p in packs if p not in disabled]
+        if not any(sits for sits, _ in enabled) or not any(answers for _, answers in enabled):
+            await message.answer("⚠️ Так не останется ни ситуаций, ни ответов — пак не выключен")
+            return
+        if decks.for_chat(st.mode, disabled).filtered_out:
+            await message.answer(f"⚠️ В режиме {st.mode} так не останется ни ситуаций, ни ответов — пак не выключен")
+            return
+        st.disabled_packs = disabled
+        state = "выключен" if action == "off" else "включён"
+        await message.answer(f"✅ Пак {name} {state} — со следующего раунда. {_deck_summary(st.mode, disabled)}")
+
+
+async def _profile_and_report(bot: Bot, chat_id: int, seconds: float):
+    """Профилирует процесс и присылает сводку и файл свёрнутых стеков"""
+    try:
+        profile, path = await profiler.run(seconds)
+        await bot.send_message(chat_id, profile.summary()[:MESSAGE_LIMIT])
+        await bot.send_document(
+            chat_id,
+            BufferedInputFile(path.read_bytes(), filename=path.name),
+            caption="🔥 Свёрнутые стеки: flamegraph.pl, speedscope.app или inferno",
+        )
+    except Exception as e:
+        logger.exception(f"❌ Ошибка профилирования: {e}")
+        await bot.send_message(chat_id, f"❌ Ошибка профилирования: {e}")
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """/profile N — выборочный профиль процесса за N секунд (по умолчанию 30)."""
+    arg = (command.args or "30").strip()
+    if not arg.isdigit() or int(arg) <= 0:
+        await message.answer("⚠️ Использование: /profile 30 — длительность в секундах")
+        return
+    if profiler.busy:
+        await message.answer("⏳ Профилировщик уже запущен, дождитесь результата")
+        return
+
+    seconds = min(int(arg), profiler.max_seconds)
+    await message.answer(f"🔬 Профилирую {seconds:.0f} с, игры продолжаются как обычно…")
+    # Обработчик сразу освобождается: профиль снимается в фоне
+    task = asyncio.create_task(_profile_and_report(message.bot, message.chat.id, seconds), name="profile")
+    _profile_tasks.add(task)
+    task.add_done_callback(_profile_tasks.discard)
@@ -1,35 +1,149 @@
 # handlers/game_handlers.py
 import asyncio
+import logging
 import os
 import random
-from typing import Dict, Any, List
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile, FSInputFile
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, FSInputFile
 from aiogram.filters import Command, CommandStart
 from aiogram.exceptions import TelegramBadRequest
 
+from config import GAME_SETTINGS
+
+from game_state import GameSession, Player, new_hand
 from game_utils import decks, generate_card_content
+from deck_registry import ChatDeck, DeckDiff
 from card_generator import create_situation_card
+from scheduler import scheduler, bot_delay
+from chat_locks import chat_locks
+from callback_guard import CallbackGuard
+from callback_codec import Action, CallbackDecodeMiddleware, GameCallback, GameCallbackData
+from keyboards import main_menu, hand_keyboard, pick_keyboard
+from round_message import CAPTION_LIMIT, TEXT_LIMIT, RoundMessages, fit
+from session_cache import SessionCache
+from session_store import create_backend
+from stats_db import PlayerStats, RoundResult, StatsDB
+from log_config import bind
+import metrics
+from tracing import tracer
+from utils import log_event
+
+logger = logging.getLogger(__name__)
 
 router = Router()
-SESSIONS: Dict[int, Dict[str, Any]] = {}
+# callback_data игровых кнопок разбирается один раз и передаётся в фильтры и обработчики как payload
+router.callback_query.outer_middleware(CallbackDecodeMiddleware())
 
 # Глобальные переменные для ботов
 BOT_PLAYERS: List = []
 
+def _dump_session(st: GameSession) -> Dict[str, Any]:
+    """Готовит сессию к сохранению (без ссылок на объекты ботов)"""
+    return st.to_dict(decks.current)
+
+def _load_session(data: Dict[str, Any]) -> GameSession:
+    """Восстанавливает сессию из хранилища и возвращает ботам ссылки на объекты"""
+    st = GameSession.from_dict(data, decks.current, bots={b.bot_id: b for b in BOT_PLAYERS})
+    if st.phase in ("answering", "judging") and not scheduler.has_chat(st.chat_id):
+        # Раунд прерван перезапуском: таймеров и ходов ботов больше нет,
+        # карты остаются на руках, игра продолжается со следующего раунда
+        st.transition("finished")
+        st.answers.clear()
+        st.shuffled_answers = []
+    return st
+
+SESSIONS: SessionCache = SessionCache(
+    backend=create_backend(GAME_SETTINGS["SESSION_BACKEND"], GAME_SETTINGS["SESSION_STORE_PATH"]),
+    max_sessions=GAME_SETTINGS["MAX_SESSIONS"],
+    idle_ttl=GAME_SETTINGS["SESSION_IDLE_TTL"],
+    memory_budget=GAME_SETTINGS["SESSION_MEMORY_BUDGET_MB"] * 1024 * 1024,
+    persist_ttl=GAME_SETTINGS["SESSION_PERSIST_TTL"],
+    flush_interval=GAME_SETTINGS["SESSION_FLUSH_INTERVAL"],
+    dump=_dump_session,
+    load=_load_session,
+    pinned=scheduler.has_chat,
+)
+
+@asynccontextmanager
+async def session_lock(chat_id: int) -> AsyncIterator[None]:
+    """chat_locks(chat_id) для изменения сессии: на выходе она ставится в очередь записи"""
+    async with chat_locks(chat_id):
+        try:
+            yield
+        finally:
+            SESSIONS.mark_dirty(chat_id)
+
+# Журнал раундов и рейтинги: запись пачками в фоне, обработчики не ждут диска
+STATS = StatsDB(
+    GAME_SETTINGS["STATS_DB_PATH"] or None,
+    flush_interval=GAME_SETTINGS["STATS_FLUSH_INTERVAL"],
+    batch_size=GAME_SETTINGS["STATS_BATCH_SIZE"],
+)
+
+def _drop_removed_cards(diff: DeckDiff) -> None:
+    """После перезагрузки колоды убирает удалённые карты из сессий в памяти"""
+    if not (diff.removed_answers or diff.removed_situations):
+        return
+    for st in SESSIONS.in_memory():
+        st.drop_cards(diff.removed_answers, diff.removed_situations)
+        SESSIONS.mark_dirty(st.chat_id)
+
+decks.on_reload(_drop_removed_cards)
+
+# Отсев повторных нажатий и кнопок прошлых раундов
+callback_guard = CallbackGuard(GAME_SETTINGS["CALLBACK_CACHE_SIZE"])
+
+# Одно сообщение на раунд в группе, фазы — правками
+round_messages = RoundMessages(GAME_SETTINGS["ROUND_MESSAGE_DEBOUNCE"])
+
+# Действие планировщика: картинка и шутка к итогу раунда, переживает начало следующего
+ILLUSTRATION = "illustration"
+
+metrics.gauge("game_sessions", "Сессии в памяти", fn=lambda: len(SESSIONS))
+metrics.gauge("chat_locks_active", "Чаты с занятой или ожидаемой блокировкой", fn=lambda: len(chat_locks))
+metrics.gauge("scheduler_timers_pending", "Ожидающие отложенные действия", fn=scheduler.pending_count)
+metrics.gauge("scheduler_actions_running", "Выполняющиеся отложенные действия", fn=scheduler.running_count)
+metrics.gauge("stats_rounds_pending", "Раунды в очереди записи статистики", fn=STATS.pending)
+metrics.counter("stats_rounds_dropped_total", "Раунды, не попавшие в статистику из-за полной очереди",
+                fn=lambda: STATS.dropped)
+
+def _round_text(st: GameSession, *sections: str, photo: bool = None) -> str:
+    """Текст сообщения раунда: заголовок, ситуация (если нет картинки) и разделы текущей фазы"""
+    if photo is None:
+        photo = st.round_message_photo
+    parts = [f"🎮 **Раунд {st.round_id}**\nВедущий: {st.host.label}"]
+    if not photo:
+        parts.append(f"📝 Ситуация:\n{st.current_situation}")
+    parts.extend(section for section in sections if section)
+    return "\n\n".join(parts)
+
+def _result_text(st: GameSession, note: str, winner_text: str, stats_text: str, reveal_text: str,
+                 joke_text: str = "") -> Tuple[str, str, str]:
+    """
+    Итог раунда для сообщения раунда: раскрытие ответов сразу за победителем,
+    до шутки и счёта. Если в подписи к фото всё не помещается, шутка, а затем
+    и раскрытие уходят отдельными сообщениями: (текст, раскрытие, шутка).
+    """
+    text = _round_text(st, note, winner_text, reveal_text, joke_text, stats_text)
+    if not st.round_message_photo or len(text) <= CAPTION_LIMIT:
+        return text, "", ""
+    if joke_text:
+        text = _round_text(st, note, winner_text, reveal_text, stats_text)
+        if len(text) <= CAPTION_LIMIT:
+            return text, "", joke_text
+    return _round_text(st, note, winner_text, joke_text, stats_text), reveal_text, ""
+
+def _answers_progress(st: GameSession) -> str:
+    return f"✍️ Ответили: {len(st.answers)} из {len(st.players) - 1}"
+
 def set_bot_players(bot_players: list):
     """Устанавливает список ботов-игроков"""
     global BOT_PLAYERS
     BOT_PLAYERS = bot_players
-    print(f"✅ Зарегистрировано ботов: {len(BOT_PLAYERS)}")
-
-def main_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Начать игру", callback_data="ui_new_game")],
-        [InlineKeyboardButton(text="Присоединиться", callback_data="ui_join_game")],
-        [InlineKeyboardButton(text="Новый раунд", callback_data="ui_start_round")],
-        [InlineKeyboardButton(text="Статистика", callback_data="ui_stats")],
-    ])
+    logger.info(f"✅ Зарегистрировано ботов: {len(BOT_PLAYERS)}")
 
 @router.message(CommandStart())
 async def cmd_start(m: Message):
@@ -47,30 +161,43 @@ async def cmd_start(m: Message):
                         "• Анонимные ответы для честной игры!"
             )
     except Exception as e:
-        print(f"⚠️ Ошибка отправки видео: {e}")
+        logger.warning(f"⚠️ Ошибка отправки видео: {e}")
     
     await m.answer("Используйте меню для управления игрой:", reply_markup=main_menu())
 
 @router.message(Command("new_game"))
 async def cmd_new_game(m: Message):
-    await _create_game(m.chat.id, m.from_user.id, m.from_user.full_name, m.bot)
+    async with session_lock(m.chat.id):
+        await _create_game(m.chat.id, m.from_user.id, m.from_user.full_name, m.bot)
     await m.answer("Игра начата! В игре участвуют два бота-игрока.", reply_markup=main_menu())
 
 @router.message(Command("join_game"))
 async def cmd_join_game(m: Message, bot: Bot):
-    await _join_flow(m.chat.id, m.from_user.id, m.from_user.full_name, bot, feedback=m)
+    async with session_lock(m.chat.id):
+        await _join_flow(m.chat.id, m.from_user.id, m.from_user.full_name, bot, feedback=m)
 
 @router.message(Command("start_round"))
 async def cmd_start_round(m: Message):
-    await _start_round(m.bot, m.chat.id)
+    async with session_lock(m.chat.id):
+        await _start_round(m.bot, m.chat.id)
 
 @router.message(Command("stats"))
 async def cmd_stats(m: Message):
-    await _show_stats(m.chat.id, m)
+    await _show_stats(m.chat.id, m, m.from_user.id)
+
+@router.message(Command("top"))
+async def cmd_top(m: Message):
+    top = await STATS.top(10)
+    if not top:
+        await m.answer("🏆 Рейтинг пока пуст — сыграйте хотя бы раунд.", reply_markup=main_menu())
+        return
+    lines = ["🏆 **Лучшие игроки:**\n"] + _ranking_lines(top)
+    await m.answer("\n".join(lines), reply_markup=main_menu())
 
 @router.callback_query(F.data == "ui_new_game")
 async def ui_new_game(cb: CallbackQuery):
-    await _create_game(cb.message.chat.id, cb.from_user.id, cb.from_user.full_name, cb.bot)
+    async with session_lock(cb.message.chat.id):
+        await _create_game(cb.message.chat.id, cb.from_user.id, cb.from_user.full_name, cb.bot)
     await cb.answer()
     try:
         await cb.message.edit_text("Игра начата! В игре участвуют два бота-игрока.", reply_markup=main_menu())
@@ -79,438 +206,690 @@ async def ui_new_game(cb: CallbackQuery):
 
 @router.callback_query(F.data == "ui_join_game")
 async def ui_join_game(cb: CallbackQuery, bot: Bot):
-    await _join_flow(cb.message.chat.id, cb.from_user.id, cb.from_user.full_name, bot, feedback=cb.message)
+    async with session_lock(cb.message.chat.id):
+        await _join_flow(cb.message.chat.id, cb.from_user.id, cb.from_user.full_name, bot, feedback=cb.message)
     await cb.answer()
 
 @router.callback_query(F.data == "ui_start_round")
 async def ui_start_round(cb: CallbackQuery):
     await cb.answer()
-    await _start_round(cb.bot, cb.message.chat.id)
+    async with session_lock(cb.message.chat.id):
+        await _start_round(cb.bot, cb.message.chat.id)
 
 @router.callback_query(F.data == "ui_stats")
 async def ui_stats(cb: CallbackQuery):
     await cb.answer()
-    await _show_stats(cb.message.chat.id, cb.message)
+    await _show_stats(cb.message.chat.id, cb.message, cb.from_user.id)
+
 
 async def _create_game(chat_id: int, host_id: int, host_name: str, bot: Bot):
-    SESSIONS[chat_id] = {
-        "players": [],
-        "hands": {},
-        "answers": {},
-        "scores": {},
-        "host_idx": -1,
-        "current_situation": None,
-        "main_deck": [],
-        "used_answers": [],
-        "used_situations": [],
-        "shuffled_answers": [],
-        "answers_with_authors": []
-    }
+    # Отменяем таймеры и забываем нажатия предыдущей игры в этом чате
+    scheduler.cancel_chat(chat_id)
+    callback_guard.forget_chat(chat_id)
+    round_messages.close(chat_id)
+    tracer.end_round(chat_id, status="abandoned")
+    prev = await SESSIONS.fetch(chat_id)
+    st = GameSession(chat_id=chat_id)
+    if prev:
+        # Нумерация раундов продолжается: кнопки прошлой игры останутся устаревшими
+        st.round_id = prev.round_id
+        # Режим и паки — настройки чата, а не одной игры
+        st.mode = prev.mode
+        st.disabled_packs = set(prev.disabled_packs)
     
     for bot_player in BOT_PLAYERS:
-        SESSIONS[chat_id]["players"].append({
-            "user_id": bot_player.bot_id,
-            "username": bot_player.name,
-            "is_bot": True,
-            "bot_instance": bot_player
-        })
-        SESSIONS[chat_id]["scores"][bot_player.bot_id] = 0
+        st.add_player(bot_player.bot_id, bot_player.name, is_bot=True, bot_instance=bot_player)
     
-    print(f"🤖 Добавлено ботов: {len(BOT_PLAYERS)}")
+    SESSIONS[chat_id] = st
+    log_event("game_created", f"🤖 Добавлено ботов: {len(BOT_PLAYERS)}", host_id=host_id)
 
 async def _join_flow(chat_id: int, user_id: int, user_name: str, bot: Bot, feedback: Message):
-    st = SESSIONS.get(chat_id)
+    st = await SESSIONS.fetch(chat_id)
     if not st:
         await feedback.answer("Сначала нажмите «Начать игру».", reply_markup=main_menu())
         return
     
-    if user_id not in [p["user_id"] for p in st["players"]]:
+    if st.get_player(user_id) is None:
         try:
             await bot.send_message(user_id, "Вы присоединились к игре! Ожидайте начала раунда.")
         except TelegramBadRequest as e:
             await feedback.answer(f"{user_name}, нажмите Start у бота и повторите. {e}")
             return
-        st["players"].append({
-            "user_id": user_id, 
-            "username": user_name,
-            "is_bot": False
-        })
-        st["scores"][user_id] = 0
+        st.add_player(user_id, user_name)
     
-    real_players = len([p for p in st["players"] if not p.get("is_bot", False)])
-    bot_count = len([p for p in st["players"] if p.get("is_bot", False)])
+    real_players, bot_count = st.count_players()
     await feedback.answer(
         f"Игроков: {real_players} человек + {bot_count} ботов", 
         reply_markup=main_menu()
     )
 
-async def _show_stats(chat_id: int, feedback: Message):
-    st = SESSIONS.get(chat_id)
-    if not st or not st["players"]:
+def _ranking_lines(rows: List[PlayerStats]) -> List[str]:
+    lines = []
+    for i, row in enumerate(rows, 1):
+        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▪️"
+        lines.append(f"{medal} {i}. {row.name} — побед {row.wins} из {row.rounds}")
+    return lines
+
+async def _show_stats(chat_id: int, feedback: Message, user_id: int):
+    st = await SESSIONS.fetch(chat_id)
+    lines = []
+    if st and st.players:
+        lines.append("📊 **Статистика игры:**\n")
+        for i, p in enumerate(st.get_scores(), 1):
+            score = st.scores.get(p.user_id, 0)
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▪️"
+            lines.append(f"{medal} {i}. {p.label} — {score} очков")
+
+    # Статистика за всё время — из сводных таблиц stats_db, чтение в потоке
+    chat_top = await STATS.chat_top(chat_id, 5)
+    if chat_top:
+        lines.append(f"\n🏛 **Чат за всё время** (раундов: {await STATS.chat_rounds(chat_id)}):")
+        lines.extend(_ranking_lines(chat_top))
+    me = await STATS.player(user_id)
+    if me:
+        rank = await STATS.rank(user_id)
+        lines.append(f"\n👤 **Вы:** побед {me.wins} из {me.rounds} ({me.win_rate:.0%}), ведущим — {me.hosted}"
+                     + (f", место в рейтинге: {rank}" if rank else ""))
+
+    if not lines:
         await feedback.answer("Игра не найдена или нет игроков.", reply_markup=main_menu())
         return
-    
-    sorted_players = sorted(
-        st["players"], 
-        key=lambda p: st["scores"].get(p["user_id"], 0), 
-        reverse=True
-    )
-    
-    lines = ["📊 **Статистика игры:**\n"]
-    for i, p in enumerate(sorted_players, 1):
-        score = st["scores"].get(p["user_id"], 0)
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▪️"
-        bot_mark = " 🤖" if p.get("is_bot", False) else ""
-        lines.append(f"{medal} {i}. {p['username']}{bot_mark} — {score} очков")
-    
     await feedback.answer("\n".join(lines), reply_markup=main_menu())
 
+@metrics.timed(metrics.ROUND_STEP_SECONDS, step="start_round")
 async def _start_round(bot: Bot, chat_id: int):
-    st = SESSIONS.get(chat_id)
-    if not st or len(st["players"]) < 2:
+    """Начинает раунд; вызывается под chat_locks(chat_id)"""
+    st = await SESSIONS.fetch(chat_id)
+    if not st or len(st.players) < GAME_SETTINGS["MIN_PLAYERS"]:
         await bot.send_message(chat_id, "Нужно минимум 2 игрока.", reply_markup=main_menu())
         return
 
-    st["answers"].clear()
-    st["shuffled_answers"] = []
-    st["answers_with_authors"] = []
-    
-    st["host_idx"] = (st["host_idx"] + 1) % len(st["players"])
-    host = st["players"][st["host_idx"]]
-    host_id = host["user_id"]
-    is_bot_host = host.get("is_bot", False)
-    
-    host_label = f"{host['username']} 🤖" if is_bot_host else host['username']
-    print(f"👤 Ведущий: {host_label}")
+    # Карты, доступные чату: маски режима и паков общие для чатов с теми же настройками
+    chat_deck = decks.for_chat(st.mode, st.disabled_packs)
+    if chat_deck.filtered_out:
+        await bot.send_message(chat_id, "⚠️ В этом режиме с этими паками в колоде не осталось карт — смените /mode или /pack.",
+                               reply_markup=main_menu())
+        return
 
-    if "used_situations" not in st:
-        st["used_situations"] = []
-    
-    all_situations = decks.get_all_situations()
-    available_situations = [s for s in all_situations if s not in st["used_situations"]]
-    
-    if not available_situations:
-        print("♻️ Все ситуации использованы! Сброс.")
-        st["used_situations"] = []
-        available_situations = all_situations
-    
-    st["current_situation"] = decks.get_random_from_list(available_situations)
-    st["used_situations"].append(st["current_situation"])
+    if not st.transition("answering"):
+        # Повторное нажатие «Новый раунд» или раунд ещё не закончен
+        await bot.send_message(chat_id, "⏳ Раунд уже идёт — дождитесь его завершения.")
+        return
+
+    # Новый раунд: ходы ботов из прошлого раунда больше не нужны, иллюстрация к нему — нужна
+    scheduler.cancel_chat(chat_id, keep=(ILLUSTRATION,))
+    metrics.ROUNDS_TOTAL.inc(outcome="started")
+    phases = metrics.Stopwatch(metrics.ROUND_PHASE_SECONDS)
+
+    st.reset_round()
+    callback_guard.start_round(chat_id, st.round_id)
+    # Записи этого раунда и запланированных в нём действий — с его номером
+    bind(chat_id=chat_id, round_id=st.round_id)
+    host = st.next_host()
+    # Корневой спан раунда: его унаследуют таймеры и задачи, созданные дальше
+    tracer.start_round(chat_id, st.round_id, host_id=host.user_id, players=len(st.players))
+
+    situation_id = next((i for i in chat_deck.situation_order() if i not in st.used_situations), None)
+    
+    if situation_id is None:
+        logger.info("♻️ Все ситуации использованы! Сброс.")
+        st.used_situations.clear()
+        situation_id = next(chat_deck.situation_order(), None)
+    
+    if situation_id is not None:
+        st.used_situations.add(situation_id)
+        st.current_situation = decks.situations[situation_id]
+    else:
+        st.current_situation = decks.get_random_situation()
     
-    print(f"🎲 Ситуация: {st['current_situation']}")
+    log_event("round_started", f"👤 Ведущий: {host.label}", host_id=host.user_id, situation=st.current_situation)
+    phases.lap("situation")
     
     try:
-        card_image = create_situation_card(st["current_situation"])
-        photo = BufferedInputFile(card_image.read(), filename='situation.png')
-        await bot.send_photo(
-            chat_id,
-            photo=photo,
-            caption=f"🎮 **Новый раунд!**\nВедущий: {host_label}"
-        )
+        with tracer.span("render"):
+            # Pillow держит цикл событий сотни миллисекунд — рисуем в потоке
+            card_image = await asyncio.to_thread(create_situation_card, st.current_situation)
+            photo = BufferedInputFile(card_image.read(), filename='situation.png')
+        phases.lap("render")
+        await round_messages.open(bot, st, _round_text(st, _answers_progress(st), photo=True), photo=photo)
     except Exception as e:
-        print(f"⚠️ Ошибка создания карточки: {e}")
-        await bot.send_message(
-            chat_id,
-            f"🎮 **Новый раунд!**\nВедущий: {host_label}\n\n📝 Ситуация:\n{st['current_situation']}"
-        )
-
-    cards_in_use = set(st["used_answers"])
-    for uid, hand in st["hands"].items():
-        cards_in_use.update(hand)
-    
-    full_deck = decks.get_new_shuffled_answers_deck()
-    st["main_deck"] = [c for c in full_deck if c not in cards_in_use]
-    
-    non_host_players = [p for p in st["players"] if p["user_id"] != host_id]
+        logger.warning(f"⚠️ Ошибка создания карточки: {e}")
+        await round_messages.open(bot, st, _round_text(st, _answers_progress(st), photo=False))
+    phases.lap("announce")
+
+    non_host_players = st.non_host_players()
+    # Умная раздача: лучшие ответы ситуации — готовый список из индекса пар, O(k)
+    fitting = ()
+    if GAME_SETTINGS["SMART_DEAL_CARDS"] and situation_id is not None:
+        fitting = chat_deck.best_answers(situation_id)
+    _deal_hands(st, chat_deck, non_host_players, GAME_SETTINGS["HAND_SIZE"],
+                fitting, GAME_SETTINGS["SMART_DEAL_CARDS"])
+    phases.lap("deal")
+
+    for p in non_host_players:
+        uid = p.user_id
+        hand = st.hands[uid]
+        
+        if p.is_bot:
+            scheduler.schedule(
+                chat_id, f"bot_answer:{uid}", bot_delay("BOT_ANSWER_DELAY"),
+                _bot_auto_answer, bot, chat_id, p, st.current_situation
+            )
+        else:
+            kb = hand_keyboard(chat_id, st.round_id, uid, [decks.answers[card_id] for card_id in hand])
+            with tracer.span("send_hand", user_id=uid):
+                try:
+                    msg = f"📝 Ситуация:\n{st.current_situation}\n\n🃏 Ваша рука ({len(hand)} карт).\nВыберите ответ:"
+                    await bot.send_message(uid, msg, reply_markup=kb)
+                except TelegramBadRequest:
+                    await bot.send_message(chat_id, f"⚠️ Не могу написать игроку {p.username}.")
+    phases.lap("fanout")
+
+    scheduler.schedule(chat_id, "answer_timeout", GAME_SETTINGS["ROUND_TIMEOUT"], _on_answer_timeout, bot, chat_id)
+
+def _deal_hands(st: GameSession, chat_deck: ChatDeck, non_host_players: List[Player], hand_size: int,
+                fitting: Sequence[int] = (), fitting_per_hand: int = 0) -> None:
+    """
+    Добирает руки игроков до hand_size картами чата, которых нет на руках и в сбросе.
+    fitting — карты, подходящие к ситуации раунда: в каждой руке их будет до
+    fitting_per_hand (недостающие заменяют самые старые карты руки, те
+    возвращаются в колоду). Карты рук, которых больше нет в колоде чата
+    (списанные, вне режима или паков), сбрасываются.
+    """
+    retired = chat_deck.deck.retired_answer_ids
+    if retired:
+        # Карты, удалённые из колоды, пока шёл раунд
+        st.purge_hands(retired)
+    if chat_deck.answers_mask is not None:
+        # После /mode или /pack: карты, которые чату больше не раздаются, уходят из рук
+        st.purge_hands({c for hand in st.hands.values() for c in hand if not chat_deck.allows_answer(c)})
+    cards_in_hands = set()
+    for hand in st.hands.values():
+        cards_in_hands.update(hand)
+
     if non_host_players:
-        min_hand_size = min(len(st["hands"].get(p["user_id"], [])) for p in non_host_players)
-        cards_needed = len(non_host_players) * (10 - min_hand_size)
+        min_hand_size = min(len(st.hands.get(p.user_id, ())) for p in non_host_players)
+        cards_needed = len(non_host_players) * (hand_size - min_hand_size)
     else:
         cards_needed = 0
-    
-    if len(st["main_deck"]) < cards_needed:
-        print(f"⚠️ Карты закончились! Сброс.")
-        st["used_answers"].clear()
-        
-        cards_in_hands = set()
-        for uid, hand in st["hands"].items():
-            cards_in_hands.update(hand)
-        
-        full_deck = decks.get_new_shuffled_answers_deck()
-        st["main_deck"] = [c for c in full_deck if c not in cards_in_hands]
 
-    for p in st["players"]:
-        uid = p["user_id"]
-        if uid == host_id:
-            continue
-        
-        current_hand = st["hands"].get(uid, [])
-        
-        while len(current_hand) < 10 and st["main_deck"]:
-            new_card = st["main_deck"].pop()
-            if new_card not in current_hand:
-                current_hand.append(new_card)
-        
-        st["hands"][uid] = current_hand
-        print(f"✅ {'Бот' if p.get('is_bot') else 'Игрок'} {p['username']}: {len(current_hand)} карт")
-
-    for p in st["players"]:
-        uid = p["user_id"]
-        if uid == host_id:
-            continue
-        
-        hand = st["hands"].get(uid, [])
-        
-        if p.get("is_bot", False):
-            asyncio.create_task(_bot_auto_answer(bot, chat_id, p, st["current_situation"], hand))
-        else:
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text=card, callback_data=f"ans:{chat_id}:{uid}:{i}")]
-                for i, card in enumerate(hand)
-            ])
-            try:
-                msg = f"📝 Ситуация:\n{st['current_situation']}\n\n🃏 Ваша рука ({len(hand)} карт).\nВыберите ответ:"
-                await bot.send_message(uid, msg, reply_markup=kb)
-            except TelegramBadRequest:
-                await bot.send_message(chat_id, f"⚠️ Не могу написать игроку {p['username']}.")
-
-async def _bot_auto_answer(bot: Bot, chat_id: int, bot_player_data: dict, situation: str, hand: list):
-    """Автоматический ответ бота"""
-    await asyncio.sleep(random.uniform(2, 5))
-    
-    st = SESSIONS.get(chat_id)
-    if not st:
-        return
-    
-    uid = bot_player_data["user_id"]
-    
-    if uid in st["answers"]:
+    # Сброс и руки — только живые карты (списанные убраны выше и в drop_cards); после
+    # смены режима в них могут быть и недоступные чату — тогда сброс случится раньше
+    if chat_deck.answer_count - len(cards_in_hands) - len(st.used_answers) < cards_needed:
+        logger.info("♻️ Карты закончились! Сброс.")
+        st.used_answers.clear()
+
+    # Колода не перемешивается целиком: карты берутся по одной из перестановки пакета
+    used = st.used_answers
+    main_deck = (c for c in chat_deck.deal_order() if c not in cards_in_hands and c not in used)
+    fitting_set = set(fitting)
+    free_fitting = [c for c in fitting if c not in cards_in_hands and c not in used]
+    # Лучшие карты — не всегда одним и тем же игрокам
+    random.shuffle(free_fitting)
+    for p in non_host_players:
+        current_hand = st.hands.get(p.user_id)
+        if current_hand is None:
+            current_hand = st.hands[p.user_id] = new_hand()
+
+        missing = min(fitting_per_hand, hand_size) - sum(1 for c in current_hand if c in fitting_set)
+        while missing > 0 and free_fitting:
+            card = free_fitting.pop()
+            if card in cards_in_hands:
+                # Уже досталась из колоды игроку раньше
+                continue
+            if len(current_hand) >= hand_size:
+                del current_hand[next(i for i, c in enumerate(current_hand) if c not in fitting_set)]
+            current_hand.append(card)
+            cards_in_hands.add(card)
+            missing -= 1
+
+        while len(current_hand) < hand_size:
+            card = next(main_deck, None)
+            if card is None:
+                break
+            current_hand.append(card)
+            # Иначе её же выдал бы список подходящих карт следующему игроку
+            cards_in_hands.add(card)
+
+        logger.debug("✅ %s %s: %d карт", "Бот" if p.is_bot else "Игрок", p.username, len(current_hand))
+
+async def _bot_auto_answer(bot: Bot, chat_id: int, player: Player, situation: str):
+    """Автоматический ответ бота (вызывается планировщиком после задержки)"""
+    uid = player.user_id
+    async with chat_locks(chat_id):
+        st = await SESSIONS.fetch(chat_id)
+        if not st or st.phase != "answering" or uid in st.answers:
+            return
+        hand = list(st.hands.get(uid, ()))
+    if not hand:
         return
+    hand_texts = [decks.answers[c] for c in hand]
     
-    bot_instance = bot_player_data.get("bot_instance")
-    
-    if bot_instance and hand:
+    # Выбор ответа (возможно, запрос к AI) — без блокировки, чтобы не задерживать ходы людей
+    with tracer.span("bot_answer", user_id=uid):
         try:
-            selected_answer = await bot_instance.generate_answer(situation, hand)
-            idx = hand.index(selected_answer)
-            
-            st["answers"][uid] = {"card": selected_answer, "index": idx}
-            print(f"🤖 Бот {bot_player_data['username']} выбрал: {selected_answer}")
-            
-            await _check_all_answered(bot, chat_id)
-            
+            if not player.bot_instance:
+                raise RuntimeError("нет объекта бота")
+            selected_answer = await player.bot_instance.generate_answer(situation, hand_texts)
+            idx = hand_texts.index(selected_answer)
         except Exception as e:
-            print(f"⚠️ Ошибка ответа бота: {e}")
-            if hand:
-                selected_answer = random.choice(hand)
-                idx = hand.index(selected_answer)
-                st["answers"][uid] = {"card": selected_answer, "index": idx}
-                await _check_all_answered(bot, chat_id)
-
-async def _check_all_answered(bot: Bot, chat_id: int):
-    """Проверяет, ответили ли все игроки"""
+            logger.warning(f"⚠️ Ошибка ответа бота: {e}")
+            idx = random.randrange(len(hand))
+    
+    async with session_lock(chat_id):
+        st = await SESSIONS.fetch(chat_id)
+        if not st or st.phase != "answering" or uid in st.answers:
+            return
+        
+        st.answers[uid] = hand[idx]
+        logger.debug("🤖 Бот %s выбрал: %s", player.username, hand_texts[idx])
+        
+        await _check_all_answered(bot, chat_id)
+
+@metrics.timed(metrics.ROUND_STEP_SECONDS, step="check_all_answered")
+async def _check_all_answered(bot: Bot, chat_id: int, force: bool = False, note: str = ""):
+    """
+    Проверяет, ответили ли все игроки.
+    При force=True (таймаут раунда) закрывает приём с уже полученными ответами.
+    note — пометка в сообщении раунда (например, о таймауте).
+    Вызывается под chat_locks(chat_id).
+    """
     st = SESSIONS.get(chat_id)
-    if not st:
+    if not st or st.phase != "answering":
         return
     
-    host = st["players"][st["host_idx"]]
-    host_id = host["user_id"]
-    need = len(st["players"]) - 1
+    host = st.host
     
-    if len(st["answers"]) >= need:
-        ordered = [(u, st["answers"][u]["card"]) for u in st["answers"]]
-        st["answers_with_authors"] = ordered.copy()
-        
-        shuffled_answers = [(u, card) for u, card in ordered]
+    if st.all_answers_received() or (force and st.answers):
+        if not st.transition("judging"):
+            return
+        scheduler.cancel(chat_id, "answer_timeout")
+
+        shuffled_answers = list(st.answers.items())
         random.shuffle(shuffled_answers)
-        st["shuffled_answers"] = shuffled_answers
+        st.shuffled_answers = shuffled_answers
         
         # УЛУЧШЕНО: Ответы теперь НА КНОПКАХ
-        buttons = []
-        for i, (uid, ans) in enumerate(shuffled_answers, 1):
-            # Обрезаем длинные ответы для кнопки (максимум 64 символа)
-            button_text = ans if len(ans) <= 60 else ans[:57] + "..."
-            buttons.append([InlineKeyboardButton(
-                text=f"{i}. {button_text}", 
-                callback_data=f"pick:{chat_id}:{i-1}"
-            )])
-        
-        host_mark = " 🤖" if host.get("is_bot", False) else ""
+        kb = pick_keyboard(chat_id, st.round_id, [decks.answers[card_id] for _, card_id in shuffled_answers])
         
-        # Упрощённое сообщение без списка ответов
-        await bot.send_message(
-            chat_id, 
+        # Кнопки нужны ведущему сразу — правка без ожидания
+        round_messages.update(bot, st, _round_text(
+            st,
+            note,
             f"📋 **Все ответы получены!**\n\n"
             f"🎭 Авторы ответов скрыты для честной игры\n"
-            f"👤 Ведущий: {host['username']}{host_mark}\n\n"
             f"👇 Выберите лучший ответ, нажав на кнопку:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons)
-        )
+        ), kb)
+        await round_messages.flush(bot, chat_id)
         
-        if host.get("is_bot", False):
-            asyncio.create_task(_bot_host_choose_winner(bot, chat_id))
+        if host.is_bot:
+            scheduler.schedule(chat_id, "host_pick", bot_delay("BOT_PICK_DELAY"), _bot_host_choose_winner, bot, chat_id)
+        else:
+            scheduler.schedule(chat_id, "pick_timeout", GAME_SETTINGS["ROUND_TIMEOUT"], _on_pick_timeout, bot, chat_id)
+    else:
+        # Ход ответов: правки схлопываются, пока ответы идут потоком
+        round_messages.update(bot, st, _round_text(st, _answers_progress(st)))
 
-async def _bot_host_choose_winner(bot: Bot, chat_id: int):
-    """Бот-ведущий автоматически выбирает победителя"""
+async def _on_answer_timeout(bot: Bot, chat_id: int):
+    """Время на ответы вышло: продолжаем с теми ответами, что успели прийти"""
+    async with session_lock(chat_id):
+        await _answer_timeout(bot, chat_id)
+
+async def _answer_timeout(bot: Bot, chat_id: int):
+    st = await SESSIONS.fetch(chat_id)
+    if not st or st.phase != "answering":
+        return
+
+    need = len(st.players) - 1
+    got = len(st.answers)
+    logger.info(f"⏰ Таймаут ответов в чате {chat_id}: {got}/{need}")
+
+    if not got:
+        st.transition("finished")
+        metrics.ROUNDS_TOTAL.inc(outcome="cancelled")
+        round_messages.update(bot, st, _round_text(st, "⏰ Время вышло, никто не ответил. Раунд отменён."), main_menu())
+        await round_messages.flush(bot, chat_id)
+        round_messages.close(chat_id)
+        tracer.end_round(chat_id, status="cancelled")
+        await _finish_idle_round(bot, chat_id)
+        return
+
+    await _check_all_answered(bot, chat_id, force=True,
+                              note=f"⏰ Время вышло! Ответили {got} из {need}, продолжаем без остальных.")
+
+async def _on_pick_timeout(bot: Bot, chat_id: int):
+    """Ведущий не выбрал победителя вовремя: выбираем случайный ответ"""
+    async with session_lock(chat_id):
+        await _pick_timeout(bot, chat_id)
+
+async def _pick_timeout(bot: Bot, chat_id: int):
+    st = await SESSIONS.fetch(chat_id)
+    if not st or st.phase != "judging" or not st.shuffled_answers:
+        return
+
+    logger.info(f"⏰ Таймаут выбора ведущего в чате {chat_id}")
+    await _process_winner(bot, chat_id, random.randrange(len(st.shuffled_answers)),
+                          note="⏰ Ведущий не успел выбрать — победитель определён случайно.")
+
+async def _finish_idle_round(bot: Bot, chat_id: int):
+    """Считает раунды, в которых люди ничего не сделали, и завершает заброшенную игру"""
     st = SESSIONS.get(chat_id)
     if not st:
         return
-    
-    host = st["players"][st["host_idx"]]
-    if not host.get("is_bot", False):
+
+    if not st.has_humans() or st.human_acted:
+        st.idle_rounds = 0
         return
-    
-    bot_instance = host.get("bot_instance")
-    if not bot_instance:
+
+    st.idle_rounds += 1
+    if st.idle_rounds >= GAME_SETTINGS["MAX_IDLE_ROUNDS"]:
+        await _end_session(bot, chat_id, "🛑 Игроки не отвечают — игра завершена. Начните новую через меню.")
+
+async def _end_session(bot: Bot, chat_id: int, reason: str):
+    """Удаляет сессию вместе с руками и таймерами"""
+    scheduler.cancel_chat(chat_id)
+    callback_guard.forget_chat(chat_id)
+    round_messages.close(chat_id)
+    tracer.end_round(chat_id, status="abandoned")
+    if SESSIONS.pop(chat_id, None) is None:
         return
-    
-    await asyncio.sleep(random.uniform(3, 6))
-    
-    shuffled_answers = st.get("shuffled_answers", [])
-    players_answers = [(f"Вариант {i+1}", answer) for i, (uid, answer) in enumerate(shuffled_answers)]
-    
+    log_event("session_ended", f"🗑️ Сессия {chat_id} удалена")
     try:
-        winner_idx = await bot_instance.choose_winner(st["current_situation"], players_answers)
-        await _process_winner(bot, chat_id, winner_idx)
-    except Exception as e:
-        print(f"⚠️ Ошибка выбора победителя ботом: {e}")
-        winner_idx = random.randint(0, len(shuffled_answers) - 1)
+        await bot.send_message(chat_id, reason, reply_markup=main_menu())
+    except TelegramBadRequest:
+        pass
+
+async def _bot_host_choose_winner(bot: Bot, chat_id: int):
+    """Бот-ведущий автоматически выбирает победителя (вызывается планировщиком)"""
+    async with chat_locks(chat_id):
+        st = await SESSIONS.fetch(chat_id)
+        if not st or st.phase != "judging":
+            return
+        
+        host = st.host
+        if not host or not host.is_bot or not host.bot_instance:
+            return
+        
+        situation = st.current_situation
+        shuffled_answers = list(st.shuffled_answers)
+    players_answers = [(f"Вариант {i+1}", decks.answers[card_id]) for i, (uid, card_id) in enumerate(shuffled_answers)]
+    
+    with tracer.span("bot_pick", user_id=host.user_id):
+        try:
+            winner_idx = await host.bot_instance.choose_winner(situation, players_answers)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка выбора победителя ботом: {e}")
+            winner_idx = random.randint(0, len(shuffled_answers) - 1)
+
+    async with session_lock(chat_id):
         await _process_winner(bot, chat_id, winner_idx)
 
-async def _process_winner(bot: Bot, chat_id: int, winner_idx: int):
-    """Обрабатывает выбор победителя"""
+def _round_result(st: GameSession, win_uid: int, win_ans: str) -> RoundResult:
+    """Итог раунда для журнала статистики; тексты карт — на момент раунда"""
+    players = {p.user_id: (p.username, p.is_bot) for p in (st.get_player(uid) for uid in st.answers) if p}
+    host = st.host
+    if host:
+        players[host.user_id] = (host.username, host.is_bot)
+    return RoundResult(
+        chat_id=st.chat_id,
+        round_id=st.round_id,
+        host_id=host.user_id if host else 0,
+        winner_id=win_uid,
+        situation=st.current_situation or "",
+        winning_card=win_ans,
+        answers=tuple((uid, decks.answers[card_id]) for uid, card_id in st.answers.items()),
+        players=players,
+        started_at=st.round_started_at or time.time(),
+        finished_at=time.time(),
+    )
+
+@metrics.timed(metrics.ROUND_STEP_SECONDS, step="process_winner")
+async def _process_winner(bot: Bot, chat_id: int, winner_idx: int, note: str = ""):
+    """Обрабатывает выбор победителя; вызывается под chat_locks(chat_id)"""
     st = SESSIONS.get(chat_id)
-    if not st:
+    if not st or st.phase != "judging":
         return
     
-    shuffled_answers = st.get("shuffled_answers", [])
+    shuffled_answers = st.shuffled_answers
     
     if winner_idx < 0 or winner_idx >= len(shuffled_answers):
         return
-    
-    win_uid, win_ans = shuffled_answers[winner_idx]
-    
-    win_player_data = next(p for p in st["players"] if p["user_id"] == win_uid)
-    win_name = win_player_data["username"]
-    bot_mark = " 🤖" if win_player_data.get("is_bot", False) else ""
-    
-    host = st["players"][st["host_idx"]]
-    host_mark = " 🤖" if host.get("is_bot", False) else ""
-
-    st["scores"][win_uid] = st["scores"].get(win_uid, 0) + 1
-
-    for uid, answer_data in st["answers"].items():
-        hand = st["hands"].get(uid, [])
-        card = answer_data["card"]
-        if card in hand:
-            hand.remove(card)
-        st["used_answers"].append(card)
-        st["hands"][uid] = hand
-    
+
+    # Повторный выбор (двойное нажатие, гонка с таймаутом) сюда уже не дойдёт
+    if not st.transition("finished"):
+        return
+    scheduler.cancel(chat_id, "pick_timeout")
+    metrics.ROUNDS_TOTAL.inc(outcome="won")
+    
+    win_uid, win_card = shuffled_answers[winner_idx]
+    win_ans = decks.answers[win_card]
+    win_player = st.get_player(win_uid)
+    host = st.host
+
+    win_score = st.add_score(win_uid)
+    log_event("round_won", f"🏆 {win_player.label}: {win_ans}", winner_id=win_uid, score=win_score)
+    if STATS.enabled:
+        STATS.record(_round_result(st, win_uid, win_ans))
+
+    for uid, card_id in st.answers.items():
+        hand = st.hands.get(uid)
+        if hand is not None and card_id in hand:
+            hand.remove(card_id)
+        st.used_answers.add(card_id)
+    
+    winner_text = (
+        f"🏆 **Победитель раунда:** {win_player.label}\n"
+        f"👤 **Выбрал:** {host.label}\n"
+        f"💬 **Победный ответ:** _{win_ans}_\n\n"
+        f"⭐ Очков: {win_score}"
+    )
+
+    stats_lines = ["📊 **Текущий счёт:**"]
+    for i, p in enumerate(st.get_scores(), 1):
+        score = st.scores.get(p.user_id, 0)
+        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▪️"
+        stats_lines.append(f"{medal} {p.label}: {score}")
+    stats_text = "\n".join(stats_lines) + "\n\n✅ Раунд завершён."
+
     # УЛУЧШЕНО: Красивое раскрытие с разделителями
     reveal_lines = ["🎭 **Раскрытие ответов:**\n"]
-    for i, (uid, answer) in enumerate(shuffled_answers, 1):
-        player_data = next(p for p in st["players"] if p["user_id"] == uid)
-        player_mark = " 🤖" if player_data.get("is_bot", False) else ""
+    for i, (uid, card_id) in enumerate(shuffled_answers, 1):
+        player = st.get_player(uid)
+        answer = decks.answers[card_id]
         
         if uid == win_uid:
             reveal_lines.append(
                 f"🏆 **Вариант {i}:** _{answer}_\n"
-                f"   👤 Автор: **{player_data['username']}{player_mark}** ✨"
+                f"   👤 Автор: **{player.label}** ✨"
             )
         else:
             reveal_lines.append(
                 f"▪️ **Вариант {i}:** _{answer}_\n"
-                f"   👤 Автор: {player_data['username']}{player_mark}"
+                f"   👤 Автор: {player.label}"
             )
-    
-    await bot.send_message(chat_id, "\n\n".join(reveal_lines))
-    
-    await bot.send_message(
-        chat_id,
-        f"🏆 **Победитель раунда:** {win_name}{bot_mark}\n"
-        f"👤 **Выбрал:** {host['username']}{host_mark}\n"
-        f"💬 **Победный ответ:** _{win_ans}_\n\n"
-        f"⭐ Очков: {st['scores'][win_uid]}"
-    )
+    reveal_text = "\n\n".join(reveal_lines)
+
+    # Итог раунда — в то же сообщение; раскрытие, не влезающее в подпись к фото, — отдельным текстом
+    with tracer.span("reveal"):
+        text, reveal_apart, _ = _result_text(st, note, winner_text, stats_text, reveal_text)
+        round_messages.update(bot, st, text, main_menu())
+        await round_messages.flush(bot, chat_id)
+        if reveal_apart:
+            await bot.send_message(chat_id, fit(reveal_apart, TEXT_LIMIT))
+
+    await _finish_idle_round(bot, chat_id)
+    if SESSIONS.get(chat_id) is not st:
+        # Игра завершена за бездействием: сообщение и трассу закрыл _end_session
+        return
 
-    image_result, joke = await generate_card_content(st["current_situation"], win_ans)
-    
+    # Картинка и шутка генерируются десятки секунд — без блокировки чата
+    scheduler.schedule(chat_id, ILLUSTRATION, 0, _illustrate_round, bot, chat_id, st.round_id,
+                       st.current_situation, win_uid, win_ans, (note, winner_text, stats_text, reveal_text))
+
+async def _illustrate_round(bot: Bot, chat_id: int, round_id: int, situation: str, win_uid: int, win_ans: str,
+                            parts: Tuple[str, str, str, str]):
+    """
+    Иллюстрация и шутка к итогу раунда (действие планировщика).
+    Блокировка чата берётся только для правки сообщения раунда.
+    """
+    with tracer.span("illustration") as span:
+        image_result, joke = await generate_card_content(situation, win_ans)
+        if span is not None:
+            span.set(image=bool(image_result))
+    
+    joke_text = ""
     if image_result:
         try:
             if image_result.startswith('temp_image_') or os.path.isfile(image_result):
-                photo = FSInputFile(image_result)
-                await bot.send_photo(chat_id, photo=photo, caption=f"😄 {joke or ''}")
                 try:
-                    os.remove(image_result)
-                except Exception as e:
-                    print(f"⚠️ Не удалось удалить файл: {e}")
+                    photo = FSInputFile(image_result)
+                    await bot.send_photo(chat_id, photo=photo, caption=f"😄 {joke or ''}")
+                finally:
+                    try:
+                        os.remove(image_result)
+                    except Exception as e:
+                        logger.warning(f"⚠️ Не удалось удалить файл: {e}")
             else:
                 await bot.send_photo(chat_id, image_result, caption=f"😄 {joke or ''}")
         except Exception as e:
-            print(f"⚠️ Ошибка отправки изображения: {e}")
-            await bot.send_message(chat_id, f"😄 **Шутка:** {joke or '—'}")
+            logger.warning(f"⚠️ Ошибка отправки изображения: {e}")
+            joke_text = f"😄 **Шутка:** {joke or '—'}"
     else:
-        await bot.send_message(chat_id, f"😄 **Шутка:** {joke or '—'}")
+        joke_text = f"😄 **Шутка:** {joke or '—'}"
 
-    sorted_players = sorted(st["players"], key=lambda p: st["scores"].get(p["user_id"], 0), reverse=True)
-    stats_lines = ["📊 **Текущий счёт:**"]
-    for i, p in enumerate(sorted_players, 1):
-        score = st["scores"].get(p["user_id"], 0)
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "▪️"
-        bot_mark = " 🤖" if p.get("is_bot", False) else ""
-        stats_lines.append(f"{medal} {p['username']}{bot_mark}: {score}")
-    
-    await bot.send_message(chat_id, "\n".join(stats_lines) + "\n\n✅ Раунд завершён.", reply_markup=main_menu())
+    async with session_lock(chat_id):
+        st = await SESSIONS.fetch(chat_id)
+        if not st or st.round_id != round_id or st.phase != "finished":
+            # Уже идёт следующий раунд: его сообщение не трогаем, трассу закрыл start_round
+            return
+        if joke_text:
+            note, winner_text, stats_text, reveal_text = parts
+            # Раскрытие, не влезшее в подпись без шутки, уже отправлено отдельно (_process_winner)
+            text, _, joke_apart = _result_text(st, note, winner_text, stats_text, reveal_text, joke_text)
+            round_messages.update(bot, st, text)
+            await round_messages.flush(bot, chat_id)
+            if joke_apart:
+                await bot.send_message(chat_id, joke_apart)
+        round_messages.close(chat_id)
+        tracer.end_round(chat_id, status="won", winner_id=win_uid)
+
+STALE_BUTTON = "Эта кнопка из прошлого раунда."
+
+@router.callback_query(GameCallback(Action.ANSWER))
+async def on_answer(cb: CallbackQuery, payload: GameCallbackData):
+    group_chat_id, round_id, uid, idx = payload.chat_id, payload.round_id, payload.user_id, payload.index
+    # Кнопка в личке: в логах — игровой чат и раунд из callback_data
+    bind(chat_id=group_chat_id, round_id=round_id)
+    tracer.resume(group_chat_id, round_id)
+
+    # Повторы и кнопки прошлых раундов отсеиваются без блокировки и без сессии
+    if callback_guard.is_stale(group_chat_id, round_id):
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
+    handled = callback_guard.handled(group_chat_id, round_id, ("ans", uid))
+    if handled:
+        await cb.answer(handled)
+        return
+
+    with tracer.span("human_answer", user_id=uid):
+        async with session_lock(group_chat_id):
+            await _accept_answer(cb, group_chat_id, round_id, uid, idx)
 
-@router.callback_query(F.data.startswith("ans:"))
-async def on_answer(cb: CallbackQuery):
-    _, group_chat_id_str, uid_str, idx_str = cb.data.split(":")
-    group_chat_id, uid, idx = int(group_chat_id_str), int(uid_str), int(idx_str)
-    st = SESSIONS.get(group_chat_id)
+async def _accept_answer(cb: CallbackQuery, group_chat_id: int, round_id: int, uid: int, idx: int):
+    handled = callback_guard.handled(group_chat_id, round_id, ("ans", uid))
+    if handled:
+        # Повтор дождался блокировки, пока обрабатывалось первое нажатие
+        await cb.answer(handled)
+        return
+
+    st = await SESSIONS.fetch(group_chat_id)
     if not st:
         await cb.answer("Игра не найдена.", show_alert=True)
         return
 
-    host_id = st["players"][st["host_idx"]]["user_id"]
-    if cb.from_user.id != uid or uid == host_id:
+    if st.round_id != round_id:
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
+
+    if cb.from_user.id != uid or st.host is None or uid == st.host.user_id:
         await cb.answer("Вы не можете отвечать.", show_alert=True)
         return
 
-    if uid in st["answers"]:
+    if uid in st.answers:
         await cb.answer("Вы уже выбрали ответ!", show_alert=True)
         return
 
-    hand = st["hands"].get(uid, [])
+    if st.phase != "answering":
+        await cb.answer("Приём ответов закрыт.", show_alert=True)
+        return
+
+    hand = st.hands.get(uid, ())
     if idx < 0 or idx >= len(hand):
         await cb.answer("Неверный выбор.", show_alert=True)
         return
 
-    card = hand[idx]
-    st["answers"][uid] = {"card": card, "index": idx}
-    await cb.answer(f"✅ Вы выбрали: {card}")
+    card_id = hand[idx]
+    st.answers[uid] = card_id
+    st.human_acted = True
+    text = f"✅ Вы выбрали: {decks.answers[card_id]}"
+    callback_guard.remember(group_chat_id, round_id, ("ans", uid), text)
+    await cb.answer(text)
 
     await _check_all_answered(cb.bot, group_chat_id)
 
-@router.callback_query(F.data.startswith("pick:"))
-async def on_pick(cb: CallbackQuery):
-    _, group_chat_id_str, idx_str = cb.data.split(":")
-    group_chat_id, idx = int(group_chat_id_str), int(idx_str)
-    st = SESSIONS.get(group_chat_id)
+@router.callback_query(GameCallback(Action.PICK))
+async def on_pick(cb: CallbackQuery, payload: GameCallbackData):
+    group_chat_id, round_id, idx = payload.chat_id, payload.round_id, payload.index
+    bind(chat_id=group_chat_id, round_id=round_id)
+    tracer.resume(group_chat_id, round_id)
+
+    if callback_guard.is_stale(group_chat_id, round_id):
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
+    handled = callback_guard.handled(group_chat_id, round_id, "pick")
+    if handled:
+        await cb.answer(handled)
+        return
+
+    async with session_lock(group_chat_id):
+        await _accept_pick(cb, group_chat_id, round_id, idx)
+
+async def _accept_pick(cb: CallbackQuery, group_chat_id: int, round_id: int, idx: int):
+    handled = callback_guard.handled(group_chat_id, round_id, "pick")
+    if handled:
+        await cb.answer(handled)
+        return
+
+    st = await SESSIONS.fetch(group_chat_id)
     if not st:
         await cb.answer("Игра не найдена.", show_alert=True)
         return
 
-    host_id = st["players"][st["host_idx"]]["user_id"]
-    if cb.from_user.id != host_id:
+    if st.round_id != round_id:
+        await cb.answer(STALE_BUTTON, show_alert=True)
+        return
+
+    if st.host is None or cb.from_user.id != st.host.user_id:
         await cb.answer("Только ведущий может выбирать.", show_alert=True)
         return
 
-    try:
-        await cb.message.edit_reply_markup(reply_markup=None)
-    except TelegramBadRequest:
-        pass
-    
+    if st.phase != "judging":
+        await cb.answer("Победитель уже выбран.")
+        return
+
+    if idx < 0 or idx >= len(st.shuffled_answers):
+        await cb.answer("Неверный выбор.", show_alert=True)
+        return
+
+    # Запоминаем до первого await: повторные нажатия дальше не пройдут
+    callback_guard.remember(group_chat_id, round_id, "pick", "✅ Выбор принят!")
+    st.human_acted = True
     await cb.answer("✅ Выбор принят!")
-    
+
+    # Кнопки выбора снимет итоговая правка сообщения раунда
     await _process_winner(cb.bot, group_chat_id, idx)
+
+@router.callback_query(F.data.startswith(("ans:", "pick:")))
+async def on_legacy_button(cb: CallbackQuery):
+    """Кнопки, отправленные до перехода на callback_codec"""
+    await cb.answer(STALE_BUTTON, show_alert=True)
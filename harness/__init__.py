@@ -0,0 +1,4 @@
+# harness — локальный стенд для нагрузочной проверки бота без настоящего Telegram
+
+# Токен, с которым стенд запускает бота: им же подписаны кнопки виртуальных игроков
+BOT_TOKEN = "123:fake"
@@ -0,0 +1,147 @@
+# harness/fake_telegram.py
+"""
+Поддельный Bot API: отвечает на /bot{token}/{method} правдоподобным JSON
+и записывает всё, что бот отправил. Бот направляется сюда через
+TELEGRAM_API_URL (см. main.create_bot).
+
+Хуки on_send вызываются на каждый запрос — так виртуальные игроки
+реагируют на сообщения бота.
+
+Для нагрузочных прогонов сервер может отвечать с задержкой (latency +
+случайная добавка до jitter секунд) и отказывать с 429 Too Many Requests
+в доле throttle запросов, как Bot API при превышении лимитов.
+"""
+import asyncio
+import inspect
+import itertools
+import json
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from aiohttp import web
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "ЖесткаяИгра", "username": "fake_game_bot"}
+
+# Методы, которые возвращают Message
+MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendVideo", "sendAnimation", "sendDocument",
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia",
+}
+
+Hook = Callable[[str, Dict[str, Any]], Any]
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": f"Игрок{chat_id}"}
+    return {"id": chat_id, "type": "group", "title": f"Стол {chat_id}"}
+
+
+class FakeTelegram:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle: float = 0.0,
+                 retry_after: int = 1, record: bool = True):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        # record=False — только счётчики: долгий прогон не копит все запросы в памяти
+        self.record = record
+        self.sent: List[Tuple[float, str, Dict[str, Any]]] = []
+        self.calls: Dict[str, int] = {}
+        self.throttled = 0
+        self.hooks: List[Hook] = []
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner = None
+
+        self.app = web.Application(client_max_size=32 * 1024 * 1024)
+        self.app.router.add_route("*", "/bot{token}/{method}", self._handle)
+
+    def on_send(self, hook: Hook) -> None:
+        self.hooks.append(hook)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    # ---------- обработка запросов ----------
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.throttle and method != "getMe" and random.random() < self.throttle:
+            self.throttled += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        self.calls[method] = self.calls.get(method, 0) + 1
+        result = self._result(method, params)
+        if self.record:
+            self.sent.append((time.monotonic(), method, params))
+
+        for hook in self.hooks:
+            res = hook(method, params)
+            if inspect.isawaitable(res):
+                await res
+        return web.json_response({"ok": True, "result": result})
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            raw = await request.json()
+        else:
+            # aiogram шлёт form-data, с файлами — multipart
+            raw = {k: v for k, v in (await request.post()).items() if isinstance(v, str)}
+
+        params: Dict[str, Any] = {}
+        for key, value in raw.items():
+            if key in ("chat_id", "message_id", "user_id") and isinstance(value, str):
+                try:
+                    value = int(value)
+                except ValueError:
+                    pass
+            elif key in ("reply_markup", "entities", "caption_entities") and isinstance(value, str):
+                value = json.loads(value)
+            params[key] = value
+        return params
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return BOT_USER
+        if method not in MESSAGE_METHODS:
+            return True
+
+        chat_id = params.get("chat_id", 0)
+        message: Dict[str, Any] = {
+            "message_id": params.get("message_id") or next(self._message_ids),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": "fake", "file_unique_id": "fake", "width": 512, "height": 512}]
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+        return message
+
+
+def buttons(params: Dict[str, Any]) -> List[str]:
+    """callback_data всех inline-кнопок отправленного сообщения"""
+    markup = params.get("reply_markup") or {}
+    return [btn["callback_data"] for row in markup.get("inline_keyboard", []) for btn in row
+            if "callback_data" in btn]
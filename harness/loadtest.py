@@ -0,0 +1,163 @@
+# harness/loadtest.py
+"""
+Нагрузочный прогон в одном процессе: настоящий Dispatcher с роутером
+handlers.game_handlers, поддельный Bot API и виртуальные столы.
+
+    python -m harness.loadtest --tables 200 --rounds 3
+    python -m harness.loadtest --tables 500 --latency 0.05 --jitter 0.05 --throttle 0.01
+
+Обновления подаются прямо в dp.feed_raw_update, без webhook и сети на
+входе. Поддельный Bot API и игроки работают в отдельном потоке со своим
+циклом событий: цикл бота занят только ботом, и задержки Bot API
+(--latency, --jitter) и отказы 429 (--throttle) видны так же, как в бою.
+AI-провайдеры заменены заглушками (OFFLINE_AI), боты-игроки ходят без
+задержек (INSTANT_BOTS).
+
+Печатает раунды в секунду, задержку раунда от /start_round до итога
+(p50/p99), запросы к Bot API по методам и память на сессию: оценку
+SessionCache и прирост RSS процесса, делённый на число столов.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from harness import BOT_TOKEN
+from harness.fake_telegram import FakeTelegram
+
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (Linux); иначе — пиковый из getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _SideLoop:
+    """Цикл событий в отдельном потоке: поддельный Bot API и виртуальные игроки"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="fake-telegram", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    async def run(self, coro) -> Any:
+        """Выполняет корутину в побочном цикле и ждёт её из текущего"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+        self.loop.close()
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Окружение — до импорта модулей игры: config и callback_codec (ключ подписи
+    # кнопок) читают его при загрузке
+    os.environ.update(
+        TELEGRAM_API_URL=f"http://127.0.0.1:{args.api_port}",
+        BOT_TOKEN=BOT_TOKEN,
+        INSTANT_BOTS="1",
+        OFFLINE_AI="1",
+        SESSION_BACKEND="memory",
+        GEMINI_API_KEY="",
+        METRICS_PORT="0",
+    )
+    os.environ.setdefault("ADMIN_IDS", "1")
+    # Статистика по умолчанию выключена, как и сохранение сессий; STATS_DB_PATH=… — замер с ней
+    os.environ.setdefault("STATS_DB_PATH", "")
+    # Лог каждого раунда в консоль исказил бы замер
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    import main as app
+    from handlers.game_handlers import SESSIONS
+    from harness.players import Tables
+    from harness.replay import percentile
+
+    side = _SideLoop()
+    side.start()
+    fake = FakeTelegram(latency=args.latency, jitter=args.jitter, throttle=args.throttle,
+                        retry_after=args.retry_after, record=False)
+    await side.run(fake.start(port=args.api_port))
+
+    bot = app.create_bot()
+    dp = app.build_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    bot_loop = asyncio.get_running_loop()
+    in_flight: set = set()
+    errors = 0
+
+    async def feed(update: Dict[str, Any]) -> None:
+        nonlocal errors
+        in_flight.add(asyncio.current_task())
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            errors += 1
+        finally:
+            in_flight.discard(asyncio.current_task())
+
+    async def post(update: Dict[str, Any]) -> None:
+        # Вызывается в побочном цикле: обновление уходит в цикл бота
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(feed(update), bot_loop))
+
+    tables = Tables(args.tables, args.humans, args.rounds, post)
+    fake.on_send(tables.handle)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    print(f"⏳ Столов: {args.tables}, людей за столом: {args.humans}, раундов: {args.rounds}")
+    t0 = time.monotonic()
+    try:
+        finished = await side.run(tables.run(args.timeout))
+        elapsed = time.monotonic() - t0
+        gc.collect()
+        rss_growth = rss_bytes() - rss_before
+        sessions = len(SESSIONS)
+        estimate = SESSIONS.memory_usage()
+    finally:
+        # Итог раунда засчитан, но обработка (шутка, следующий раунд) ещё идёт
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        await side.run(fake.stop())
+        side.stop()
+
+    rounds = sum(t.rounds_done for t in tables.tables)
+    round_times = [x for t in tables.tables for x in t.round_times]
+    print(f"{'✅' if finished else '⚠️ не все столы доиграли,'} раундов: {rounds} за {elapsed:.2f} с "
+          f"({rounds / elapsed:.1f} раундов/с)")
+    print(f"⏱ раунд: p50 {percentile(round_times, 0.5) * 1000:.0f} мс, "
+          f"p99 {percentile(round_times, 0.99) * 1000:.0f} мс")
+    print(f"📬 запросов к Bot API: {sum(fake.calls.values())}, отказов 429: {fake.throttled}, "
+          f"ошибок обработки: {errors}")
+    print(f"📬 по методам: {dict(sorted(fake.calls.items(), key=lambda kv: -kv[1]))}")
+    if sessions:
+        print(f"💾 сессий: {sessions}, оценка {estimate / sessions / 1024:.1f} КБ на сессию, "
+              f"прирост RSS {rss_growth / max(1, args.tables) / 1024:.1f} КБ на стол")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон игры в одном процессе")
+    parser.add_argument("--tables", type=int, default=100, help="одновременных игр")
+    parser.add_argument("--humans", type=int, default=2, help="людей за столом (плюс боты-игроки)")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, до, с")
+    parser.add_argument("--throttle", type=float, default=0.0, help="доля запросов с ответом 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, с")
+    parser.add_argument("--api-port", type=int, default=8094)
+    parser.add_argument("--timeout", type=float, default=300)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# harness/players.py
+"""
+Виртуальные игроки: стол в групповом чате с несколькими людьми, которые
+отвечают на сообщения бота, записанные FakeTelegram.
+
+Сценарий стола: /new_game → /join_game от каждого → rounds раундов
+(/start_round, ответы кнопками в личке, выбор ведущего кнопкой в группе).
+Фазы раунда приходят правками одного сообщения (см. round_message).
+"""
+import asyncio
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import callback_codec
+from callback_codec import Action
+from harness import BOT_TOKEN, updates
+from harness.fake_telegram import buttons
+
+Post = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_PLAYERS_RE = re.compile(r"Игроков: (\d+) человек")
+
+_KEY = callback_codec.derive_key(BOT_TOKEN)
+
+
+def _game_buttons(data: List[str], action: Action) -> List[str]:
+    result = []
+    for item in data:
+        payload = callback_codec.decode(item, key=_KEY)
+        if payload is not None and payload.action == action:
+            result.append(item)
+    return result
+
+
+class VirtualTable:
+    def __init__(self, chat_id: int, user_ids: List[int], rounds: int, post: Post):
+        self.chat_id = chat_id
+        self.user_ids = user_ids
+        self.rounds = rounds
+        self.post = post
+
+        self.rounds_done = 0
+        self.round_times: List[float] = []
+        self.done = asyncio.Event()
+        self._joined = False
+        self._round_started = 0.0
+        # Сообщения раундов, уже засчитанных как завершённые: итог правится повторно (шутка)
+        self._finished_messages: set = set()
+        self._tasks: set = set()
+
+    async def start(self) -> None:
+        await self.post(updates.command(self.chat_id, self.user_ids[0], "new_game"))
+
+    def handle(self, method: str, params: Dict[str, Any]) -> None:
+        """Реакция на один запрос бота к Bot API (хук FakeTelegram)"""
+        chat_id = params.get("chat_id")
+        text = params.get("text") or params.get("caption") or ""
+
+        if chat_id == self.chat_id:
+            self._on_group(method, text, buttons(params), params.get("message_id"))
+        elif chat_id in self.user_ids:
+            answers = _game_buttons(buttons(params), Action.ANSWER)
+            if answers:
+                self._send(updates.callback(chat_id, random.choice(answers)))
+
+    def _on_group(self, method: str, text: str, data: List[str], message_id: Any = None) -> None:
+        if "Игра начата" in text:
+            for uid in self.user_ids:
+                self._send(updates.command(self.chat_id, uid, "join_game"))
+            return
+
+        m = _PLAYERS_RE.search(text)
+        if m and not self._joined and int(m.group(1)) >= len(self.user_ids):
+            self._joined = True
+            self._next_round()
+            return
+
+        picks = _game_buttons(data, Action.PICK)
+        if picks:
+            # Кто из людей ведущий, стол не знает: жмут все, бот примет только выбор ведущего
+            choice = random.choice(picks)
+            for uid in self.user_ids:
+                self._send(updates.callback(uid, choice, chat_id=self.chat_id))
+            return
+
+        if "Раунд завершён" in text or "Раунд отменён" in text:
+            if message_id is not None:
+                if message_id in self._finished_messages:
+                    return
+                self._finished_messages.add(message_id)
+            self.rounds_done += 1
+            self.round_times.append(time.monotonic() - self._round_started)
+            if self.rounds_done >= self.rounds:
+                self.done.set()
+            else:
+                self._next_round()
+
+    def _next_round(self) -> None:
+        self._round_started = time.monotonic()
+        self._send(updates.command(self.chat_id, self.user_ids[0], "start_round"))
+
+    def _send(self, update: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self.post(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+class Tables:
+    """Набор столов и маршрутизация записанных отправок к нужному столу"""
+
+    def __init__(self, count: int, humans: int, rounds: int, post: Post):
+        self.tables: List[VirtualTable] = []
+        self._by_chat: Dict[int, VirtualTable] = {}
+        for n in range(count):
+            chat_id = -1_000_000_000 - n
+            user_ids = [10_000 + n * humans + i for i in range(humans)]
+            table = VirtualTable(chat_id, user_ids, rounds, post)
+            self.tables.append(table)
+            self._by_chat[chat_id] = table
+            for uid in user_ids:
+                self._by_chat[uid] = table
+
+    def handle(self, method: str, params: Dict[str, Any]) -> None:
+        table = self._by_chat.get(params.get("chat_id"))
+        if table:
+            table.handle(method, params)
+
+    async def run(self, timeout: float) -> bool:
+        """Запускает все столы и ждёт завершения; False, если не уложились в timeout"""
+        for table in self.tables:
+            await table.start()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(t.done.wait() for t in self.tables)), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
@@ -0,0 +1,157 @@
+# harness/replay.py
+"""
+Прогон записанных обновлений через webhook-режим main.py с заданной частотой.
+
+    python -m harness.replay --rate 2000 --chats 500
+    python -m harness.replay --updates recorded.jsonl --rate 1000
+
+Поднимает поддельный Bot API и main.py с WEBHOOK_URL, отправляет обновления
+по расписанию (открытая модель нагрузки: не ждём ответа перед следующим)
+и печатает задержку подтверждения (p50/p99), долю 503 и пропускную
+способность обработки до опустошения очереди.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import aiohttp
+
+from harness import updates as builders
+from harness.fake_telegram import FakeTelegram
+from harness.players import BOT_TOKEN
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET = "harness-secret"
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"main.py завершился с кодом {proc.returncode}")
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("webhook-сервер не поднялся вовремя")
+
+
+async def run(args: argparse.Namespace) -> None:
+    batch = load_updates(args.updates) if args.updates else builders.game_mix(args.chats)
+    batch = batch * args.repeat
+    for update_id, update in enumerate(batch, 1):
+        update["update_id"] = update_id
+
+    fake = FakeTelegram()
+    api_url = await fake.start(port=args.api_port)
+    base = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        TELEGRAM_API_URL=api_url,
+        BOT_TOKEN=BOT_TOKEN,
+        ADMIN_IDS=os.getenv("ADMIN_IDS", "1"),
+        INSTANT_BOTS="1",
+        OFFLINE_AI="1",
+        SESSION_BACKEND="memory",
+        STATS_DB_PATH="",
+        GEMINI_API_KEY="",
+        WEBHOOK_URL=f"{base}/webhook",
+        WEBHOOK_HOST="127.0.0.1",
+        WEBHOOK_PORT=str(args.port),
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_WORKERS=str(args.workers),
+    )
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                            stdout=None if args.verbose else subprocess.DEVNULL,
+                            stderr=None if args.verbose else subprocess.DEVNULL)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        try:
+            print("⏳ Запуск main.py в webhook-режиме…")
+            await _wait_ready(session, f"{base}/webhook/stats", proc, 120)
+
+            async def post(update: Dict[str, Any]) -> None:
+                started = time.perf_counter()
+                try:
+                    async with session.post(f"{base}/webhook", json=update,
+                                            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+                        await resp.read()
+                        status = resp.status
+                except aiohttp.ClientError:
+                    status = 0
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+            calls_before = len(fake.sent)
+            t0 = time.monotonic()
+            tasks = []
+            for i, update in enumerate(batch):
+                delay = t0 + i / args.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(post(update)))
+            await asyncio.gather(*tasks)
+            sent_in = time.monotonic() - t0
+
+            # Ждём, пока очередь бота опустеет и обращения к Bot API прекратятся
+            last_calls, quiet_since = -1, time.monotonic()
+            while time.monotonic() - quiet_since < 0.5:
+                async with session.get(f"{base}/webhook/stats") as resp:
+                    stats = await resp.json()
+                if stats["queued"] or len(fake.sent) != last_calls:
+                    last_calls, quiet_since = len(fake.sent), time.monotonic()
+                await asyncio.sleep(0.05)
+            processed_in = quiet_since - t0
+        finally:
+            proc.terminate()
+            await asyncio.to_thread(proc.wait, 60)
+            await fake.stop()
+
+    ok = statuses.get(200, 0)
+    print(f"📨 отправлено: {len(batch)} за {sent_in:.2f} с (цель {args.rate}/с, факт {len(batch) / sent_in:.0f}/с)")
+    print(f"⚡ подтверждение: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} мс, статусы: {statuses}")
+    print(f"⚙️ обработано {ok} за {processed_in:.2f} с ({ok / processed_in:.0f}/с), "
+          f"запросов к Bot API: {len(fake.sent) - calls_before}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Прогон обновлений через webhook-режим с заданной частотой")
+    parser.add_argument("--updates", help="JSONL с обновлениями (например, из harness.shards --record)")
+    parser.add_argument("--chats", type=int, default=500, help="чатов в синтетической записи, если --updates не задан")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=2000, help="обновлений в секунду")
+    parser.add_argument("--connections", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=64, help="WEBHOOK_WORKERS бота")
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--api-port", type=int, default=8093)
+    parser.add_argument("--verbose", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
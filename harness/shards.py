@@ -0,0 +1,127 @@
+# harness/shards.py
+"""
+Локальная проверка шардированного запуска: поддельный Bot API, процесс
+sharding.py с N воркерами и виртуальные столы, играющие через webhook.
+
+    python -m harness.shards --shards 4 --tables 200 --rounds 3
+
+Печатает время, пропускную способность (обновлений/с) и распределение
+обновлений по шардам. Для оценки масштабирования запустите с --shards 1,2,4…
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+
+from harness.fake_telegram import FakeTelegram
+from harness.players import BOT_TOKEN, Tables
+
+ROOT = Path(__file__).resolve().parent.parent
+SECRET = "harness-secret"
+
+
+async def _wait_ready(session: aiohttp.ClientSession, url: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"sharding.py завершился с кодом {proc.returncode}")
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("маршрутизатор не поднялся вовремя")
+
+
+async def run(args: argparse.Namespace) -> None:
+    fake = FakeTelegram()
+    api_url = await fake.start(port=args.api_port)
+
+    env = dict(
+        os.environ,
+        TELEGRAM_API_URL=api_url,
+        BOT_TOKEN=BOT_TOKEN,
+        ADMIN_IDS=os.getenv("ADMIN_IDS", "1"),
+        INSTANT_BOTS="1",
+        OFFLINE_AI="1",
+        SESSION_BACKEND="memory",
+        STATS_DB_PATH="",
+        GEMINI_API_KEY="",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "sharding.py", "--shards", str(args.shards), "--host", "127.0.0.1",
+         "--port", str(args.port), "--secret", SECRET],
+        cwd=ROOT, env=env,
+        stdout=None if args.verbose else subprocess.DEVNULL,
+    )
+
+    base = f"http://127.0.0.1:{args.port}"
+    posted = 0
+    # Отправленные обновления можно сохранить и потом прогнать через harness.replay
+    record = open(args.record, "w", encoding="utf-8") if args.record else None
+    async with aiohttp.ClientSession() as session:
+        try:
+            print(f"⏳ Запуск {args.shards} шардов…")
+            await _wait_ready(session, f"{base}/healthz", proc, 120)
+
+            async def post(update):
+                nonlocal posted
+                async with session.post(f"{base}/webhook", json=update,
+                                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as resp:
+                    posted += 1
+                    if resp.status != 200:
+                        print(f"⚠️ webhook ответил {resp.status}")
+                if record:
+                    record.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+            tables = Tables(args.tables, args.humans, args.rounds, post)
+            fake.on_send(tables.handle)
+
+            t0 = time.monotonic()
+            finished = await tables.run(args.timeout)
+            elapsed = time.monotonic() - t0
+
+            async with session.get(f"{base}/shards") as resp:
+                stats = await resp.json()
+        finally:
+            # Воркеры дорабатывают очередь и ещё обращаются к Bot API — не блокируем loop
+            proc.terminate()
+            await asyncio.to_thread(proc.wait, 60)
+            await fake.stop()
+            if record:
+                record.close()
+
+    rounds = sum(t.rounds_done for t in tables.tables)
+    round_times = sorted(x for t in tables.tables for x in t.round_times)
+    p50 = round_times[len(round_times) // 2] if round_times else 0.0
+    print(f"{'✅' if finished else '⚠️ не все столы доиграли,'} шардов: {args.shards}, столов: {args.tables}")
+    print(f"⏱ {elapsed:.2f} с, раундов: {rounds}, раунд p50: {p50 * 1000:.0f} мс")
+    print(f"📨 обновлений: {posted} ({posted / elapsed:.0f}/с), запросов к Bot API: {len(fake.sent)}")
+    print(f"📬 по методам: {dict(sorted(fake.calls.items(), key=lambda kv: -kv[1]))}")
+    print(f"🧩 по шардам: {stats['routed']}, отклонено: {stats['rejected']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочная проверка шардированного запуска")
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--tables", type=int, default=50)
+    parser.add_argument("--humans", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--api-port", type=int, default=8091)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--record", help="записать отправленные обновления в JSONL")
+    parser.add_argument("--verbose", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
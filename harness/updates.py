@@ -0,0 +1,73 @@
+# harness/updates.py
+"""Конструкторы сырых Telegram-обновлений (dict), как их присылает webhook"""
+import itertools
+import time
+from typing import Any, Dict, List, Optional
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1_000_000)
+_callback_ids = itertools.count(1)
+
+
+def user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"Игрок{user_id}"}
+
+
+def chat(chat_id: int) -> Dict[str, Any]:
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": f"Игрок{chat_id}"}
+    return {"id": chat_id, "type": "group", "title": f"Стол {chat_id}"}
+
+
+def message(chat_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    msg = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": chat(chat_id),
+        "from": user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": msg}
+
+
+def command(chat_id: int, user_id: int, name: str) -> Dict[str, Any]:
+    return message(chat_id, user_id, f"/{name}")
+
+
+def callback(user_id: int, data: str, chat_id: Optional[int] = None, message_id: int = 1) -> Dict[str, Any]:
+    """Нажатие inline-кнопки; chat_id — чат сообщения с кнопкой (по умолчанию личка)"""
+    chat_id = user_id if chat_id is None else chat_id
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_callback_ids)),
+            "from": user(user_id),
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": chat(chat_id),
+                "text": "…",
+            },
+        },
+    }
+
+
+def game_mix(chats: int, humans: int = 2) -> List[Dict[str, Any]]:
+    """
+    Синтетическая «запись» для прогона без файла: создание игры, вход и
+    статистика в каждом чате. Раундов нет — рисование карточек ситуаций
+    заглушило бы замер приёма обновлений; полные игры дают записи harness.shards --record.
+    """
+    result = []
+    for n in range(chats):
+        chat_id = -2_000_000_000 - n
+        user_ids = [20_000 + n * humans + i for i in range(humans)]
+        result.append(command(chat_id, user_ids[0], "new_game"))
+        result.extend(command(chat_id, uid, "join_game") for uid in user_ids)
+        result.append(command(chat_id, user_ids[-1], "stats"))
+        result.append(callback(user_ids[-1], "ui_stats", chat_id=chat_id))
+    return result
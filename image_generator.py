@@ -2,11 +2,14 @@ import aiohttp
 from io import BytesIO
 import google.generativeai as genai
 import os
+import logging
 from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command
 from aiogram.utils import executor
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 # ===== Настройка ключей =====
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -32,7 +35,7 @@ async def generate_pollinations_image_file(scene_description: str) -> BytesIO |
                     img_file.seek(0)
                     return img_file
     except Exception as e:
-        print(f"Ошибка генерации изображения: {e}")
+        logger.warning(f"Ошибка генерации изображения: {e}")
     return None
 
 # Функция генерации шутки через Gemini
@@ -45,7 +48,7 @@ async def generate_card_joke(situation: str, answer: str) -> str:
         response = await asyncio.to_thread(gemini_model.generate_content, prompt)
         text = response.text.strip() if response and response.text else "Шутка не получилась 🤷"
     except Exception as e:
-        print(f"Ошибка Gemini: {e}")
+        logger.warning(f"Ошибка Gemini: {e}")
         text = "Шутка не сгенерировалась 🤷"
     return text
 
@@ -0,0 +1,67 @@
+# keyboards.py
+"""
+Клавиатуры игры.
+
+Неизменные клавиатуры (главное меню) создаются один раз и переиспользуются —
+aiogram только сериализует их при отправке и не меняет, поэтому общий объект
+безопасен. Кнопки рук и вариантов ответа зависят от чата, раунда и игрока
+(callback_data), поэтому собираются на каждый раунд, но без валидации pydantic:
+копированием заранее проверенного шаблона, что в несколько раз дешевле
+конструктора и model_construct у моделей aiogram.
+"""
+from functools import lru_cache
+from typing import Iterable, List
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from callback_codec import Action, encode
+
+# Шаблоны: единственные объекты, прошедшие валидацию
+_BUTTON = InlineKeyboardButton(text="-", callback_data="-")
+_MARKUP = InlineKeyboardMarkup(inline_keyboard=[])
+
+# Максимальная длина подписи варианта ответа на кнопке ведущего
+PICK_LABEL_LIMIT = 60
+
+
+def button(text: str, callback_data: str) -> InlineKeyboardButton:
+    return _BUTTON.model_copy(update={"text": text, "callback_data": callback_data})
+
+
+def markup(rows: List[List[InlineKeyboardButton]]) -> InlineKeyboardMarkup:
+    return _MARKUP.model_copy(update={"inline_keyboard": rows})
+
+
+MAIN_MENU = markup([
+    [button("Начать игру", "ui_new_game")],
+    [button("Присоединиться", "ui_join_game")],
+    [button("Новый раунд", "ui_start_round")],
+    [button("Статистика", "ui_stats")],
+])
+
+
+def main_menu() -> InlineKeyboardMarkup:
+    return MAIN_MENU
+
+
+@lru_cache(maxsize=4096)
+def pick_label(slot: int, answer: str) -> str:
+    """«N. текст ответа» с обрезкой длинных ответов"""
+    text = answer if len(answer) <= PICK_LABEL_LIMIT else answer[:PICK_LABEL_LIMIT - 3] + "..."
+    return f"{slot}. {text}"
+
+
+def hand_keyboard(chat_id: int, round_id: int, user_id: int, answers: Iterable[str]) -> InlineKeyboardMarkup:
+    """Рука игрока: по кнопке на карту"""
+    return markup([
+        [button(text, encode(Action.ANSWER, chat_id, round_id, user_id, i))]
+        for i, text in enumerate(answers)
+    ])
+
+
+def pick_keyboard(chat_id: int, round_id: int, answers: Iterable[str]) -> InlineKeyboardMarkup:
+    """Варианты ответов для ведущего в перемешанном порядке"""
+    return markup([
+        [button(pick_label(i + 1, text), encode(Action.PICK, chat_id, round_id, index=i))]
+        for i, text in enumerate(answers)
+    ])
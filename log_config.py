@@ -0,0 +1,231 @@
+# log_config.py
+"""
+Логирование без задержек в цикле событий.
+
+- Обработчики цикла только кладут запись в очередь (QueueHandler), вывод
+  в консоль и файл выполняет поток QueueListener.
+- Контекст (chat_id, round_id, user_id) хранится в contextvars и
+  добавляется к каждой записи: log_context() на время блока, bind() до
+  конца текущей задачи. Каждое обновление и каждое отложенное действие
+  планировщика выполняются в своём контексте.
+- Формат консоли: text или json (LOG_FORMAT); файл (LOG_FILE) — всегда
+  JSON Lines.
+- Записи DEBUG проходят с вероятностью LOG_DEBUG_SAMPLE (или
+  extra={"sample": доля} у записи): частые события вроде раздачи карт
+  не забивают очередь, даже если DEBUG включён.
+- Уровни по модулям: LOG_LEVELS="handlers=DEBUG,aiogram.event=WARNING".
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Запись на каждое обновление (aiogram) и каждый HTTP-запрос (aiohttp) — на горячем пути, по умолчанию скрыты
+DEFAULT_LEVELS = "aiogram.event=WARNING,aiohttp.access=WARNING"
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+_FORMATTER = logging.Formatter()
+
+# Поля LogRecord, которые не считаются пользовательскими (extra)
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+# ---------- контекст ----------
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Добавляет поля ко всем записям внутри блока"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def bind(**fields: Any) -> None:
+    """Добавляет поля к записям до конца текущего контекста (задачи или log_context)"""
+    _context.set({**_context.get(), **fields})
+
+
+def current_context() -> Dict[str, Any]:
+    return _context.get()
+
+
+def context_of(ctx: Context) -> Dict[str, Any]:
+    """Поля лога из чужого контекста (задачи или отложенного вызова)"""
+    return ctx.get(_context, {})
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Контекст обновления (update_id, чат, пользователь) на время его обработки"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        fields: Dict[str, Any] = {"update_id": event.update_id}
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        if chat is not None:
+            fields["chat_id"] = chat.id
+        if user is not None:
+            fields["user_id"] = user.id
+        with log_context(**fields):
+            return await handler(event, data)
+
+
+# ---------- фильтры и форматы ----------
+
+class ContextFilter(logging.Filter):
+    """Переносит контекст в запись — в потоке, где она создана, до постановки в очередь"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей уровня DEBUG и ниже"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = getattr(record, "sample", self.rate)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON с контекстом и полями extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Читаемый формат для консоли: контекст — в конце строки"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        return f"{line} [{extra}]" if extra else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трассировка форматируются здесь: аргументы могут измениться
+        # к моменту вывода, а объекты исключений не нужны в потоке записи
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ---------- настройка ----------
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """'handlers=DEBUG, aiogram=WARNING' → {'handlers': 10, 'aiogram': 30}"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(level: Optional[str] = None, levels: Optional[str] = None, fmt: Optional[str] = None,
+                  file: Optional[str] = None, debug_sample: Optional[float] = None) -> None:
+    """
+    Настраивает корневой логгер: очередь в цикле, вывод в отдельном потоке.
+    Параметры по умолчанию берутся из LOG_LEVEL, LOG_LEVELS, LOG_FORMAT,
+    LOG_FILE и LOG_DEBUG_SAMPLE. Повторный вызов перенастраивает логирование.
+    """
+    global _listener
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    levels = levels if levels is not None else os.getenv("LOG_LEVELS", "")
+    fmt = fmt or os.getenv("LOG_FORMAT", "text")
+    file = file if file is not None else os.getenv("LOG_FILE", "")
+    if debug_sample is None:
+        debug_sample = float(os.getenv("LOG_DEBUG_SAMPLE", "0.01"))
+
+    stop_logging()
+
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    outputs = [console]
+    if file:
+        os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+        file_handler = logging.handlers.WatchedFileHandler(file, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        outputs.append(file_handler)
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    # Сначала выборка: отброшенные записи не копируют контекст
+    handler.addFilter(SamplingFilter(debug_sample))
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    for name, module_level in {**parse_levels(DEFAULT_LEVELS), **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, *outputs, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает поток вывода"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for output in _listener.handlers:
+            output.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,195 @@
+# loop_watchdog.py
+"""
+Сторож цикла событий: ловит блокирующие вызовы в корутинах.
+
+- Пульс: цикл каждые interval секунд отмечает время (call_later, без
+  отдельной задачи).
+- Поток-наблюдатель проверяет пульс. Если цикл молчит дольше threshold,
+  снимает стек потока цикла (sys._current_frames) — это кадр, который
+  сейчас блокирует цикл, — и запоминает место в коде игры. Если цикл не
+  отвечает дольше freeze_report секунд, стек пишется в лог сразу, не
+  дожидаясь конца блокировки.
+- Медленные шаги: обёртка Handle._run замеряет каждый вызов цикла (два
+  чтения часов). Шаг дольше threshold попадает в лог с задачей, контекстом
+  обновления (chat_id, round_id, update_id) и местом блокировки из стека,
+  снятого наблюдателем, и в счётчик slow_callbacks_total.
+- Режим отладки asyncio (set_debug, slow_callback_duration) дорогой и
+  включается отдельно: WATCHDOG_ASYNCIO_DEBUG=1.
+
+Настройка: WATCHDOG_THRESHOLD (секунд, 0.25; 0 — выключен),
+WATCHDOG_ASYNCIO_DEBUG.
+"""
+import asyncio
+import asyncio.events
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import metrics
+from log_config import context_of
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+# Сколько нижних кадров стека показывать в логе
+STACK_LIMIT = 12
+
+SLOW_CALLBACKS = metrics.counter("slow_callbacks_total", "Шаги цикла событий дольше порога сторожа, по месту блокировки")
+SLOW_CALLBACK_SECONDS = metrics.histogram("slow_callback_seconds", "Длительность шагов цикла дольше порога сторожа",
+                                          buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+
+
+class _Sample:
+    """Стек потока цикла, снятый во время блокировки"""
+    __slots__ = ("taken", "where", "stack")
+
+    def __init__(self, taken: float, where: str, stack: str):
+        self.taken = taken
+        self.where = where
+        self.stack = stack
+
+
+def _is_project(filename: str) -> bool:
+    path = Path(filename)
+    return ROOT in path.parents and "site-packages" not in path.parts and path.name != "loop_watchdog.py"
+
+
+def _sample_stack(thread_id: int) -> Optional[_Sample]:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    frames = traceback.extract_stack(frame)
+    del frame
+    # Место блокировки — самый глубокий кадр кода игры, иначе самый глубокий вообще
+    own = [f for f in frames if _is_project(f.filename)]
+    top = own[-1] if own else frames[-1]
+    where = f"{Path(top.filename).relative_to(ROOT) if _is_project(top.filename) else top.filename}:{top.lineno} in {top.name}"
+    return _Sample(time.monotonic(), where, "".join(traceback.format_list(frames[-STACK_LIMIT:])))
+
+
+def _describe(handle: asyncio.events.Handle) -> str:
+    """Чей это шаг: задача и её корутина или функция обратного вызова"""
+    callback = handle._callback
+    task = getattr(callback, "__self__", None)
+    if isinstance(task, asyncio.Task):
+        coro = task.get_coro()
+        return f"{task.get_name()} ({getattr(coro, '__qualname__', type(coro).__name__)})"
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, freeze_report: float = 10.0,
+                 asyncio_debug: bool = False):
+        self.threshold = threshold
+        self.interval = interval
+        self.freeze_report = freeze_report
+        self.asyncio_debug = asyncio_debug
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._beat = 0.0
+        self._beat_handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._sample: Optional[_Sample] = None
+        self._original_run = None
+
+    @classmethod
+    def from_env(cls) -> "LoopWatchdog":
+        return cls(threshold=float(os.getenv("WATCHDOG_THRESHOLD", "0.25")),
+                   asyncio_debug=os.getenv("WATCHDOG_ASYNCIO_DEBUG", "0") == "1")
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    # ---------- запуск и остановка ----------
+
+    def start(self) -> None:
+        """Запускается из работающего цикла"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if self.asyncio_debug:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.threshold
+        self._install_hook()
+        self._pulse()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"🐕 Сторож цикла событий: порог {self.threshold:g} с")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(1)
+        self._thread = None
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+            self._beat_handle = None
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    # ---------- пульс и наблюдатель ----------
+
+    def _pulse(self) -> None:
+        self._beat = time.monotonic()
+        self._beat_handle = self._loop.call_later(self.interval, self._pulse)
+
+    def _watch(self) -> None:
+        stall_beat = None
+        reported = 0.0
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold:
+                continue
+            if beat != stall_beat:
+                # Новая блокировка: стек снимается один раз, пока она длится
+                stall_beat, reported = beat, 0.0
+                self._sample = _sample_stack(self._loop_thread)
+            elif stalled - reported >= self.freeze_report:
+                reported = stalled
+                sample = _sample_stack(self._loop_thread)
+                if sample is not None:
+                    logger.error(f"⛔ Цикл событий не отвечает {stalled:.0f} с: {sample.where}\n{sample.stack}")
+
+    # ---------- медленные шаги ----------
+
+    def _install_hook(self) -> None:
+        original = self._original_run = asyncio.events.Handle._run
+        threshold = self.threshold
+        clock = time.monotonic
+        report = self._report
+
+        def _run(handle):
+            started = clock()
+            original(handle)
+            elapsed = clock() - started
+            if elapsed >= threshold:
+                report(handle, started, elapsed)
+
+        asyncio.events.Handle._run = _run
+
+    def _report(self, handle: asyncio.events.Handle, started: float, elapsed: float) -> None:
+        sample = self._sample
+        if sample is not None and sample.taken >= started:
+            self._sample = None
+            where, stack = sample.where, sample.stack
+        else:
+            # Блокировка короче шага наблюдателя: места нет, есть только задача
+            where, stack = "?", ""
+        fields: Dict[str, Any] = dict(context_of(handle._context))
+        fields.update(blocked_s=round(elapsed, 3), where=where)
+        logger.warning(f"🐌 Цикл событий заблокирован на {elapsed:.2f} с: {where} ← {_describe(handle)}"
+                       + (f"\n{stack}" if stack else ""), extra=fields)
+        SLOW_CALLBACKS.inc(where=where)
+        SLOW_CALLBACK_SECONDS.observe(elapsed)
@@ -1,32 +1,57 @@
 import os
-import inspect
-import pathlib
-import game_utils
 import random
 import asyncio
 import re
+import signal
+import logging
+import sys
 
-print("CWD:", os.getcwd())
-print("game_utils file:", inspect.getfile(game_utils))
-print("situations path:", pathlib.Path(game_utils.decks.sit_path))
-print("answers path:", pathlib.Path(game_utils.decks.ans_path))
-print("situations loaded:", len(game_utils.decks.situations))
-print("answers loaded:", len(game_utils.decks.answers))
+if sys.version_info < (3, 11):
+    sys.exit("❌ Нужен Python 3.11 или новее")
+
+from log_config import LogContextMiddleware, setup_logging
+from tracing import TelegramTracingMiddleware, TraceContextMiddleware, setup_tracing, tracer
+
+# До импорта игровых модулей: они пишут в лог уже при загрузке колод
+setup_logging()
+setup_tracing()
 
-import logging
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
-from handlers.game_handlers import router as game_router, set_bot_players
+from aiohttp import web
+
+from handlers.game_handlers import router as game_router, set_bot_players, SESSIONS, STATS
+from handlers.admin_handlers import router as admin_router
+from scheduler import scheduler
+from game_utils import OFFLINE_AI, decks
+from webhook import build_webhook_app
+import metrics
+from loop_watchdog import LoopWatchdog
 
 import google.generativeai as genai
 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 # Переменные окружения
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Свой адрес Bot API (локальный telegram-bot-api или тестовый стенд)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+# Webhook: если задан WEBHOOK_URL, бот работает через webhook вместо polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "64"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "10000"))
+# Локальный сервер /metrics; 0 — выключен. Шард N (sharding.py) слушает METRICS_PORT + 1 + N
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
 
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
@@ -58,7 +83,8 @@ class BotPlayer:
 Твой выбор:"""
                 
                 model = genai.GenerativeModel("gemini-1.5-flash")
-                response = await asyncio.to_thread(model.generate_content, prompt)
+                with metrics.provider_call("gemini"):
+                    response = await asyncio.to_thread(model.generate_content, prompt)
                 answer = response.text.strip()
                 
                 # Проверяем, что ответ есть в списке доступных
@@ -70,18 +96,16 @@ class BotPlayer:
                 return random.choice(available_answers)
                 
             except Exception as e:
-                logging.error(f"Ошибка при генерации ответа ботом {self.name}: {e}")
+                logger.error(f"Ошибка при генерации ответа ботом {self.name}: {e}")
                 return random.choice(available_answers)
         else:
             # Простой случайный выбор, если AI недоступен
             return random.choice(available_answers)
     
     async def play_turn(self, situation: str, available_answers: list) -> str:
-        """Делает ход в игре"""
-        # Небольшая задержка для имитации "размышлений"
-        await asyncio.sleep(random.uniform(1.5, 3.5))
+        """Делает ход в игре (задержку «размышлений» задаёт scheduler)"""
         answer = await self.generate_answer(situation, available_answers)
-        logging.info(f"Бот {self.name} выбрал ответ: {answer}")
+        logger.debug("Бот %s выбрал ответ: %s", self.name, answer)
         return answer
     
     async def choose_winner(self, situation: str, players_answers: list) -> int:
@@ -114,7 +138,8 @@ class BotPlayer:
 Верни только число, без пояснений."""
                 
                 model = genai.GenerativeModel("gemini-1.5-flash")
-                response = await asyncio.to_thread(model.generate_content, prompt)
+                with metrics.provider_call("gemini"):
+                    response = await asyncio.to_thread(model.generate_content, prompt)
                 answer_text = response.text.strip()
                 
                 # Извлекаем номер из ответа
@@ -124,15 +149,15 @@ class BotPlayer:
                     # Конвертируем в индекс (от 1 до 0-based)
                     if 1 <= chosen_number <= len(players_answers):
                         chosen_idx = chosen_number - 1
-                        print(f"🤖 Бот-ведущий {self.name} выбрал ответ #{chosen_number}: {players_answers[chosen_idx][1]}")
+                        logger.debug("🤖 Бот-ведущий %s выбрал ответ #%d: %s", self.name, chosen_number, players_answers[chosen_idx][1])
                         return chosen_idx
                 
                 # Если AI не дал корректный ответ
-                print(f"⚠️ AI вернул некорректный номер: {answer_text}")
+                logger.warning(f"⚠️ AI вернул некорректный номер: {answer_text}")
                 return random.randint(0, len(players_answers) - 1)
                 
             except Exception as e:
-                logging.error(f"Ошибка при выборе победителя ботом {self.name}: {e}")
+                logger.error(f"Ошибка при выборе победителя ботом {self.name}: {e}")
                 return random.randint(0, len(players_answers) - 1)
         else:
             # Случайный выбор если AI недоступен
@@ -155,27 +180,115 @@ async def generate_gemini_response(text: str) -> str:
         response = await asyncio.to_thread(model.generate_content, text)
         return response.text
     except Exception as e:
-        logging.error(f"Ошибка генерации ответа Gemini: {e}")
+        logger.error(f"Ошибка генерации ответа Gemini: {e}")
         return "Извините, произошла ошибка при генерации ответа."
 
 
+def create_bot() -> Bot:
+    """Создаёт Bot; при заданном TELEGRAM_API_URL запросы идут на этот сервер"""
+    session = None
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    bot = Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=None))
+    bot.session.middleware(metrics.TelegramMetricsMiddleware())
+    bot.session.middleware(TelegramTracingMiddleware())
+    return bot
+
+
+_loop_lag = metrics.LoopLagMonitor()
+_watchdog = LoopWatchdog.from_env()
+_metrics_runner = None
+
+
+async def _on_startup():
+    global _metrics_runner
+    SESSIONS.start()
+    STATS.start()
+    _loop_lag.start()
+    _watchdog.start()
+    decks.start()
+    tracer.start()
+    if METRICS_PORT:
+        shard = os.getenv("SHARD_ID")
+        port = METRICS_PORT + 1 + int(shard) if shard else METRICS_PORT
+        _metrics_runner = await metrics.start_server(METRICS_HOST, port)
+
+
+async def _on_shutdown():
+    global _metrics_runner
+    # Сначала таймеры: после сброса сессий их никто не должен менять
+    await scheduler.shutdown()
+    await SESSIONS.stop()
+    await STATS.stop()
+    await _loop_lag.stop()
+    _watchdog.stop()
+    await decks.stop()
+    await tracer.stop()
+    if _metrics_runner:
+        await _metrics_runner.cleanup()
+        _metrics_runner = None
+
+
+def build_dispatcher() -> Dispatcher:
+    """Dispatcher с игровыми роутерами и фоновыми задачами сессий; общий для всех режимов запуска"""
+    dp = Dispatcher(storage=MemoryStorage())
+    # chat_id, user_id и update_id во всех записях лога, сделанных при обработке обновления
+    dp.update.outer_middleware(LogContextMiddleware())
+    # Спаны раунда — только в обновлениях, которые к нему относятся
+    dp.update.outer_middleware(TraceContextMiddleware())
+    
+    # Подключаем роутеры: команды администраторов, затем игровые обработчики
+    dp.include_router(admin_router)
+    dp.include_router(game_router)
+    
+    dp.startup.register(_on_startup)
+    dp.shutdown.register(_on_shutdown)
+    return dp
+
+
 async def main():
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN не задан в переменных окружения")
-    if not GEMINI_API_KEY:
+    if not GEMINI_API_KEY and not OFFLINE_AI:
         raise RuntimeError("GEMINI_API_KEY не задан в переменных окружения")
 
-    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=None))
-    dp = Dispatcher(storage=MemoryStorage())
-    
-    # Подключаем роутер с игровыми обработчиками
-    dp.include_router(game_router)
+    bot = create_bot()
+    dp = build_dispatcher()
     
-    logging.info("Бот запущен и готов к работе")
-    logging.info("Боты-игроки активированы: 🤖 БотИгрок1 и 🤖 БотИгрок2")
-    logging.info("Боты могут быть ведущими и автоматически выбирать победителей")
-    logging.info("Ответы игроков отображаются анонимно")
-    await dp.start_polling(bot)
+    logger.info("Бот запущен и готов к работе")
+    logger.info("Боты-игроки активированы: 🤖 БотИгрок1 и 🤖 БотИгрок2")
+    logger.info("Боты могут быть ведущими и автоматически выбирать победителей")
+    logger.info("Ответы игроков отображаются анонимно")
+    if WEBHOOK_URL:
+        await run_webhook(bot, dp)
+    else:
+        await dp.start_polling(bot)
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Webhook-режим: aiohttp-сервер с очередью обновлений и мягкой остановкой"""
+    app = build_webhook_app(dp, bot, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE)
+
+    async def set_webhook(app):
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET, drop_pending_updates=False)
+        logger.info(f"Webhook установлен: {WEBHOOK_URL}")
+
+    app.on_startup.append(set_webhook)
+    logger.info(f"Webhook-сервер: http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}, обработчиков: {WEBHOOK_WORKERS}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    try:
+        await stop.wait()
+    finally:
+        # on_shutdown: доработать очередь, затем остановить Dispatcher и сбросить сессии
+        await runner.cleanup()
 
 
 if __name__ == "__main__":
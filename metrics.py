@@ -0,0 +1,313 @@
+# metrics.py
+"""
+Метрики в текстовом формате Prometheus.
+
+Счётчики, гистограммы и вычисляемые показатели (gauge с функцией) живут
+в памяти процесса; render() собирает их для /metrics. Локальный
+HTTP-сервер метрик поднимается start_server() — в main.py на
+METRICS_HOST:METRICS_PORT, у шардов на соседних портах.
+
+Запись значения — словарь и bisect по границам корзин, без блокировок:
+всё выполняется в цикле событий. Показатели, требующие обхода данных
+(например, оценка памяти сессий), сюда намеренно не входят — /metrics
+не должен останавливать цикл.
+"""
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Границы корзин по умолчанию, в секундах: от миллисекунды до минуты
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _computed(name: str, fn: Callable[[], float]) -> Iterator[str]:
+    try:
+        yield f"{name} {_fmt_value(fn())}"
+    except Exception as e:
+        logger.warning(f"⚠️ Метрика {name} не вычислена: {e}")
+
+
+class Counter:
+    """Монотонный счётчик: inc() или чтение готового значения функцией fn при сборе"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        if self.fn is not None:
+            yield from _computed(self.name, self.fn)
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(value)}"
+
+
+class Gauge:
+    """Текущее значение: задаётся set() или вычисляется функцией fn при сборе"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[_key(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.fn is not None:
+            yield from _computed(self.name, self.fn)
+            return
+        for key, value in self._values.items():
+            yield f"{self.name}{_fmt_labels(key)} {_fmt_value(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # метки → [счётчики по корзинам (+Inf последней), сумма, количество]
+        self._series: Dict[LabelKey, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Время выполнения блока (в том числе с await внутри)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(_key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(bound)),))} {cumulative}"
+            yield f"{self.name}_bucket{_fmt_labels(key, (('le', '+Inf'),))} {count}"
+            yield f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(total)}"
+            yield f"{self.name}_count{_fmt_labels(key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        # Повторная регистрация (например, новый webhook-обработчик) заменяет прежнюю
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, fn: Optional[Callable[[], float]] = None) -> Counter:
+    return REGISTRY.register(Counter(name, help, fn))
+
+
+def gauge(name: str, help: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, fn))
+
+
+def histogram(name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, buckets))
+
+
+# ---------- метрики игры ----------
+
+ROUND_PHASE_SECONDS = histogram("round_phase_seconds", "Длительность этапов начала раунда: situation, render, deal, fanout")
+ROUND_STEP_SECONDS = histogram("round_step_seconds", "Длительность шагов раунда: start_round, check_all_answered, process_winner")
+ROUNDS_TOTAL = counter("rounds_total", "Раунды по исходу: started, won, cancelled")
+AI_SECONDS = histogram("ai_provider_seconds", "Длительность обращений к AI-провайдерам")
+AI_CALLS = counter("ai_provider_calls_total", "Обращения к AI-провайдерам по исходу: ok, empty, error")
+TELEGRAM_SECONDS = histogram("telegram_request_seconds", "Длительность запросов к Bot API по методам")
+TELEGRAM_ERRORS = counter("telegram_request_errors_total", "Ошибки запросов к Bot API по методам и типам")
+LOOP_LAG_SECONDS = histogram("event_loop_lag_seconds", "Опоздание пробуждения цикла событий",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+@contextmanager
+def provider_call(provider: str) -> Iterator[Dict[str, str]]:
+    """
+    Учитывает обращение к AI-провайдеру: время и исход, а внутри раунда — спан
+    ai.<провайдер>. Исход по умолчанию ok, при исключении — error; блок может
+    задать свой: call["outcome"] = "empty".
+    """
+    call = {"outcome": "ok"}
+    started = time.perf_counter()
+    with tracing.span(f"ai.{provider}") as span:
+        try:
+            yield call
+        except BaseException:
+            call["outcome"] = "error"
+            raise
+        finally:
+            AI_SECONDS.observe(time.perf_counter() - started, provider=provider)
+            AI_CALLS.inc(provider=provider, outcome=call["outcome"])
+            if span is not None:
+                span.set(outcome=call["outcome"])
+
+
+class Stopwatch:
+    """Последовательные этапы одной операции: lap(этап) записывает время с предыдущей отметки"""
+
+    __slots__ = ("histogram", "_last")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.histogram.observe(now - self._last, phase=phase)
+        self._last = now
+
+
+def timed(histogram: Histogram, **labels: Any):
+    """Декоратор корутины: время каждого вызова в histogram"""
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки каждого запроса бота к Bot API: bot.session.middleware(...)"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Response:
+        name = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter:
+            TELEGRAM_ERRORS.inc(method=name, error="retry_after")
+            raise
+        except TelegramNetworkError:
+            TELEGRAM_ERRORS.inc(method=name, error="network")
+            raise
+        except TelegramAPIError as e:
+            TELEGRAM_ERRORS.inc(method=name, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, method=name)
+
+
+class LoopLagMonitor:
+    """Фоновая задача: насколько позже запланированного просыпается цикл событий"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="loop-lag")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - expected))
+
+
+# ---------- HTTP ----------
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_server(host: str, port: int) -> Optional[web.AppRunner]:
+    """Поднимает локальный сервер с /metrics; None, если порт занят"""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logger.warning(f"⚠️ Сервер метрик на {host}:{port} не запущен: {e}")
+        await runner.cleanup()
+        return None
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,249 @@
+# pairing_index.py
+"""
+Индекс пар «ситуация → подходящие ответы» для умной раздачи.
+
+Считается заранее, вне игры:
+
+    python -m pairing_index                                  # колоды из DECK_SITUATIONS / DECK_ANSWERS
+    python -m pairing_index situations.json answers.pack --top-k 32
+
+Тексты разбиваются на слова, слова обрезаются до основы (первые
+STEM_LENGTH букв — грубый, но рабочий для русского стемминг). Карты —
+разреженные векторы TF-IDF, близость — косинус. Ответы раскладываются
+в инвертированный индекс «основа → ответы и веса», для каждой ситуации
+скалярные произведения копятся только по ответам с общими основами;
+основы, которые встречаются почти везде, пропускаются — они ничего не
+говорят о паре и дороже всего по времени.
+
+Файл — «матрица» top-k по строкам:
+
+    заголовок   MAGIC, отпечатки пакетов ситуаций и ответов, число строк, k
+    situations  rows × uint64 — дайджесты ситуаций по возрастанию
+    answers     rows × k × uint64 — дайджесты лучших ответов строки (0 — пусто)
+    scores      rows × k × uint16 — косинус × 65535
+
+Пары хранятся по дайджестам карт, а не по позициям: индекс переживает
+перезагрузку колоды, исчезнувшие ответы просто пропускаются. Отпечатки
+пакетов (CardIndex.fingerprint) говорят, когда индекс пора пересобрать.
+В игре строка находится двоичным поиском: лучшие ответы ситуации — O(k).
+"""
+import argparse
+import heapq
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from deck_compiler import open_deck
+from deck_index import CardIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DECKPAIR"
+# MAGIC, отпечаток ситуаций, отпечаток ответов, число строк, k
+HEADER = struct.Struct("<8sQQII")
+FILE_NAME = "pairs.bin"
+
+DEFAULT_TOP_K = 32
+# Длина основы слова и минимальная длина слова
+STEM_LENGTH = 5
+MIN_WORD = 3
+# Основа в большей доле ответов считается общей и не участвует в близости
+MAX_DF = 0.05
+# ...но в маленьких колодах общими считаются только основы чаще стольких ответов
+MIN_DF_LIMIT = 100
+SCORE_SCALE = 0xFFFF
+
+_WORD = re.compile(rf"[^\W\d_]{{{MIN_WORD},}}")
+# Служебные слова: в маленьких колодах idf их не отсекает
+_STOP_WORDS = frozenset(
+    "как что это для все всё его она они оно при про под над без или чем так уже еще ещё был была было были "
+    "быть когда после потому чтобы тебя меня тебе мне себя свой твой мой кто где вот только если даже the and".split()
+)
+
+
+def stems(text: str) -> List[str]:
+    """Основы слов текста"""
+    words = _WORD.findall(text.lower().replace("ё", "е"))
+    return [word[:STEM_LENGTH] for word in words if word not in _STOP_WORDS]
+
+
+def _vector(text: str, idf: Dict[str, float]) -> List[Tuple[str, float]]:
+    """Нормированный вектор TF-IDF по основам, известным idf"""
+    weights = [(stem, (1.0 + math.log(tf)) * idf[stem]) for stem, tf in Counter(stems(text)).items() if stem in idf]
+    norm = math.sqrt(sum(w * w for _, w in weights))
+    return [(stem, w / norm) for stem, w in weights] if norm else []
+
+
+def build_pairs(situations: CardIndex, answers: CardIndex, dst: Path, top_k: int = DEFAULT_TOP_K) -> int:
+    """Считает top_k ответов для каждой ситуации и пишет индекс dst; возвращает число строк"""
+    n = len(answers)
+    df: Counter = Counter()
+    for text in answers:
+        df.update(set(stems(text)))
+    limit = max(int(n * MAX_DF), MIN_DF_LIMIT)
+    idf = {stem: math.log(n / count) for stem, count in df.items() if count <= limit}
+    del df
+
+    # Инвертированный индекс: основа → (позиции ответов, веса)
+    postings: Dict[str, Tuple[array, array]] = {}
+    for pos, text in enumerate(answers):
+        for stem, w in _vector(text, idf):
+            posting = postings.get(stem)
+            if posting is None:
+                posting = postings[stem] = (array("I"), array("f"))
+            posting[0].append(pos)
+            posting[1].append(w)
+
+    rows: List[Tuple[int, List[Tuple[int, float]]]] = []
+    for pos, text in enumerate(situations):
+        scores: Dict[int, float] = {}
+        for stem, w in _vector(text, idf):
+            positions, weights = postings.get(stem, ((), ()))
+            for answer, aw in zip(positions, weights):
+                scores[answer] = scores.get(answer, 0.0) + w * aw
+        if scores:
+            best = heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+            rows.append((situations.digest_at(pos), best))
+    del postings
+    rows.sort(key=itemgetter(0))
+
+    digests = array("Q")
+    scores_out = array("H")
+    for _, best in rows:
+        digests.extend(answers.digest_at(answer) for answer, _ in best)
+        scores_out.extend(min(SCORE_SCALE, round(score * SCORE_SCALE)) for _, score in best)
+        padding = top_k - len(best)
+        digests.extend([0] * padding)
+        scores_out.extend([0] * padding)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=dst.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(HEADER.pack(MAGIC, situations.fingerprint(), answers.fingerprint(), len(rows), top_k))
+            for section in (array("Q", (d for d, _ in rows)), digests, scores_out):
+                raw = section.tobytes()
+                out.write(raw + b"\0" * (-len(raw) % 8))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dst)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    logger.info(f"🧩 Индекс пар: {len(rows)} из {len(situations)} ситуаций, до {top_k} ответов на ситуацию")
+    return len(rows)
+
+
+class PairingIndex:
+    """Лучшие ответы ситуаций поверх mmap; без файла — пустой индекс"""
+
+    __slots__ = ("path", "fingerprints", "top_k", "_mm", "_situations", "_answers", "_scores")
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._mm = None
+        self.fingerprints: Tuple[int, int] = (0, 0)
+        self.top_k = 0
+        if path is None:
+            self._situations = memoryview(b"").cast("Q")
+            self._answers = memoryview(b"").cast("Q")
+            self._scores = memoryview(b"").cast("H")
+            return
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        try:
+            magic, sits_fp, answers_fp, rows, top_k = HEADER.unpack_from(view)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            raise ValueError("не индекс пар")
+        self.fingerprints = (sits_fp, answers_fp)
+        self.top_k = top_k
+        pos = HEADER.size
+        sections = []
+        for typecode, count in (("Q", rows), ("Q", rows * top_k), ("H", rows * top_k)):
+            size = count * array(typecode).itemsize
+            sections.append(view[pos:pos + size].cast(typecode))
+            pos += size + (-size % 8)
+        self._situations, self._answers, self._scores = sections
+
+    def __len__(self) -> int:
+        return len(self._situations)
+
+    def _row(self, situation_digest: int) -> int:
+        i = bisect_left(self._situations, situation_digest)
+        return i if i < len(self._situations) and self._situations[i] == situation_digest else -1
+
+    def answers(self, situation_digest: int) -> memoryview:
+        """Дайджесты лучших ответов ситуации по убыванию близости (0 — пустые места в конце)"""
+        i = self._row(situation_digest)
+        return self._answers[i * self.top_k:(i + 1) * self.top_k] if i >= 0 else self._answers[:0]
+
+    def scores(self, situation_digest: int) -> List[float]:
+        """Близость лучших ответов ситуации, 0..1"""
+        i = self._row(situation_digest)
+        if i < 0:
+            return []
+        return [score / SCORE_SCALE for score in self._scores[i * self.top_k:(i + 1) * self.top_k] if score]
+
+
+def open_pairs(situations: CardIndex, answers: CardIndex, cache_dir: Path,
+               top_k: int = DEFAULT_TOP_K, build: bool = True) -> PairingIndex:
+    """
+    Индекс пар колоды из кэша; если его нет или он собран для других
+    карт или другого k — считается заново (build=False — пустой индекс:
+    сборка на 100k карт занимает секунды). Ошибка — пустой индекс.
+    """
+    path = cache_dir / FILE_NAME
+    try:
+        if path.exists():
+            pairs = PairingIndex(path)
+            if pairs.fingerprints == (situations.fingerprint(), answers.fingerprint()) and pairs.top_k == top_k:
+                return pairs
+        if not build:
+            return PairingIndex()
+        build_pairs(situations, answers, path, top_k)
+        return PairingIndex(path)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ Индекс пар не собран: {e}")
+        return PairingIndex()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Индекс пар «ситуация → подходящие ответы»")
+    parser.add_argument("situations", nargs="?", type=Path,
+                        default=Path(os.getenv("DECK_SITUATIONS", "situations.json")),
+                        help="колода ситуаций: JSON, JSON Lines или .pack")
+    parser.add_argument("answers", nargs="?", type=Path, default=Path(os.getenv("DECK_ANSWERS", "answers.json")),
+                        help="колода ответов: JSON, JSON Lines или .pack")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="ответов на ситуацию")
+    parser.add_argument("--index-dir", type=Path, default=Path(".deck_index"),
+                        help="каталог кэша колод, куда кладётся индекс")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    situations = open_deck(args.situations, "situations", args.index_dir)
+    answers = open_deck(args.answers, "answers", args.index_dir)
+    if not (len(situations) and len(answers)):
+        sys.exit("❌ колода пуста или не читается")
+    try:
+        build_pairs(situations, answers, args.index_dir / FILE_NAME, max(1, args.top_k))
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    print(f"💾 {args.index_dir / FILE_NAME}")
+
+
+if __name__ == "__main__":
+    main()
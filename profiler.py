@@ -0,0 +1,195 @@
+# profiler.py
+"""
+Выборочный профилировщик живого процесса: /profile N у администратора.
+
+Поток-сэмплер раз в interval секунд снимает стек потока цикла событий
+(sys._current_frames) и считает одинаковые стеки. Код игры при этом не
+трогается: ни sys.setprofile, ни обёрток — цена одного снимка — десятки
+микросекунд раз в 10 мс, игры продолжаются как обычно.
+
+Результат:
+- файл свёрнутых стеков (формат flamegraph.pl / speedscope / inferno:
+  «корень;…;лист число») в PROFILE_DIR;
+- сводка: доля простоя цикла (ожидание в select) и топ функций по
+  собственному и полному времени.
+
+Настройка: PROFILE_DIR (profiles), PROFILE_INTERVAL_MS (10),
+PROFILE_MAX_SECONDS (300).
+"""
+import asyncio
+import logging
+import os
+import site
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(__file__).resolve().parent
+# Самый длинный префикс первым: site-packages лежит внутри stdlib
+PREFIXES = sorted({str(ROOT), *site.getsitepackages(), sysconfig.get_paths()["stdlib"]}, key=len, reverse=True)
+# Лист стека простаивающего цикла: ожидание событий в селекторе
+IDLE_LEAVES = {"select", "poll"}
+
+
+@dataclass
+class Profile:
+    """Итог одного прогона профилировщика"""
+    seconds: float
+    interval: float
+    samples: int = 0
+    idle: int = 0
+    stacks: Counter = field(default_factory=Counter)
+
+    @property
+    def busy(self) -> int:
+        return self.samples - self.idle
+
+    def collapsed(self) -> str:
+        """Свёрнутые стеки: по строке на уникальный стек, самые частые сверху"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 15) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+        """Топ функций: (собственное время, полное время) в числе снимков, без простоя"""
+        busy = [(stack, count) for stack, count in self.stacks.items() if stack[-1] != "<idle>"]
+        # Общее начало всех стеков (запуск цикла, Handle._run) есть в каждом снимке — в топе оно лишнее
+        common = len(os.path.commonprefix([stack for stack, _ in busy])) if busy else 0
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in busy:
+            own[stack[-1]] += count
+            for name in set(stack[common:]):
+                total[name] += count
+        return own.most_common(limit), total.most_common(limit)
+
+    def summary(self, limit: int = 15) -> str:
+        if not self.samples:
+            return "🔬 Нет ни одного снимка"
+        own, total = self.top(limit)
+        busy = self.busy or 1
+        lines = [
+            f"🔬 Профиль за {self.seconds:.0f} с: {self.samples} снимков раз в {self.interval * 1000:.0f} мс",
+            f"💤 Простой цикла: {self.idle / self.samples:.0%}, работа: {self.busy / self.samples:.0%}",
+            "",
+            "Собственное время (доля рабочих снимков):",
+        ]
+        lines += [f"{count / busy:6.1%}  {name}" for name, count in own]
+        lines += ["", "Полное время (с вызванными):"]
+        lines += [f"{count / busy:6.1%}  {name}" for name, count in total]
+        return "\n".join(lines)
+
+
+def _label(code: CodeType, cache: Dict[CodeType, str]) -> str:
+    """«файл:функция» — путь относительно проекта, site-packages или stdlib"""
+    label = cache.get(code)
+    if label is None:
+        path = code.co_filename
+        base = next((prefix for prefix in PREFIXES if path.startswith(prefix)), "")
+        label = cache[code] = f"{path[len(base):].lstrip('/')}:{code.co_qualname}"
+    return label
+
+
+def _stack(frame: Optional[FrameType], cache: Dict[CodeType, str]) -> Tuple[str, ...]:
+    names = []
+    while frame is not None:
+        names.append(_label(frame.f_code, cache))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+class SamplingProfiler:
+    """Один прогон за раз; сам прогон — в своём потоке, вне пула asyncio.to_thread"""
+
+    def __init__(self, interval: float = 0.01, max_seconds: float = 300.0, out_dir: Path = Path("profiles")):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        return cls(
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000,
+            max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "300")),
+            out_dir=Path(os.getenv("PROFILE_DIR", "profiles")),
+        )
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def sample(self, thread_id: int, seconds: float) -> Profile:
+        """Снимает стеки потока thread_id в течение seconds (блокирует вызывающий поток)"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("профилировщик уже запущен")
+        try:
+            profile = Profile(seconds=seconds, interval=self.interval)
+            cache: Dict[CodeType, str] = {}
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break
+                stack = _stack(frame, cache)
+                del frame
+                profile.samples += 1
+                if stack and stack[-1].rsplit(":", 1)[-1].rsplit(".", 1)[-1] in IDLE_LEAVES:
+                    profile.idle += 1
+                    stack = stack + ("<idle>",)
+                profile.stacks[stack] += 1
+                time.sleep(self.interval)
+            return profile
+        finally:
+            self._lock.release()
+
+    def save(self, profile: Profile) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+        path.write_text(profile.collapsed(), encoding="utf-8")
+        return path
+
+    async def run(self, seconds: float) -> Tuple[Profile, Path]:
+        """Профилирует поток текущего цикла событий; цикл в это время работает как обычно"""
+        seconds = max(1.0, min(float(seconds), self.max_seconds))
+        loop_thread = threading.get_ident()
+        logger.info(f"🔬 Профилирование цикла событий: {seconds:.0f} с")
+        # Свой поток, а не asyncio.to_thread: прогон до max_seconds не занимает общий
+        # пул, в котором рисуются карточки и читаются сессии
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def resolve(result: Tuple[Profile, Path], error: Optional[BaseException]) -> None:
+            if done.done():
+                return
+            if error is not None:
+                done.set_exception(error)
+            else:
+                done.set_result(result)
+
+        def target() -> None:
+            result, error = None, None
+            try:
+                profile = self.sample(loop_thread, seconds)
+                result = (profile, self.save(profile))
+            except BaseException as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(resolve, result, error)
+            except RuntimeError:
+                pass  # цикл уже закрыт — результат никому не нужен
+
+        threading.Thread(target=target, name="profiler", daemon=True).start()
+        profile, path = await done
+        logger.info(f"🔬 Профиль: {profile.samples} снимков, простой {profile.idle}, файл {path}")
+        return profile, path
+
+
+profiler = SamplingProfiler.from_env()
@@ -0,0 +1,153 @@
+# round_message.py
+"""
+Живое сообщение раунда.
+
+Раунд показывается в группе одним сообщением (фото ситуации с подписью или
+текст), которое создаётся в начале раунда и дальше только редактируется:
+ход ответов, кнопки выбора ведущего, раскрытие, победитель и счёт.
+
+- update() запоминает желаемое состояние и планирует правку через debounce
+  секунд (таймер планировщика): частые изменения, например поток ответов,
+  схлопываются в одну правку;
+- flush() применяет последнее состояние сразу — для смены фазы, когда
+  игрокам нужны новые кнопки;
+- правка пропускается, если текст и клавиатура не изменились; если меняется
+  только клавиатура — edit_message_reply_markup;
+- id сообщения и его последний текст хранятся в GameSession и сохраняются
+  вместе с ней.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import BufferedInputFile, InlineKeyboardMarkup
+
+from game_state import GameSession
+from scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram на длину подписи к фото и текста сообщения
+CAPTION_LIMIT = 1024
+TEXT_LIMIT = 4096
+
+_TIMER = "round_message"
+_KEEP = object()
+
+
+def fit(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class _Live:
+    __slots__ = ("message_id", "photo", "text", "markup", "sent_text", "sent_markup", "lock")
+
+    def __init__(self, message_id: int, photo: bool, text: str, markup: Optional[InlineKeyboardMarkup]):
+        self.message_id = message_id
+        self.photo = photo
+        self.text = text
+        self.markup = markup
+        self.sent_text = text
+        self.sent_markup = markup
+        # Правки одного сообщения уходят строго по очереди
+        self.lock = asyncio.Lock()
+
+
+class RoundMessages:
+    def __init__(self, debounce: float = 1.0):
+        self.debounce = debounce
+        self._live: Dict[int, _Live] = {}
+
+    async def open(self, bot: Bot, st: GameSession, text: str,
+                   photo: Optional[BufferedInputFile] = None,
+                   markup: Optional[InlineKeyboardMarkup] = None) -> None:
+        """Отправляет сообщение нового раунда; вызывается под chat_locks(chat_id)"""
+        chat_id = st.chat_id
+        scheduler.cancel(chat_id, _TIMER)
+        if photo is not None:
+            text = fit(text, CAPTION_LIMIT)
+            msg = await bot.send_photo(chat_id, photo=photo, caption=text, reply_markup=markup)
+        else:
+            text = fit(text, TEXT_LIMIT)
+            msg = await bot.send_message(chat_id, text, reply_markup=markup)
+
+        st.round_message_id = msg.message_id
+        st.round_message_photo = photo is not None
+        st.round_message_text = text
+        self._live[chat_id] = _Live(msg.message_id, photo is not None, text, markup)
+
+    def update(self, bot: Bot, st: GameSession, text: str, markup=_KEEP) -> None:
+        """
+        Запоминает новое состояние сообщения и планирует отложенную правку.
+        markup не передан — клавиатура остаётся прежней, None — убирается.
+        Вызывается под chat_locks(chat_id).
+        """
+        if not st.round_message_id:
+            return
+        chat_id = st.chat_id
+        live = self._live.get(chat_id)
+        if live is None:
+            # Сессия поднята из хранилища: клавиатура на момент сохранения неизвестна
+            live = self._live[chat_id] = _Live(st.round_message_id, st.round_message_photo,
+                                               st.round_message_text, _KEEP)
+        live.text = fit(text, CAPTION_LIMIT if live.photo else TEXT_LIMIT)
+        if markup is not _KEEP:
+            live.markup = markup
+
+        # Желаемое состояние сохраняется сразу, даже если правка ещё не ушла
+        st.round_message_id = live.message_id
+        st.round_message_photo = live.photo
+        st.round_message_text = live.text
+
+        if not scheduler.is_scheduled(chat_id, _TIMER):
+            scheduler.schedule(chat_id, _TIMER, self.debounce, self.flush, bot, chat_id)
+
+    async def flush(self, bot: Bot, chat_id: int) -> None:
+        """Применяет последнее состояние сообщения без ожидания"""
+        scheduler.cancel(chat_id, _TIMER)
+        live = self._live.get(chat_id)
+        if live is None:
+            return
+        async with live.lock:
+            text, markup = live.text, live.markup
+            text_changed = text != live.sent_text
+            markup_changed = markup is not _KEEP and markup != live.sent_markup
+            if not text_changed and not markup_changed:
+                return
+            await self._edit(bot, chat_id, live, text, markup, text_changed)
+            live.sent_text = text
+            if markup is not _KEEP:
+                live.sent_markup = markup
+
+    def close(self, chat_id: int) -> None:
+        """Раунд окончен: дальнейших правок не будет"""
+        scheduler.cancel(chat_id, _TIMER)
+        self._live.pop(chat_id, None)
+
+    async def _edit(self, bot: Bot, chat_id: int, live: _Live, text: str, markup, text_changed: bool) -> None:
+        kwargs = {} if markup is _KEEP else {"reply_markup": markup}
+        for attempt in range(2):
+            try:
+                if not text_changed:
+                    await bot.edit_message_reply_markup(chat_id=chat_id, message_id=live.message_id, **kwargs)
+                elif live.photo:
+                    await bot.edit_message_caption(chat_id=chat_id, message_id=live.message_id,
+                                                   caption=text, **kwargs)
+                else:
+                    await bot.edit_message_text(text, chat_id=chat_id, message_id=live.message_id, **kwargs)
+                return
+            except TelegramRetryAfter as e:
+                if attempt:
+                    raise
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    return
+                # Сообщение удалено или слишком старое для правки — продолжаем в новом
+                logger.warning(f"⚠️ Не удалось изменить сообщение раунда в чате {chat_id}: {e}")
+                msg = await bot.send_message(chat_id, fit(text, TEXT_LIMIT), **kwargs)
+                live.message_id = msg.message_id
+                live.photo = False
+                return
@@ -0,0 +1,223 @@
+# scheduler.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import GAME_SETTINGS
+from log_config import bind
+from tracing import use_round
+
+logger = logging.getLogger(__name__)
+
+# Ключ отложенного действия: (chat_id, имя действия), например (-100123, "bot_answer:1")
+TimerKey = Tuple[int, str]
+
+
+class _Timer:
+    __slots__ = ("deadline", "key", "callback", "args", "context", "cancelled")
+
+    def __init__(self, deadline: float, key: TimerKey, callback: Callable[..., Awaitable[Any]], args: tuple):
+        self.deadline = deadline
+        self.key = key
+        self.callback = callback
+        self.args = args
+        # Контекст на момент планирования: действие логируется с чатом и раундом, которые его запланировали,
+        # и попадает в трассу этого раунда
+        self.context = contextvars.copy_context()
+        self.context.run(bind, chat_id=key[0])
+        self.context.run(use_round)
+        self.cancelled = False
+
+
+class SessionScheduler:
+    """
+    Единый планировщик отложенных действий игровых сессий.
+
+    Все таймеры лежат в одной min-куче и обслуживаются одной фоновой задачей,
+    вместо отдельной спящей задачи на каждое действие. На каждый ключ
+    (chat_id, действие) хранится не больше одного таймера: повторное
+    планирование заменяет старый. Сработавшие действия запускаются как задачи,
+    число одновременно выполняемых ограничено max_running.
+    """
+
+    def __init__(self, max_running: int = 256):
+        self._heap: List[Tuple[float, int, _Timer]] = []
+        self._timers: Dict[TimerKey, _Timer] = {}
+        self._by_chat: Dict[int, Set[str]] = {}
+        self._running: Dict[int, Set[asyncio.Task]] = {}
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._max_running = max_running
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    # ---------- публичный API ----------
+
+    def schedule(self, chat_id: int, name: str, delay: float,
+                 callback: Callable[..., Awaitable[Any]], *args) -> None:
+        """Планирует callback(*args) через delay секунд, заменяя таймер с тем же именем"""
+        key = (chat_id, name)
+        self._drop(key)
+
+        timer = _Timer(time.monotonic() + max(0.0, delay), key, callback, args)
+        self._timers[key] = timer
+        self._by_chat.setdefault(chat_id, set()).add(name)
+        heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer))
+
+        self._ensure_runner()
+        if self._heap[0][2] is timer:
+            self._wakeup.set()
+
+    def cancel(self, chat_id: int, name: str) -> bool:
+        """Отменяет ожидающий таймер; возвращает True, если он был"""
+        return self._drop((chat_id, name))
+
+    def cancel_chat(self, chat_id: int, running: bool = True, keep: Tuple[str, ...] = ()) -> None:
+        """
+        Отменяет все ожидающие таймеры чата, а при running=True — и уже
+        выполняющиеся действия (кроме текущей задачи). Действия с именами
+        из keep не трогаются.
+        """
+        for name in list(self._by_chat.get(chat_id, ())):
+            if name not in keep:
+                self._drop((chat_id, name))
+
+        if running:
+            current = asyncio.current_task() if self._loop_running() else None
+            kept = {f"timer:{chat_id}:{name}" for name in keep}
+            for task in list(self._running.get(chat_id, ())):
+                if task is not current and task.get_name() not in kept:
+                    task.cancel()
+
+    def is_scheduled(self, chat_id: int, name: str) -> bool:
+        return (chat_id, name) in self._timers
+
+    def has_chat(self, chat_id: int) -> bool:
+        """Есть ли у чата ожидающие или выполняющиеся действия"""
+        return chat_id in self._by_chat or chat_id in self._running
+
+    def pending_count(self) -> int:
+        return len(self._timers)
+
+    def running_count(self) -> int:
+        return sum(len(tasks) for tasks in self._running.values())
+
+    async def shutdown(self) -> None:
+        """Останавливает цикл таймеров и отменяет все действия"""
+        for key in list(self._timers):
+            self._drop(key)
+        tasks = [t for tasks in self._running.values() for t in tasks]
+        if self._runner:
+            tasks.append(self._runner)
+            self._runner = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._heap.clear()
+        self._cancelled = 0
+
+    # ---------- внутреннее ----------
+
+    @staticmethod
+    def _loop_running() -> bool:
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _forget(self, key: TimerKey) -> Optional[_Timer]:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            names = self._by_chat.get(key[0])
+            if names is not None:
+                names.discard(key[1])
+                if not names:
+                    del self._by_chat[key[0]]
+        return timer
+
+    def _drop(self, key: TimerKey) -> bool:
+        timer = self._forget(key)
+        if timer is None:
+            return False
+        timer.cancelled = True
+        self._cancelled += 1
+
+        # Ленивое удаление: пересобираем кучу, когда отменённых больше половины
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._heap = [item for item in self._heap if not item[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def _ensure_runner(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self._max_running)
+            self._runner = asyncio.create_task(self._run(), name="session-scheduler")
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                # Не wait_for: в 3.11 он теряет отмену, совпавшую с таймаутом,
+                # и shutdown() ждёт цикл таймеров вечно
+                alarm = asyncio.get_running_loop().call_later(delay, self._wakeup.set)
+                try:
+                    await self._wakeup.wait()
+                finally:
+                    alarm.cancel()
+                continue
+
+            _, _, timer = heapq.heappop(self._heap)
+            self._forget(timer.key)
+
+            await self._slots.acquire()
+            self._spawn(timer)
+
+    def _spawn(self, timer: _Timer) -> None:
+        chat_id = timer.key[0]
+        task = asyncio.create_task(timer.callback(*timer.args), name=f"timer:{chat_id}:{timer.key[1]}",
+                                   context=timer.context)
+        self._running.setdefault(chat_id, set()).add(task)
+
+        def _done(t: asyncio.Task, chat_id=chat_id, slots=self._slots):
+            slots.release()
+            tasks = self._running.get(chat_id)
+            if tasks is not None:
+                tasks.discard(t)
+                if not tasks:
+                    del self._running[chat_id]
+            if not t.cancelled() and t.exception():
+                logger.error(f"⚠️ Ошибка отложенного действия {t.get_name()}: {t.exception()!r}",
+                             exc_info=t.exception())
+
+        task.add_done_callback(_done)
+
+
+def bot_delay(setting: str) -> float:
+    """Задержка «размышлений» бота из GAME_SETTINGS; 0 в режиме INSTANT_BOTS"""
+    if GAME_SETTINGS["INSTANT_BOTS"]:
+        return 0.0
+    low, high = GAME_SETTINGS[setting]
+    return random.uniform(low, high)
+
+
+# Общий планировщик процесса
+scheduler = SessionScheduler(max_running=GAME_SETTINGS["MAX_RUNNING_TIMERS"])
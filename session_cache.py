@@ -0,0 +1,360 @@
+# session_cache.py
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, MutableMapping, Optional, Set
+
+from session_store import SessionBackend
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """Грубая оценка памяти, занимаемой сессией (контейнеры, строки, поля __slots__), в байтах"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += estimate_size(k, _seen) + estimate_size(v, _seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += estimate_size(item, _seen)
+    elif hasattr(type(obj), "__slots__"):
+        for name in type(obj).__slots__:
+            size += estimate_size(getattr(obj, name, None), _seen)
+    return size
+
+
+class SessionCache(MutableMapping):
+    """
+    Хранилище игровых сессий chat_id → состояние: кэш в памяти перед
+    необязательным долговременным бэкендом (см. session_store).
+
+    - LRU-порядок и время последнего обращения для каждого чата;
+    - сессии, простаивающие дольше idle_ttl, вытесняются периодической чисткой;
+    - число сессий ограничено max_sessions, суммарная оценка памяти — memory_budget
+      (сумма ведётся на ходу: пересчитываются только сессии, изменённые с
+      прошлой чистки, а не все сессии в памяти);
+    - изменённые сессии помечаются грязными (присваивание или mark_dirty после
+      изменения; чтение сессию не пачкает) и сбрасываются в бэкенд пачками
+      фоновой задачей (write-behind), повторные изменения одной сессии
+      между сбросами схлопываются в одну запись;
+    - при промахе кэша fetch() лениво поднимает сессию из бэкенда (чтение
+      в потоке), так что вытесненные и пережившие перезапуск игры
+      продолжаются прозрачно; чаты без сессии запоминаются (до missing_limit),
+      и повторные обращения к ним диск не трогают. Синхронный доступ
+      (get, in, []) видит только память и диск не читает.
+
+    Сессии, для которых pinned(chat_id) возвращает True (идёт раунд),
+    не вытесняются.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SessionBackend] = None,
+        max_sessions: int = 5000,
+        idle_ttl: float = 1800,
+        memory_budget: int = 64 * 1024 * 1024,
+        persist_ttl: float = 7 * 24 * 3600,
+        flush_interval: float = 1.0,
+        flush_batch: int = 500,
+        missing_limit: int = 10000,
+        dump: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda st: st,
+        load: Callable[[Dict[str, Any]], Dict[str, Any]] = lambda data: data,
+        pinned: Callable[[int], bool] = lambda chat_id: False,
+    ):
+        self.backend = backend
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.persist_ttl = persist_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.missing_limit = missing_limit
+        self.dump = dump
+        self.load = load
+        self.pinned = pinned
+
+        self._data: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._last_activity: Dict[int, float] = {}
+        # Грязные сессии в памяти и уже сериализованные вытесненные, ждущие записи
+        self._dirty: Set[int] = set()
+        self._pending: Dict[int, str] = {}
+        self._deleted: Set[int] = set()
+        # Чаты, которых нет и в бэкенде (LRU)
+        self._missing: "OrderedDict[int, None]" = OrderedDict()
+        # Оценки памяти по сессиям, их сумма и сессии, чью оценку пора пересчитать
+        self._sizes: Dict[int, int] = {}
+        self._total_size = 0
+        self._resized: Set[int] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    # ---------- MutableMapping ----------
+
+    def __getitem__(self, chat_id: int) -> Dict[str, Any]:
+        st = self._data.get(chat_id)
+        if st is None:
+            st = self._resume_pending(chat_id)
+            if st is None:
+                raise KeyError(chat_id)
+        self.touch(chat_id)
+        return st
+
+    def __setitem__(self, chat_id: int, st: Dict[str, Any]) -> None:
+        self._data[chat_id] = st
+        self._pending.pop(chat_id, None)
+        self._deleted.discard(chat_id)
+        self._missing.pop(chat_id, None)
+        self.touch(chat_id)
+        self.mark_dirty(chat_id)
+        if len(self._data) > self.max_sessions:
+            self._evict_lru(lambda: len(self._data) > self.max_sessions)
+
+    def __delitem__(self, chat_id: int) -> None:
+        found = self._data.pop(chat_id, None) is not None
+        found = self._pending.pop(chat_id, None) is not None or found
+        self._forget_size(chat_id)
+        self._last_activity.pop(chat_id, None)
+        self._dirty.discard(chat_id)
+        if self.backend:
+            # Копия в бэкенде удаляется в любом случае, читать её ради KeyError незачем
+            self._deleted.add(chat_id)
+            self._remember_missing(chat_id)
+        if not found:
+            raise KeyError(chat_id)
+
+    def __contains__(self, chat_id: object) -> bool:
+        return chat_id in self._data or chat_id in self._pending
+
+    def __iter__(self) -> Iterator[int]:
+        # Только сессии в памяти: перебор не должен поднимать всё из бэкенда
+        return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def fetch(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Сессия чата или None; при промахе кэша — из бэкенда, чтение в потоке"""
+        st = self.get(chat_id)
+        if st is not None or not self.backend or chat_id in self._deleted or chat_id in self._missing:
+            return st
+        try:
+            payload = await asyncio.to_thread(self.backend.load, chat_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать сессию {chat_id}: {e}")
+            return None
+        if chat_id in self._data or chat_id in self._deleted:
+            # Пока шло чтение, сессию создали или удалили
+            return self.get(chat_id)
+        if payload is None:
+            self._remember_missing(chat_id)
+            return None
+        return self._restore(chat_id, payload, from_pending=False)
+
+    def in_memory(self) -> List[Dict[str, Any]]:
+        """Сессии в памяти без отметки активности — для фоновых обходов"""
+        return list(self._data.values())
+
+    # ---------- активность и вытеснение ----------
+
+    def touch(self, chat_id: int) -> None:
+        """Отмечает активность чата и переносит его в конец LRU-очереди"""
+        if chat_id in self._data:
+            self._data.move_to_end(chat_id)
+            self._last_activity[chat_id] = time.monotonic()
+
+    def mark_dirty(self, chat_id: int) -> None:
+        """Ставит сессию в очередь на запись в бэкенд и на пересчёт оценки памяти"""
+        if chat_id in self._data:
+            self._resized.add(chat_id)
+            if self.backend:
+                self._dirty.add(chat_id)
+
+    def idle_for(self, chat_id: int) -> float:
+        return time.monotonic() - self._last_activity.get(chat_id, time.monotonic())
+
+    def memory_usage(self) -> int:
+        """Оценка памяти сессий; сессии, изменённые без mark_dirty, учтены по прошлой оценке"""
+        self._update_sizes()
+        return self._total_size
+
+    def _update_sizes(self) -> None:
+        for chat_id in self._resized:
+            st = self._data.get(chat_id)
+            if st is None:
+                continue
+            size = estimate_size(st)
+            self._total_size += size - self._sizes.get(chat_id, 0)
+            self._sizes[chat_id] = size
+        self._resized.clear()
+
+    def _forget_size(self, chat_id: int) -> None:
+        self._total_size -= self._sizes.pop(chat_id, 0)
+        self._resized.discard(chat_id)
+
+    def sweep(self) -> int:
+        """Вытесняет простаивающие сессии и соблюдает лимиты; возвращает число вытесненных"""
+        now = time.monotonic()
+        evicted = 0
+        for chat_id in list(self._data):
+            if now - self._last_activity.get(chat_id, now) < self.idle_ttl:
+                # Дальше по LRU-очереди только более свежие сессии
+                break
+            if self.pinned(chat_id):
+                continue
+            self._evict(chat_id)
+            evicted += 1
+
+        evicted += self._evict_lru(lambda: len(self._data) > self.max_sessions)
+
+        if self.memory_budget:
+            self._update_sizes()
+            for chat_id in list(self._data):
+                if self._total_size <= self.memory_budget:
+                    break
+                if self.pinned(chat_id):
+                    continue
+                self._evict(chat_id)
+                evicted += 1
+
+        if evicted:
+            logger.info(f"🧹 Вытеснено сессий: {evicted}, в памяти: {len(self._data)}")
+        return evicted
+
+    def start(self, sweep_interval: float = 60) -> None:
+        """Запускает периодическую чистку и фоновую запись в текущем event loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop(sweep_interval), name="session-sweeper")
+        if self.backend and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush_loop(), name="session-flusher")
+
+    async def stop(self) -> None:
+        """Останавливает фоновые задачи и сбрасывает в бэкенд все изменения"""
+        for task in (self._sweeper, self._flusher):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._sweeper = self._flusher = None
+
+        if self.backend:
+            while self._dirty or self._pending or self._deleted:
+                if not await self.flush():
+                    break
+            self.backend.close()
+
+    async def _sweep_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.sweep()
+                if self.backend:
+                    await asyncio.to_thread(self.backend.purge, time.time() - self.persist_ttl)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка чистки сессий: {e}")
+
+    def _evict_lru(self, still_over: Callable[[], bool]) -> int:
+        evicted = 0
+        for chat_id in list(self._data):
+            if not still_over():
+                break
+            if self.pinned(chat_id):
+                continue
+            self._evict(chat_id)
+            evicted += 1
+        return evicted
+
+    def _evict(self, chat_id: int) -> None:
+        st = self._data.pop(chat_id)
+        self._forget_size(chat_id)
+        self._last_activity.pop(chat_id, None)
+        self._dirty.discard(chat_id)
+        if self.backend:
+            # Сериализуем сразу: сам объект сессии больше не держим
+            self._pending[chat_id] = self._serialize(st)
+
+    # ---------- write-behind ----------
+
+    def _serialize(self, st: Dict[str, Any]) -> str:
+        return json.dumps(self.dump(st), ensure_ascii=False)
+
+    async def flush(self) -> int:
+        """Записывает в бэкенд одну пачку изменений; возвращает число записанных и удалённых"""
+        if not self.backend:
+            return 0
+
+        batch = []
+        for chat_id in list(self._dirty)[:self.flush_batch]:
+            self._dirty.discard(chat_id)
+            st = self._data.get(chat_id)
+            if st is not None:
+                batch.append((chat_id, self._serialize(st)))
+        # Вытесненные остаются в _pending до конца записи: иначе fetch() во время
+        # записи не нашёл бы сессию ни в памяти, ни в бэкенде и запомнил бы промах
+        pending = list(islice(self._pending.items(), max(0, self.flush_batch - len(batch))))
+        batch.extend(pending)
+        deleted = list(self._deleted)
+
+        try:
+            if batch:
+                await asyncio.to_thread(self.backend.save_many, batch)
+            for chat_id, payload in pending:
+                if self._pending.get(chat_id) is payload:
+                    del self._pending[chat_id]
+            if deleted:
+                await asyncio.to_thread(self.backend.delete_many, deleted)
+                self._deleted.difference_update(deleted)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи сессий: {e}")
+            # Вернём в очередь; вытесненные — уже сериализованными
+            for chat_id, payload in batch:
+                if chat_id in self._data:
+                    self._dirty.add(chat_id)
+                elif chat_id not in self._deleted:
+                    self._pending.setdefault(chat_id, payload)
+            return 0
+        return len(batch) + len(deleted)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            while await self.flush() >= self.flush_batch:
+                pass
+
+    def _remember_missing(self, chat_id: int) -> None:
+        self._missing[chat_id] = None
+        self._missing.move_to_end(chat_id)
+        if len(self._missing) > self.missing_limit:
+            self._missing.popitem(last=False)
+
+    def _resume_pending(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Вытесненная сессия, ещё не записанная в бэкенд, — без обращения к диску"""
+        payload = self._pending.pop(chat_id, None)
+        return None if payload is None else self._restore(chat_id, payload, from_pending=True)
+
+    def _restore(self, chat_id: int, payload: str, from_pending: bool) -> Optional[Dict[str, Any]]:
+        try:
+            st = self.load(json.loads(payload))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось восстановить сессию {chat_id}: {e}")
+            return None
+
+        self._data[chat_id] = st
+        self._resized.add(chat_id)
+        self.touch(chat_id)
+        if from_pending:
+            # Ещё не записанная версия теперь живёт только в памяти
+            self._dirty.add(chat_id)
+        logger.info(f"♻️ Сессия {chat_id} восстановлена из хранилища")
+        if len(self._data) > self.max_sessions:
+            self._evict_lru(lambda: len(self._data) > self.max_sessions)
+        return st
@@ -0,0 +1,149 @@
+# session_store.py
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+
+class SessionBackend(ABC):
+    """
+    Долговременное хранилище сериализованных сессий (JSON-строки по chat_id).
+
+    Все методы вызываются из потоков (asyncio.to_thread), не из event loop:
+    load() — при промахе кэша (SessionCache.fetch), точечное чтение, может
+    идти одновременно с записью и с другими load(); save_many/delete_many/purge —
+    пачками из фоновой записи.
+    """
+
+    @abstractmethod
+    def load(self, chat_id: int) -> Optional[str]:
+        """Сериализованная сессия чата или None"""
+
+    @abstractmethod
+    def save_many(self, items: List[Tuple[int, str]]) -> None:
+        """Записывает пачку (chat_id, JSON) одной операцией"""
+
+    @abstractmethod
+    def delete_many(self, chat_ids: Iterable[int]) -> None:
+        """Удаляет сессии чатов chat_ids"""
+
+    def purge(self, older_than: float) -> int:
+        """Удаляет записи, не обновлявшиеся с момента older_than (unix time)"""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class FileBackend(SessionBackend):
+    """Один JSON-файл на чат в каталоге"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, chat_id: int) -> Path:
+        return self.directory / f"{chat_id}.json"
+
+    def load(self, chat_id: int) -> Optional[str]:
+        try:
+            return self._path(chat_id).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def save_many(self, items: List[Tuple[int, str]]) -> None:
+        for chat_id, payload in items:
+            path = self._path(chat_id)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(payload, encoding="utf-8")
+            tmp.replace(path)
+
+    def delete_many(self, chat_ids: Iterable[int]) -> None:
+        for chat_id in chat_ids:
+            self._path(chat_id).unlink(missing_ok=True)
+
+    def purge(self, older_than: float) -> int:
+        removed = 0
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < older_than:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+class SQLiteBackend(SessionBackend):
+    """
+    SQLite в режиме WAL: читатели не блокируются писателем.
+    Чтение идёт через своё соединение (потоки load() — по очереди), запись —
+    через отдельное соединение под своей блокировкой.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._writer = self._connect()
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " chat_id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._writer.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self._writer.commit()
+        self._write_lock = threading.Lock()
+
+        self._reader = self._connect()
+        self._read_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level="DEFERRED")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def load(self, chat_id: int) -> Optional[str]:
+        with self._read_lock:
+            row = self._reader.execute("SELECT data FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, items: List[Tuple[int, str]]) -> None:
+        now = time.time()
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT INTO sessions(chat_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(chat_id, payload, now) for chat_id, payload in items],
+            )
+
+    def delete_many(self, chat_ids: Iterable[int]) -> None:
+        with self._write_lock, self._writer:
+            self._writer.executemany("DELETE FROM sessions WHERE chat_id = ?", [(c,) for c in chat_ids])
+
+    def purge(self, older_than: float) -> int:
+        with self._write_lock, self._writer:
+            return self._writer.execute("DELETE FROM sessions WHERE updated_at < ?", (older_than,)).rowcount
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._writer.close()
+        with self._read_lock:
+            self._reader.close()
+
+
+def create_backend(kind: str, path: str) -> Optional[SessionBackend]:
+    """Фабрика бэкендов по имени из настроек: sqlite, file или memory"""
+    kind = (kind or "memory").lower()
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    if kind == "file":
+        return FileBackend(path)
+    if kind == "memory":
+        return None
+    raise ValueError(f"Неизвестный бэкенд сессий: {kind}")
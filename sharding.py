@@ -0,0 +1,279 @@
+# sharding.py
+"""
+Шардированный запуск: один процесс-маршрутизатор принимает webhook-обновления
+и раскладывает их по N процессам-воркерам по хешу chat_id.
+
+Каждый воркер — полноценный бот со своим Dispatcher, планировщиком и SESSIONS
+и владеет только «своими» чатами. Обновления одного чата всегда попадают в один
+и тот же воркер, поэтому состояние игры не нужно делить между процессами.
+Колбэки игровых кнопок из личных сообщений уходят в шард группы по chat_id,
+зашитому в callback_data (см. callback_codec).
+
+Запуск:
+    python sharding.py --shards 4 --port 8080 --webhook-url https://example.com/webhook
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import struct
+import zlib
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+import callback_codec
+import metrics
+from log_config import bind, setup_logging
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Наблюдение за колодами в воркерах, если DECK_WATCH_INTERVAL не задан, секунд
+SHARD_DECK_WATCH_INTERVAL = 10
+
+
+def shard_for_chat(chat_id: int, shards: int) -> int:
+    """Детерминированный номер шарда для чата (одинаковый во всех процессах и запусках)"""
+    return zlib.crc32(struct.pack(">q", chat_id)) % shards
+
+
+def update_chat_id(update: Dict[str, Any]) -> int:
+    """Чат, которому принадлежит обновление; для игровых колбэков — чат группы"""
+    cb = update.get("callback_query")
+    if cb is not None:
+        payload = callback_codec.decode(cb.get("data"))
+        if payload is not None:
+            return payload.chat_id
+        message = cb.get("message")
+        if message:
+            return message["chat"]["id"]
+        return cb["from"]["id"]
+
+    for key in ("message", "edited_message", "channel_post", "my_chat_member", "chat_member", "chat_join_request"):
+        event = update.get(key)
+        if event is not None:
+            return event["chat"]["id"]
+
+    for event in update.values():
+        if isinstance(event, dict) and "from" in event:
+            return event["from"]["id"]
+    return 0
+
+
+def shard_store_path(path: str, shard_id: int) -> str:
+    """database/sessions.db → database/sessions.shard2.db"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
+
+
+# ==================== ВОРКЕР ====================
+
+def _worker_main(shard_id: int, updates: "mp.Queue", ready: "mp.Event", concurrency: int) -> None:
+    # Остановкой управляет маршрутизатор (None в очереди): сигналы группе процессов
+    # не должны обрывать воркер посреди раунда
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Свой файл хранилища сессий на шард: процессы не делят блокировку записи SQLite
+    store = os.getenv("SESSION_STORE_PATH", "database/sessions.db")
+    os.environ["SESSION_STORE_PATH"] = shard_store_path(store, shard_id)
+    os.environ["SHARD_ID"] = str(shard_id)
+    # /reload доходит только до шарда чата администратора: остальные узнают о новой колоде сами
+    os.environ.setdefault("DECK_WATCH_INTERVAL", str(SHARD_DECK_WATCH_INTERVAL))
+    asyncio.run(_worker_loop(shard_id, updates, ready, concurrency))
+
+
+async def _worker_loop(shard_id: int, updates: "mp.Queue", ready: "mp.Event", concurrency: int) -> None:
+    # Импорт здесь: каждый воркер сам регистрирует ботов-игроков и роутеры
+    # (и настраивает логирование своего процесса)
+    import main as app
+
+    # Номер шарда — во всех записях воркера, включая задачи обновлений
+    bind(shard=shard_id)
+
+    bot = app.create_bot()
+    dp = app.build_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    ready.set()
+    logger.info(f"🧩 Шард {shard_id} запущен (pid {os.getpid()})")
+
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    in_flight: set = set()
+
+    async def feed(raw: bytes) -> None:
+        try:
+            await dp.feed_raw_update(bot, json.loads(raw))
+        except Exception as e:
+            logger.exception(f"⚠️ Шард {shard_id}: ошибка обработки обновления: {e}")
+        finally:
+            slots.release()
+
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, updates.get)
+            if raw is None:
+                break
+            await slots.acquire()
+            task = asyncio.create_task(feed(raw))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        await bot.session.close()
+        logger.info(f"🧩 Шард {shard_id} остановлен")
+
+
+# ==================== МАРШРУТИЗАТОР ====================
+
+class ShardRouter:
+    """aiohttp-обработчик webhook: проверка секрета, выбор шарда, постановка в очередь воркера"""
+
+    def __init__(self, queues: List["mp.Queue"], ready: List["mp.Event"], secret: Optional[str] = None):
+        self.queues = queues
+        self.ready = ready
+        self.secret = secret
+        self.routed = [0] * len(queues)
+        self.rejected = 0
+        self._routed_total = metrics.counter("shard_updates_total", "Обновления, переданные шардам")
+        self._rejected_total = metrics.counter("shard_rejected_total", "Обновления, отклонённые из-за полной очереди шарда")
+        self._depth = metrics.gauge("shard_queue_depth", "Обновления в очереди шарда")
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+
+        raw = await request.read()
+        try:
+            update = json.loads(raw)
+            chat_id = update_chat_id(update)
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+
+        shard = shard_for_chat(chat_id, len(self.queues))
+        try:
+            self.queues[shard].put_nowait(raw)
+        except queue.Full:
+            # Telegram повторит доставку позже
+            self.rejected += 1
+            self._rejected_total.inc(shard=shard)
+            return web.Response(status=503)
+
+        self.routed[shard] += 1
+        self._routed_total.inc(shard=shard)
+        self._depth.set(_qsize(self.queues[shard]), shard=shard)
+        return web.Response(status=200)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "routed": self.routed,
+            "rejected": self.rejected,
+            "queued": [_qsize(q) for q in self.queues],
+        })
+
+    async def healthz(self, request: web.Request) -> web.Response:
+        # Готовы, когда все воркеры загрузили игру и запустили Dispatcher
+        if all(event.is_set() for event in self.ready):
+            return web.Response(text="ok")
+        return web.Response(status=503, text="starting")
+
+
+def _qsize(q: "mp.Queue") -> int:
+    try:
+        return q.qsize()
+    except NotImplementedError:  # macOS
+        return -1
+
+
+def build_app(shards: int, path: str = "/webhook", secret: Optional[str] = None,
+              webhook_url: Optional[str] = None, queue_size: int = 10000,
+              concurrency: int = 256) -> web.Application:
+    """Приложение маршрутизатора; воркеры стартуют и останавливаются вместе с ним"""
+    ctx = mp.get_context("spawn")
+    queues = [ctx.Queue(maxsize=queue_size) for _ in range(shards)]
+    ready = [ctx.Event() for _ in range(shards)]
+    router = ShardRouter(queues, ready, secret)
+    workers: List[mp.Process] = []
+
+    app = web.Application()
+    app.router.add_post(path, router.handle)
+    app.router.add_get("/shards", router.stats)
+    app.router.add_get("/healthz", router.healthz)
+    app["shard_router"] = router
+
+    async def on_startup(app: web.Application) -> None:
+        for shard_id, q in enumerate(queues):
+            proc = ctx.Process(target=_worker_main, args=(shard_id, q, ready[shard_id], concurrency), name=f"shard-{shard_id}")
+            proc.start()
+            workers.append(proc)
+        if webhook_url:
+            await _set_webhook(webhook_url, secret)
+
+    async def on_shutdown(app: web.Application) -> None:
+        for q in queues:
+            q.put(None)
+        for proc in workers:
+            await asyncio.to_thread(proc.join, 30)
+            if proc.is_alive():
+                proc.kill()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+async def _set_webhook(url: str, secret: Optional[str]) -> None:
+    # Лёгкий Bot без импорта игровых модулей: маршрутизатору они не нужны
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    api_url = os.getenv("TELEGRAM_API_URL")
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else None
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    try:
+        await bot.set_webhook(url, secret_token=secret, drop_pending_updates=False)
+        logger.info(f"✅ Webhook установлен: {url}")
+    finally:
+        await bot.session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Шардированный запуск бота на нескольких процессах")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARDS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("WEBHOOK_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_PORT", "8080")))
+    parser.add_argument("--path", default=os.getenv("WEBHOOK_PATH", "/webhook"))
+    parser.add_argument("--webhook-url", default=os.getenv("WEBHOOK_URL"))
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET"))
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("METRICS_PORT", "9100")),
+                        help="локальный /metrics маршрутизатора; шард N — на порту +1+N, 0 — выключить")
+    args = parser.parse_args()
+    os.environ["METRICS_PORT"] = str(args.metrics_port)
+
+    setup_logging()
+    if float(os.getenv("DECK_WATCH_INTERVAL", SHARD_DECK_WATCH_INTERVAL)) <= 0:
+        logger.warning("⚠️ DECK_WATCH_INTERVAL=0: /reload обновит колоду только в одном шарде, "
+                       "остальные останутся со старой до перезапуска")
+    app = build_app(args.shards, args.path, args.secret, args.webhook_url)
+    if args.metrics_port:
+        async def start_metrics(app: web.Application) -> None:
+            app["metrics_runner"] = await metrics.start_server(os.getenv("METRICS_HOST", "127.0.0.1"), args.metrics_port)
+
+        async def stop_metrics(app: web.Application) -> None:
+            if app.get("metrics_runner"):
+                await app["metrics_runner"].cleanup()
+
+        app.on_startup.append(start_metrics)
+        app.on_cleanup.append(stop_metrics)
+    logger.info(f"🚦 Маршрутизатор: {args.shards} шардов, http://{args.host}:{args.port}{args.path}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
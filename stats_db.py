@@ -0,0 +1,327 @@
+# stats_db.py
+"""
+Статистика игр в SQLite: журнал раундов и сводки по игрокам и чатам.
+
+- record() не ждёт диска: результат раунда ложится в очередь в памяти,
+  фоновая задача раз в flush_interval секунд пишет пачку (до batch_size
+  раундов) одной транзакцией в потоке. Пишет одно соединение, которым
+  больше никто не пользуется.
+- WAL: чтение (/stats, /top) не ждёт записи и идёт своим соединением,
+  тоже в потоке — обработчики не блокируют цикл событий.
+- Сводки (players, chat_players, chats) обновляются в той же транзакции,
+  что и журнал: пачка сначала сворачивается в памяти, затем UPSERT с
+  прибавлением. Таблицы лидеров — чтение готовых строк по индексу, а не
+  агрегирование журнала.
+- Ошибка записи возвращает пачку в очередь до следующей попытки. Если
+  очередь переполнена (диск недоступен долго), новые раунды отбрасываются
+  с предупреждением — игра важнее статистики.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rounds ("
+    " id INTEGER PRIMARY KEY,"
+    " chat_id INTEGER NOT NULL,"
+    " round_id INTEGER NOT NULL,"
+    " host_id INTEGER NOT NULL,"
+    " winner_id INTEGER NOT NULL,"
+    " situation TEXT NOT NULL,"
+    " winning_card TEXT NOT NULL,"
+    " players INTEGER NOT NULL,"
+    " started_at REAL NOT NULL,"
+    " finished_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_rounds_chat ON rounds(chat_id, finished_at)",
+    "CREATE TABLE IF NOT EXISTS round_answers ("
+    " round INTEGER NOT NULL REFERENCES rounds(id),"
+    " user_id INTEGER NOT NULL,"
+    " card TEXT NOT NULL,"
+    " PRIMARY KEY (round, user_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_round_answers_user ON round_answers(user_id)",
+    "CREATE TABLE IF NOT EXISTS players ("
+    " user_id INTEGER PRIMARY KEY,"
+    " name TEXT NOT NULL,"
+    " is_bot INTEGER NOT NULL,"
+    " rounds INTEGER NOT NULL,"
+    " wins INTEGER NOT NULL,"
+    " hosted INTEGER NOT NULL,"
+    " last_played REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_players_wins ON players(wins DESC) WHERE is_bot = 0",
+    "CREATE TABLE IF NOT EXISTS chat_players ("
+    " chat_id INTEGER NOT NULL,"
+    " user_id INTEGER NOT NULL,"
+    " name TEXT NOT NULL,"
+    " is_bot INTEGER NOT NULL,"
+    " rounds INTEGER NOT NULL,"
+    " wins INTEGER NOT NULL,"
+    " hosted INTEGER NOT NULL,"
+    " last_played REAL NOT NULL,"
+    " PRIMARY KEY (chat_id, user_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS idx_chat_players_wins ON chat_players(chat_id, wins DESC)",
+    "CREATE TABLE IF NOT EXISTS chats ("
+    " chat_id INTEGER PRIMARY KEY,"
+    " rounds INTEGER NOT NULL,"
+    " play_seconds REAL NOT NULL,"
+    " first_round REAL NOT NULL,"
+    " last_round REAL NOT NULL)",
+)
+
+# Прибавление к сводке: name и last_played — последние, счётчики — суммы
+_UPSERT_COUNTS = (
+    " ON CONFLICT({}) DO UPDATE SET name = excluded.name, rounds = rounds + excluded.rounds,"
+    " wins = wins + excluded.wins, hosted = hosted + excluded.hosted,"
+    " last_played = max(last_played, excluded.last_played)"
+)
+
+
+@dataclass(frozen=True, slots=True)
+class RoundResult:
+    """Итог раунда для журнала: участники, ответы и время"""
+    chat_id: int
+    round_id: int
+    host_id: int
+    winner_id: int
+    situation: str
+    winning_card: str
+    # (user_id, текст карты) — ответы всех, кто успел ответить
+    answers: Tuple[Tuple[int, str], ...]
+    # user_id → (имя, бот ли) — ведущий и ответившие
+    players: Dict[int, Tuple[str, bool]]
+    started_at: float
+    finished_at: float
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerStats:
+    name: str
+    rounds: int
+    wins: int
+    hosted: int
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.rounds if self.rounds else 0.0
+
+
+class StatsDB:
+    """
+    Журнал раундов и сводки в SQLite. path=None — статистика выключена:
+    record() ничего не делает, чтение возвращает пустые результаты.
+    """
+
+    def __init__(self, path: Optional[str], flush_interval: float = 1.0, batch_size: int = 500,
+                 max_pending: int = 100_000):
+        self.path = Path(path) if path else None
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: Deque[RoundResult] = deque()
+        self._flusher: Optional[asyncio.Task] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._writer = self._connect()
+        with self._writer:
+            for statement in _SCHEMA:
+                self._writer.execute(statement)
+        self._reader = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level="DEFERRED")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @property
+    def enabled(self) -> bool:
+        return self._writer is not None
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # ---------- запись ----------
+
+    def record(self, result: RoundResult) -> None:
+        """Ставит итог раунда в очередь записи; не блокирует"""
+        if not self.enabled:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"⚠️ Очередь статистики переполнена, отброшено раундов: {self.dropped}")
+            return
+        self._pending.append(result)
+
+    def _write(self, batch: List[RoundResult]) -> None:
+        players: Dict[int, List[Any]] = {}
+        chat_players: Dict[Tuple[int, int], List[Any]] = {}
+        chats: Dict[int, List[float]] = {}
+
+        def bump(summary: Dict[Any, List[Any]], key: Any, result: RoundResult, user_id: int,
+                 rounds: int, wins: int, hosted: int) -> None:
+            name, is_bot = result.players.get(user_id, ("", False))
+            row = summary.get(key)
+            if row is None:
+                row = summary[key] = [name, int(is_bot), 0, 0, 0, result.finished_at]
+            row[0] = name or row[0]
+            row[2] += rounds
+            row[3] += wins
+            row[4] += hosted
+            row[5] = max(row[5], result.finished_at)
+
+        for result in batch:
+            participants = [(result.host_id, 0, 0, 1)]
+            participants += [(uid, 1, int(uid == result.winner_id), 0) for uid, _ in result.answers]
+            for uid, rounds, wins, hosted in participants:
+                bump(players, uid, result, uid, rounds, wins, hosted)
+                bump(chat_players, (result.chat_id, uid), result, uid, rounds, wins, hosted)
+            chat = chats.get(result.chat_id)
+            if chat is None:
+                chat = chats[result.chat_id] = [0, 0.0, result.finished_at, result.finished_at]
+            chat[0] += 1
+            chat[1] += max(0.0, result.finished_at - result.started_at)
+            chat[2] = min(chat[2], result.finished_at)
+            chat[3] = max(chat[3], result.finished_at)
+
+        with self._write_lock, self._writer as conn:
+            for result in batch:
+                round_pk = conn.execute(
+                    "INSERT INTO rounds(chat_id, round_id, host_id, winner_id, situation, winning_card, players,"
+                    " started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (result.chat_id, result.round_id, result.host_id, result.winner_id, result.situation,
+                     result.winning_card, len(result.players), result.started_at, result.finished_at),
+                ).lastrowid
+                conn.executemany("INSERT OR REPLACE INTO round_answers(round, user_id, card) VALUES (?, ?, ?)",
+                                 [(round_pk, uid, card) for uid, card in result.answers])
+            conn.executemany(
+                "INSERT INTO players(user_id, name, is_bot, rounds, wins, hosted, last_played)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)" + _UPSERT_COUNTS.format("user_id"),
+                [(uid, *row) for uid, row in players.items()],
+            )
+            conn.executemany(
+                "INSERT INTO chat_players(chat_id, user_id, name, is_bot, rounds, wins, hosted, last_played)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)" + _UPSERT_COUNTS.format("chat_id, user_id"),
+                [(chat_id, uid, *row) for (chat_id, uid), row in chat_players.items()],
+            )
+            conn.executemany(
+                "INSERT INTO chats(chat_id, rounds, play_seconds, first_round, last_round) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(chat_id) DO UPDATE SET rounds = rounds + excluded.rounds,"
+                " play_seconds = play_seconds + excluded.play_seconds,"
+                " last_round = max(last_round, excluded.last_round)",
+                [(chat_id, *row) for chat_id, row in chats.items()],
+            )
+
+    async def flush(self) -> int:
+        """Записывает одну пачку раундов; возвращает число записанных"""
+        if not self._pending:
+            return 0
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка записи статистики: {e}")
+            self._pending.extendleft(reversed(batch))
+            return 0
+        return len(batch)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            while await self.flush() >= self.batch_size:
+                pass
+
+    def start(self) -> None:
+        """Запускает фоновую запись в текущем event loop"""
+        if self.enabled and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush_loop(), name="stats-flusher")
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись, дописывает очередь и закрывает базу"""
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        if not self.enabled:
+            return
+        while self._pending:
+            if not await self.flush():
+                logger.warning(f"⚠️ Не записано раундов статистики: {len(self._pending)}")
+                break
+        with self._write_lock:
+            self._writer.close()
+        with self._read_lock:
+            self._reader.close()
+        self._writer = self._reader = None
+
+    # ---------- чтение ----------
+
+    async def _read(self, query: Callable[[sqlite3.Connection], Any], default: Any) -> Any:
+        if not self.enabled:
+            return default
+
+        def run() -> Any:
+            with self._read_lock:
+                return query(self._reader)
+
+        return await asyncio.to_thread(run)
+
+    async def player(self, user_id: int) -> Optional[PlayerStats]:
+        """Статистика игрока за всё время"""
+        def query(conn: sqlite3.Connection) -> Optional[PlayerStats]:
+            row = conn.execute("SELECT name, rounds, wins, hosted FROM players WHERE user_id = ?",
+                               (user_id,)).fetchone()
+            return PlayerStats(*row) if row else None
+
+        return await self._read(query, None)
+
+    async def rank(self, user_id: int) -> Optional[int]:
+        """Место игрока (не бота) в общем рейтинге по победам"""
+        def query(conn: sqlite3.Connection) -> Optional[int]:
+            row = conn.execute("SELECT wins FROM players WHERE user_id = ? AND is_bot = 0", (user_id,)).fetchone()
+            if row is None:
+                return None
+            return 1 + conn.execute("SELECT count(*) FROM players WHERE is_bot = 0 AND wins > ?",
+                                    row).fetchone()[0]
+
+        return await self._read(query, None)
+
+    async def chat_top(self, chat_id: int, limit: int = 10) -> List[PlayerStats]:
+        """Лучшие игроки чата за всё время (с ботами)"""
+        def query(conn: sqlite3.Connection) -> List[PlayerStats]:
+            rows = conn.execute("SELECT name, rounds, wins, hosted FROM chat_players WHERE chat_id = ?"
+                                " ORDER BY wins DESC LIMIT ?", (chat_id, limit)).fetchall()
+            return [PlayerStats(*row) for row in rows]
+
+        return await self._read(query, [])
+
+    async def top(self, limit: int = 10) -> List[PlayerStats]:
+        """Общий рейтинг игроков по победам (без ботов)"""
+        def query(conn: sqlite3.Connection) -> List[PlayerStats]:
+            rows = conn.execute("SELECT name, rounds, wins, hosted FROM players WHERE is_bot = 0"
+                                " ORDER BY wins DESC LIMIT ?", (limit,)).fetchall()
+            return [PlayerStats(*row) for row in rows]
+
+        return await self._read(query, [])
+
+    async def chat_rounds(self, chat_id: int) -> int:
+        """Сыгранных в чате раундов за всё время"""
+        def query(conn: sqlite3.Connection) -> int:
+            row = conn.execute("SELECT rounds FROM chats WHERE chat_id = ?", (chat_id,)).fetchone()
+            return row[0] if row else 0
+
+        return await self._read(query, 0)
@@ -0,0 +1,399 @@
+# tracing.py
+"""
+Трассировка раундов.
+
+Раунд — корневой спан "round", дочерние — этапы внутри него: отрисовка
+карточки, рассылка рук, ходы ботов, обращения к AI, выбор победителя,
+иллюстрация, запросы к Bot API. Текущий спан хранится в contextvars, поэтому
+переходит в задачи asyncio.create_task и в отложенные действия планировщика
+(они запускаются в контексте, снятом при планировании). Нажатия кнопок
+приходят отдельными обновлениями — обработчик подключается к открытому
+раунду через resume().
+
+- start_round() / end_round() открывают и закрывают корневой спан чата;
+- span("имя", ключ=значение) — дочерний спан на время блока; вне раунда
+  или при выключенной трассировке ничего не записывает;
+- попадёт ли раунд в выборку (TRACE_SAMPLE), решается при start_round():
+  у раундов вне выборки дочерние спаны не записываются вовсе. Раунд
+  дольше TRACE_SLOW_SECONDS отмечается в логе всегда и выгружается в любом
+  случае — вне выборки одним корневым спаном;
+- выгрузка — фоновой задачей пачками: JSON Lines в файл (TRACE_FORMAT=json,
+  по строке на раунд со смещениями спанов от начала), OTLP/JSON в файл
+  (TRACE_FORMAT=otlp) или на коллектор по HTTP (TRACE_EXPORT=http://…).
+
+Трассировка включается переменной TRACE_EXPORT (путь к файлу или адрес
+коллектора); без неё span() сводится к одной проверке.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import aiohttp
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "zhestkaya-igra"
+# Защита от бесконечно растущего раунда (например, зависшего с потоком нажатий)
+MAX_SPANS_PER_TRACE = 2000
+# Сколько законченных раундов может ждать выгрузки
+MAX_PENDING_TRACES = 1000
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "done", "sampled")
+
+    def __init__(self, sampled: bool = True):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.done = False
+        # Вне выборки — только корневой спан: дочерние не записываются
+        self.sampled = sampled
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "status")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time_ns()
+        self.end: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> float:
+        """Длительность в секундах (для незаконченного спана — до текущего момента)"""
+        return ((self.end or time.time_ns()) - self.start) / 1e9
+
+
+# ---------- выгрузка ----------
+
+def _trace_json(root: Span) -> Dict[str, Any]:
+    """Раунд одной записью: спаны со смещением от начала раунда, в миллисекундах"""
+    return {
+        "trace_id": root.trace.trace_id,
+        "name": root.name,
+        "start": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(root.start / 1e9)) + "Z",
+        "duration_ms": round(root.duration * 1000, 1),
+        "status": root.status,
+        "attributes": root.attributes,
+        "spans": [
+            {
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "offset_ms": round((s.start - root.start) / 1e6, 1),
+                "duration_ms": round(s.duration * 1000, 1),
+                "status": s.status,
+                "attributes": s.attributes,
+            }
+            for s in root.trace.spans
+        ],
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_request(roots: List[Span]) -> Dict[str, Any]:
+    """Тело ExportTraceServiceRequest в JSON-кодировке OTLP"""
+    spans = []
+    for root in roots:
+        for s in root.trace.spans:
+            item = {
+                "traceId": s.trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start),
+                "endTimeUnixNano": str(s.end or s.start),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+                "status": {"code": 1} if s.status == "ok" else {"code": 2, "message": s.status},
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class FileExporter:
+    """JSON Lines в файл: строка на раунд (json) или на пачку раундов (otlp)"""
+
+    def __init__(self, path: str, fmt: str = "json"):
+        self.path = path
+        self.fmt = fmt
+
+    async def export(self, roots: List[Span]) -> None:
+        if self.fmt == "otlp":
+            lines = [json.dumps(_otlp_request(roots), ensure_ascii=False)]
+        else:
+            lines = [json.dumps(_trace_json(root), ensure_ascii=False, default=str) for root in roots]
+        await asyncio.to_thread(self._write, lines)
+
+    def _write(self, lines: List[str]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def close(self) -> None:
+        pass
+
+
+class OtlpHttpExporter:
+    """OTLP/HTTP (JSON) на коллектор: POST {endpoint}/v1/traces"""
+
+    def __init__(self, endpoint: str):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def export(self, roots: List[Span]) -> None:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        async with self._session.post(self.url, json=_otlp_request(roots)) as resp:
+            if resp.status >= 300:
+                logger.warning(f"⚠️ Коллектор трасс ответил {resp.status}")
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# ---------- трассировщик ----------
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate: float = 0.1, slow_seconds: float = 90.0,
+                 flush_interval: float = 2.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.flush_interval = flush_interval
+        # Открытые раунды по чатам
+        self._rounds: Dict[int, Span] = {}
+        self._pending: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    # ---------- раунды ----------
+
+    def start_round(self, chat_id: int, round_id: int, **attributes: Any) -> Optional[Span]:
+        """
+        Открывает корневой спан раунда и делает его текущим до конца контекста.
+        Здесь же решается, попал ли раунд в выборку.
+        """
+        if not self.enabled:
+            return None
+        self.end_round(chat_id, status="replaced")
+        trace = _Trace(sampled=random.random() < self.sample_rate)
+        root = Span(trace, "round", None, {"chat_id": chat_id, "round_id": round_id, **attributes})
+        trace.spans.append(root)
+        self._rounds[chat_id] = root
+        _current.set(root)
+        return root
+
+    def resume(self, chat_id: int, round_id: int) -> None:
+        """Подключает текущий контекст (обработку нажатия) к открытому раунду чата"""
+        root = self._rounds.get(chat_id)
+        if root is not None and root.attributes.get("round_id") == round_id:
+            _current.set(root)
+
+    def end_round(self, chat_id: int, status: str = "ok", **attributes: Any) -> None:
+        """Закрывает раунд и ставит его в очередь выгрузки, если он в выборке или медленный"""
+        root = self._rounds.pop(chat_id, None)
+        if root is None:
+            return
+        root.end = time.time_ns()
+        root.status = status
+        root.attributes.update(attributes)
+        root.trace.done = True
+
+        slow = root.duration >= self.slow_seconds
+        if slow:
+            children = [s for s in root.trace.spans if s is not root and s.end]
+            longest = max(children, key=lambda s: s.duration, default=None)
+            logger.warning(
+                f"🐢 Медленный раунд: {root.duration:.1f} с"
+                + (f", дольше всего {longest.name} ({longest.duration:.1f} с)" if longest else ""),
+                extra={"trace_id": root.trace.trace_id},
+            )
+        # Медленный раунд вне выборки выгружается одним корневым спаном
+        if not (slow or root.trace.sampled):
+            return
+        if len(self._pending) >= MAX_PENDING_TRACES:
+            logger.warning("⚠️ Очередь выгрузки трасс переполнена, раунд отброшен")
+            return
+        self._pending.append(root)
+
+    # ---------- спаны ----------
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+        parent = _current.get()
+        if (parent is None or not parent.trace.sampled or parent.trace.done
+                or len(parent.trace.spans) >= MAX_SPANS_PER_TRACE):
+            yield None
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes)
+        parent.trace.spans.append(span)
+        token = _current.set(span)
+        try:
+            yield span
+        except asyncio.CancelledError:
+            span.status = "cancelled"
+            raise
+        except BaseException as e:
+            span.status = type(e).__name__
+            raise
+        finally:
+            span.end = time.time_ns()
+            _current.reset(token)
+
+    # ---------- выгрузка ----------
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(), name="trace-export")
+
+    async def stop(self) -> None:
+        """Дописывает открытые и ожидающие раунды и останавливает выгрузку"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for chat_id in list(self._rounds):
+            self.end_round(chat_id, status="shutdown")
+        await self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    async def flush(self) -> None:
+        if not self._pending or self.exporter is None:
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await self.exporter.export(batch)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось выгрузить трассы ({len(batch)}): {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes: Any):
+    """Дочерний спан текущего раунда на время блока: with span("render"): ..."""
+    return tracer.span(name, **attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def use_round() -> None:
+    """
+    Текущим становится корневой спан раунда. Для отложенных действий: они
+    выполняются от имени раунда, а не шага, который их запланировал и к их
+    запуску уже закончился.
+    """
+    span = _current.get()
+    if span is not None and span.parent_id is not None:
+        _current.set(span.trace.spans[0])
+
+
+def setup_tracing(export: Optional[str] = None, fmt: Optional[str] = None,
+                  sample: Optional[float] = None, slow: Optional[float] = None) -> None:
+    """
+    Настраивает общий трассировщик из TRACE_EXPORT (файл или http(s)://
+    коллектор), TRACE_FORMAT (json или otlp), TRACE_SAMPLE (доля раундов,
+    0.1) и TRACE_SLOW_SECONDS (медленные раунды выгружаются всегда, 90).
+    """
+    export = export if export is not None else os.getenv("TRACE_EXPORT", "")
+    fmt = fmt or os.getenv("TRACE_FORMAT", "json")
+    tracer.sample_rate = sample if sample is not None else float(os.getenv("TRACE_SAMPLE", "0.1"))
+    tracer.slow_seconds = slow if slow is not None else float(os.getenv("TRACE_SLOW_SECONDS", "90"))
+    if not export:
+        tracer.exporter = None
+    elif export.startswith(("http://", "https://")):
+        tracer.exporter = OtlpHttpExporter(export)
+    else:
+        tracer.exporter = FileExporter(export, fmt)
+    if tracer.enabled:
+        logger.info(f"🔭 Трассировка раундов: {export} ({fmt}), выборка {tracer.sample_rate:g}, "
+                    f"медленные от {tracer.slow_seconds:g} с")
+
+
+# ---------- middleware ----------
+
+class TraceContextMiddleware(BaseMiddleware):
+    """
+    Каждое обновление начинает без текущего спана: обработчики webhook
+    переиспользуют одну задачу, и раунд одного чата не должен перейти
+    к следующему обновлению.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = _current.set(None)
+        try:
+            return await handler(event, data)
+        finally:
+            _current.reset(token)
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Запросы к Bot API внутри раунда — спаны tg.<метод>"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot,
+                       method: TelegramMethod) -> Response:
+        current = _current.get()
+        if current is None or not current.trace.sampled:
+            return await make_request(bot, method)
+        name = getattr(method, "__api_method__", type(method).__name__)
+        attributes = {}
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            attributes["chat_id"] = chat_id
+        with tracer.span(f"tg.{name}", **attributes):
+            return await make_request(bot, method)
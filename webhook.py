@@ -0,0 +1,110 @@
+# webhook.py
+"""
+Приём обновлений через webhook (aiogram + aiohttp).
+
+QueuedRequestHandler сразу отвечает Telegram 200 и кладёт обновление
+в ограниченную очередь; его разбирают workers задач-обработчиков.
+Когда очередь полна, отвечаем 503 — Telegram повторит доставку позже,
+а память процесса не растёт неограниченно. При остановке приём
+закрывается, очередь дорабатывается до конца (не дольше drain_timeout).
+"""
+import asyncio
+import json
+import logging
+from typing import Any, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        secret_token: Optional[str] = None,
+        workers: int = 64,
+        queue_size: int = 10000,
+        drain_timeout: float = 30,
+        **data: Any,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._closing = False
+        self.accepted = 0
+        self.rejected = 0
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        app.on_startup.append(self._start_workers)
+        super().register(app, path, **kwargs)
+
+    async def _start_workers(self, app: web.Application) -> None:
+        self._tasks = [asyncio.create_task(self._worker(), name=f"webhook-worker-{i}")
+                       for i in range(self.workers)]
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if self._closing:
+            return web.Response(status=503)
+        try:
+            update = json.loads(await request.read())
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+        self.accepted += 1
+        return web.Response(status=200)
+
+    async def _worker(self) -> None:
+        while True:
+            update = await self.queue.get()
+            try:
+                await self._background_feed_update(self.bot, update)
+            except Exception as e:
+                logger.exception(f"⚠️ Ошибка обработки обновления {update.get('update_id')}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self) -> None:
+        """Дорабатывает очередь, останавливает обработчиков и закрывает сессию бота"""
+        self._closing = True
+        try:
+            await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не дождались обработки {self.queue.qsize()} обновлений")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().close()
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "queued": self.queue.qsize(),
+        })
+
+
+def build_webhook_app(dp: Dispatcher, bot: Bot, path: str = "/webhook", secret: Optional[str] = None,
+                      workers: int = 64, queue_size: int = 10000) -> web.Application:
+    app = web.Application()
+    handler = QueuedRequestHandler(dp, bot, secret_token=secret, workers=workers, queue_size=queue_size)
+    # Порядок важен: on_shutdown сначала дорабатывает очередь, потом останавливает Dispatcher
+    handler.register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    app.router.add_get("/webhook/stats", handler.stats)
+    metrics.gauge("webhook_queue_depth", "Обновления в очереди webhook", fn=handler.queue.qsize)
+    metrics.counter("webhook_accepted_total", "Принятые webhook-обновления", fn=lambda: handler.accepted)
+    metrics.counter("webhook_rejected_total", "Отклонённые (503) webhook-обновления", fn=lambda: handler.rejected)
+    app["webhook_handler"] = handler
+    return app